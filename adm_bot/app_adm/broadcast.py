@@ -0,0 +1,35 @@
+import logging
+
+from app.bot_registry import bot_registry
+from app.broadcast import BroadcastEngine
+from app.database import requests as e_rq
+
+import app_adm.database_adm.requests as rq
+
+logger = logging.getLogger(__name__)
+
+
+async def start_broadcast(
+    admin_tg_id: int, text: str, role_id: int | None = None
+) -> int | None:
+    """
+    Создает рассылку в статусе "running" и сообщение Админу с прогрессом.
+
+    Сообщения отправляет процесс основного бота (BroadcastEngine): он
+    подхватывает новую рассылку в течение BROADCAST_POLL_INTERVAL секунд
+    и делит ограничения отправки с живым трафиком основного бота.
+
+    Returns:
+        ID рассылки или None, если рассылку не удалось создать.
+    """
+    broadcast = await rq.create_broadcast(admin_tg_id, text, role_id)
+    if broadcast is None:
+        return None
+
+    adm_bot = bot_registry.get("TOKEN_ADM")
+    msg = await adm_bot.send_message(
+        chat_id=admin_tg_id, text=BroadcastEngine.progress_text(broadcast.id, 0, 0)
+    )
+    await e_rq.set_message(admin_tg_id, msg.message_id, msg.text)
+    await rq.set_broadcast_progress_message(broadcast.id, msg.message_id)
+    return broadcast.id
@@ -12,6 +12,7 @@ from aiogram.fsm.context import FSMContext
 from app import support as e_sup
 from app import user_messages as e_um
 from app.database import requests as e_rq
+from app.geocache import geo_cache
 
 import app_adm.states as st
 import app_adm.keyboards as kb
@@ -634,6 +635,51 @@ async def cmd_full_delete_account(message: Message, state: FSMContext):
         await e_sup.send_message(message, user_id, e_um.common_error_message())
 
 
+@command_router.message(Command("clear_geocache"))
+async def cmd_clear_geocache(message: Message, state: FSMContext):
+    """
+    Обработчик команды /clear_geocache
+
+    Показывает статистику кэша геокодирования и очищает его:
+    /clear_geocache — весь кэш, /clear_geocache <адрес> — только этот адрес.
+    """
+    user_id = message.from_user.id
+    user_exists = await sup.origin_check_user(user_id, message, state)
+    if not user_exists:
+        return
+    try:
+        await e_rq.set_message(user_id, message.message_id, message.text)
+
+        user_role = await e_rq.check_role(user_id)
+
+        if user_role in [3, 4]:
+            msg = await message.answer("У вас недостаточно прав!")
+            await e_rq.set_message(user_id, msg.message_id, msg.text)
+            return
+
+        stats_text = await geo_cache.stats_text()
+
+        address = message.text.partition(" ")[2].strip()
+        if address:
+            await geo_cache.invalidate(address)
+            result_text = f'Адрес "{address}" удален из кэша.'
+        else:
+            deleted = await geo_cache.clear()
+            result_text = f"Кэш очищен, удалено записей: {deleted}."
+
+        msg = await message.answer(
+            f"Кэш геокодирования:\n{stats_text}\n\n{result_text}",
+            reply_markup=kb.menu_button,
+        )
+        await e_rq.set_message(user_id, msg.message_id, msg.text)
+        logger.info(f"Админ {user_id} очистил кэш геокодирования. {result_text}")
+    except Exception as e:
+        logger.exception(
+            f"Ошибка для Админа {user_id}: {e} <cmd_clear_geocache>"
+        )  # Логирование ошибки с трассировкой
+        await e_sup.send_message(message, user_id, e_um.common_error_message())
+
+
 @command_router.message(Command("send_message"))
 async def cmd_all_send_message(message: Message, state: FSMContext):
     """
@@ -870,4 +916,4 @@ async def cmd_get_doc_pp(message: Message, state: FSMContext):
             )
     except Exception as e:
         logger.exception(f"Ошибка для пользователя {user_id}: {e} <cmd_get_doc_pp>")
-        await e_sup.send_message(message, user_id, e_um.common_error_message())
\ No newline at end of file
+        await e_sup.send_message(message, user_id, e_um.common_error_message())
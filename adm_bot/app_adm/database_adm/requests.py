@@ -1,9 +1,13 @@
 import logging
 import os
+import time
+import pytz
+
+from datetime import datetime
 
 import pandas as pd
 
-from sqlalchemy import select, delete, not_, asc
+from sqlalchemy import select, delete, not_, asc, update
 from typing import Union, Optional
 
 from app_adm import support as sup
@@ -11,6 +15,8 @@ from app_adm import support as sup
 from app.database import requests as e_rq
 from app import support as e_sup
 from app.database.models import AsyncSessionLocal
+from app.database.message_writer import message_writer
+from app.driver_index import driver_index
 from app.database.models import (
     User,
     Client,
@@ -28,6 +34,7 @@ from app.database.models import (
     Rate,
     Role,
     Admin,
+    Broadcast,
 )
 
 logger = logging.getLogger(__name__)
@@ -121,7 +128,7 @@ async def get_active_drivers() -> list[tuple[User, Driver]]:
                 f"Ошибка при выполнении запроса get_active_drivers: {e} <get_active_drivers>"
             )
             return []
-        
+
 async def get_all_drivers() -> list[tuple[User, Driver]]:
     """
     Асинхронно получает всех водителей из базы данных.
@@ -141,7 +148,7 @@ async def get_all_drivers() -> list[tuple[User, Driver]]:
                 f"Ошибка при выполнении запроса get_all_drivers: {e} <get_all_drivers>"
             )
             return []
-        
+
 # async def get_status_name_by_status_id(status_id: int) -> str | None:
 #     """
 #     Асинхронно получает имя статуса по его status_id.
@@ -273,7 +280,12 @@ async def get_table_as_dataframe(
 async def get_message_from_user(tg_id: int, adm_id: int) -> pd.DataFrame:
     """
     Получает указанную таблицу в формате DataFrame.
+
+    Записывается только буфер этого процесса; сообщения main_bot попадают
+    в таблицу не позже чем через flush_interval секунд.
     """
+    await message_writer.flush()
+
     async with AsyncSessionLocal() as session:
         try:
             tg_id = int(tg_id)
@@ -546,6 +558,8 @@ async def set_driver_status_deleted(driver_tg_id: int):
             if user_driver is not None:
                 user_driver.is_deleted = True
                 await session.commit()
+                # Удаленный водитель не должен находиться в поиске ближайших
+                await driver_index.set_online(driver_tg_id, False)
             else:
                 logger.error(
                     f"Водитель с tg_id {driver_tg_id} не найден. <set_driver_status_deleted>"
@@ -629,11 +643,17 @@ async def check_adm_pswrd(adm_tg_id: int, adm_pswrd: str) -> Optional[bool]:
 async def delete_all_messages_from_db(user_id: int) -> None:
     """
     Асинхронно удаляет все сообщения из базы данных.
+
+    Время очистки сохраняется в Redis, чтобы буфер журнала main_bot
+    не дописал в таблицу сообщения, отправленные до очистки.
     """
+    wiped_at = time.time()
+
     async with AsyncSessionLocal() as session:
         try:
             await session.execute(delete(User_message))
             await session.commit()
+            await message_writer.mark_wiped(wiped_at)
         except Exception as e:
             await session.rollback()
             logger.error(f"Ошибка для Админа {user_id}: {e} <delete_messages_from_db>")
@@ -692,3 +712,57 @@ async def delete_promo_code(name_promo_code: str) -> None:
             # Откатываем изменения при ошибке
             await session.rollback()
             logger.error(f"Ошибка при удалении промокода: {e} <delete_promo_code>")
+
+
+async def create_broadcast(
+    admin_tg_id: int, text: str, role_id: Optional[int] = None
+) -> Optional[Broadcast]:
+    """
+    Асинхронно создает запись о рассылке в статусе "running".
+
+    Returns:
+        Объект Broadcast или None в случае ошибки.
+    """
+    async with AsyncSessionLocal() as session:
+        try:
+            current_time = datetime.now(pytz.timezone("Etc/GMT-7"))
+            broadcast = Broadcast(
+                admin_tg_id=admin_tg_id,
+                text=text,
+                role_id=role_id,
+                status="running",
+                last_user_id=0,
+                sent_count=0,
+                failed_count=0,
+                created_at=current_time.strftime("%d-%m-%Y %H:%M"),
+            )
+            session.add(broadcast)
+            await session.commit()
+            return broadcast
+        except Exception as e:
+            await session.rollback()
+            logger.error(
+                f"Ошибка при создании рассылки для Админа {admin_tg_id}: {e} <create_broadcast>"
+            )
+            return None
+
+
+async def set_broadcast_progress_message(
+    broadcast_id: int, progress_message_id: int
+) -> None:
+    """
+    Асинхронно сохраняет ID сообщения Админу с прогрессом рассылки.
+    """
+    async with AsyncSessionLocal() as session:
+        try:
+            await session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id)
+                .values(progress_message_id=progress_message_id)
+            )
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            logger.error(
+                f"Ошибка для рассылки {broadcast_id}: {e} <set_broadcast_progress_message>"
+            )
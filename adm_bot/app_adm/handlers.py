@@ -14,6 +14,7 @@ import app_adm.states as st
 import app_adm.database_adm.requests as rq
 import app_adm.keyboards as kb
 import app_adm.support as sup
+from app_adm.broadcast import start_broadcast
 
 handlers_router = Router()
 
@@ -1580,3 +1581,64 @@ async def handler_confirm_new_pswrd(message: Message, state: FSMContext):
             f"Ошибка для Админа {user_id}: {e} <handler_confirm_new_pswrd>"
         )
         await e_sup.send_message(message, user_id, e_um.common_error_message())
+
+
+@handlers_router.callback_query(F.data == "all_send_message")
+async def handler_all_send_message(callback: CallbackQuery, state: FSMContext):
+    """
+    Обработчик клавиши рассылки сообщения всем клиентам
+    """
+    user_id = callback.from_user.id
+    user_exists = await sup.origin_check_user(user_id, callback.message, state)
+    if not user_exists:
+        return
+    try:
+        await e_sup.delete_messages_from_chat(user_id, callback.message)
+
+        msg = await callback.message.answer(
+            text="Введите текст рассылки:",
+            reply_markup=kb.reject_button,
+        )
+        await e_rq.set_message(user_id, msg.message_id, msg.text)
+
+        await state.set_state(st.Broadcast_State.text)
+    except Exception as e:
+        logger.exception(f"Ошибка для Админа {user_id}: {e} <handler_all_send_message>")
+        await callback.answer(e_um.common_error_message(), show_alert=True)
+
+
+@handlers_router.message(st.Broadcast_State.text)
+async def handler_broadcast_text(message: Message, state: FSMContext):
+    """
+    Обработчик текста рассылки: запускает рассылку в фоне
+    """
+    user_id = message.from_user.id
+    user_exists = await sup.origin_check_user(user_id, message, state)
+    if not user_exists:
+        return
+    try:
+        text = message.text
+        await e_rq.set_message(user_id, message.message_id, text)
+
+        if not text:
+            msg = await message.answer(
+                "Введите текст рассылки:",
+                reply_markup=kb.reject_button,
+            )
+            await e_rq.set_message(user_id, msg.message_id, msg.text)
+            return
+
+        await state.clear()
+        await e_sup.delete_messages_from_chat(user_id, message)
+
+        # Рассылка всем клиентам (роль 1), прогресс приходит отдельным сообщением
+        broadcast_id = await start_broadcast(user_id, text, role_id=1)
+        if broadcast_id is None:
+            await e_sup.send_message(message, user_id, e_um.common_error_message())
+            return
+
+        logger.info(f"Админ {user_id} запустил рассылку {broadcast_id}.")
+    except Exception as e:
+        await state.clear()
+        logger.exception(f"Ошибка для Админа {user_id}: {e} <handler_broadcast_text>")
+        await e_sup.send_message(message, user_id, e_um.common_error_message())
@@ -54,3 +54,7 @@ class Change_PSWRD(StatesGroup):
     old_pswrd = State()
     new_pswrd = State()
     confirm_new_pswrd = State()
+
+
+class Broadcast_State(StatesGroup):
+    text = State()
@@ -71,7 +71,8 @@ async def handler_user_state(user_id: int, message: Message, state: FSMContext):
                     "/delete_promo_code - Удалить промокод\n\n"
                     '/get_doc_hash - Получить хеш документа "Согласие на обработку ПД"\n'
                     '/get_doc_pp - Скачать документ "Согласие на обработку ПД"\n\n'
-                    "/generate_key - Сгенерировать секретный ключ\n\n"
+                    "/generate_key - Сгенерировать секретный ключ\n"
+                    "/clear_geocache - Статистика и очистка кэша геокодирования\n\n"
                     "/set_new_admin - Назначить оператора/администратора\n"
                     "/set_new_driver_admin - Назначить водителя/администратора\n\n"
                     "/change_pswrd - Изменить идентификатор (пароль)"
@@ -16,7 +16,8 @@ from app_adm.handlers import handlers_router
 from app_adm.commands import command_router
 
 from app.database import requests as e_rq
-
+from app.database.message_writer import message_writer
+from app.bot_registry import bot_registry
 
 async def main():
     """
@@ -30,10 +31,8 @@ async def main():
             logger.critical("Token bot ADMIN not found. Please set TOKEN_ADM.")
             return
 
-        bot = Bot(token=bot_token)
-
-        roles_list = [3, 4, 5]
-        await e_rq.send_restart_message(bot, roles_list)
+        # Отправка идет через общий диспетчер исходящих сообщений
+        bot = bot_registry.register(Bot(token=bot_token), "TOKEN_ADM")
 
         dp = Dispatcher()
 
@@ -42,15 +41,25 @@ async def main():
 
         logger.info("ADM_Bot started")
 
+        # Рассылка о перезагрузке идет в фоне с низким приоритетом и уступает
+        # ответам на обновления, которые начнут приходить после запуска поллинга
+        roles_list = [3, 4, 5]
+        restart_task = asyncio.create_task(
+            e_rq.send_restart_message(bot, roles_list), name="restart-message"
+        )
+
         try:
             await dp.start_polling(bot)
         except asyncio.CancelledError:  # Перехватываем CancelledError здесь
             logger.info("ADM_Bot polling task cancelled.")
         finally:
-            await bot.session.close()
+            restart_task.cancel()  # Не отправленные до остановки уже не нужны
+            await bot_registry.close()
 
     except Exception as e:
         logger.exception(f"ADMBot: An unexpected error occurred: {e}")
+    finally:
+        await message_writer.stop()  # Сбрасываем буфер журнала сообщений
 
 
 if __name__ == "__main__":
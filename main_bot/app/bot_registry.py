@@ -0,0 +1,74 @@
+import os
+import logging
+
+from aiogram import Bot
+
+from app.outbound import OutboundRequestMiddleware, outbound_dispatcher
+
+logger = logging.getLogger(__name__)
+
+
+class BotRegistry:
+    """
+    Реестр долгоживущих экземпляров Bot на процесс.
+
+    Задачи планировщика получают бота через get() в момент выполнения
+    и переиспользуют его aiohttp-сессию (пул соединений к Telegram API)
+    вместо создания нового Bot и нового TLS-соединения на каждый запуск.
+    Запросы всех ботов реестра проходят через outbound_dispatcher.
+    """
+
+    def __init__(self):
+        self._bots: dict[str, Bot] = {}
+        self.logger = logger
+
+    def register(self, bot: Bot, token_env: str = "TOKEN_MAIN") -> Bot:
+        """
+        Регистрирует уже созданный экземпляр бота (например, бот поллинга).
+        """
+        self._attach_dispatcher(bot)
+        self._bots[token_env] = bot
+        return bot
+
+    def get(self, token_env: str = "TOKEN_MAIN") -> Bot:
+        """
+        Возвращает бота для токена из переменной окружения token_env,
+        создавая его при первом обращении.
+        """
+        bot = self._bots.get(token_env)
+        if bot is None:
+            token = os.getenv(token_env)
+            if not token:
+                raise RuntimeError(f"Переменная окружения {token_env} не установлена")
+
+            bot = Bot(token=token)
+            self._attach_dispatcher(bot)
+            self._bots[token_env] = bot
+            self.logger.info(f"Создан общий экземпляр бота для {token_env}")
+        return bot
+
+    @staticmethod
+    def _attach_dispatcher(bot: Bot) -> None:
+        if not any(
+            isinstance(middleware, OutboundRequestMiddleware)
+            for middleware in bot.session.middleware
+        ):
+            bot.session.middleware(OutboundRequestMiddleware(outbound_dispatcher))
+
+    async def close(self) -> None:
+        """
+        Закрывает сессии всех зарегистрированных ботов.
+        """
+        await outbound_dispatcher.stop()
+
+        bots, self._bots = self._bots, {}
+        for token_env, bot in bots.items():
+            try:
+                await bot.session.close()
+            except Exception as e:
+                self.logger.error(
+                    f"Ошибка при закрытии сессии бота {token_env}: {e} <BotRegistry.close>"
+                )
+
+
+bot_registry = BotRegistry()
@@ -0,0 +1,215 @@
+import os
+import time
+import asyncio
+import logging
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest
+
+from app.bot_registry import bot_registry
+from app.database import requests as rq
+from app.outbound import PRIORITY_LOW, outbound_dispatcher
+from app.scheduler_manager import scheduler_manager
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastEngine:
+    """
+    Фоновая рассылка сообщений пользователям основного бота.
+
+    Бот администраторов только создает запись рассылки в статусе "running";
+    отправляет ее процесс основного бота, поэтому рассылка делит с живым
+    трафиком одни и те же ограничения outbound_dispatcher и уступает ему
+    (низкий приоритет). Рассылки выполняет лидер планировщика: он раз
+    в poll_interval секунд подхватывает новые и прерванные рассылки.
+    Получатели читаются порциями с ключевой пагинацией по users.id,
+    каждая порция отправляется параллельно (темп задает outbound_dispatcher),
+    после порции в БД сохраняется курсор и счетчики. После перезапуска
+    незавершенные рассылки продолжаются с последней контрольной точки
+    (сообщения текущей порции могут быть отправлены повторно).
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 200,
+        concurrency: int = 30,
+        progress_interval: float = 5.0,
+        poll_interval: float = 5.0,
+    ):
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.progress_interval = progress_interval  # Период обновления прогресса
+        self.poll_interval = poll_interval  # Период поиска новых рассылок
+        self.logger = logger
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._watch_task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch(), name="broadcasts")
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                if (
+                    scheduler_manager.is_leader
+                    or not scheduler_manager.election_enabled
+                ):
+                    await self.resume()
+                elif self._tasks:
+                    await self._stop_tasks()  # Рассылки продолжит новый лидер
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(
+                    f"Ошибка поиска рассылок: {e} <BroadcastEngine._watch>"
+                )
+            await asyncio.sleep(self.poll_interval)
+
+    async def resume(self) -> None:
+        """
+        Запускает новые рассылки и продолжает прерванные перезапуском бота.
+        """
+        for broadcast in await rq.get_running_broadcasts():
+            if broadcast.id not in self._tasks:
+                self.logger.info(
+                    f"Запуск рассылки {broadcast.id} с users.id > {broadcast.last_user_id}"
+                )
+                self._spawn(broadcast.id)
+
+    async def stop(self) -> None:
+        """
+        Останавливает фоновые рассылки (прогресс сохранен в контрольных точках).
+        """
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+        await self._stop_tasks()
+
+    async def _stop_tasks(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def _spawn(self, broadcast_id: int) -> None:
+        task = asyncio.create_task(self._run(broadcast_id))
+        self._tasks[broadcast_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
+
+    async def _run(self, broadcast_id: int) -> None:
+        broadcast = await rq.get_broadcast(broadcast_id)
+        if broadcast is None:
+            return
+
+        main_bot = bot_registry.get("TOKEN_MAIN")
+        semaphore = asyncio.Semaphore(self.concurrency)
+        cursor = broadcast.last_user_id
+        sent_total = broadcast.sent_count
+        failed_total = broadcast.failed_count
+        reported_at = 0.0
+
+        async def send(tg_id: int) -> bool:
+            async with semaphore:
+                try:
+                    msg = await main_bot.send_message(
+                        chat_id=tg_id, text=broadcast.text
+                    )
+                    await rq.set_message(tg_id, msg.message_id, msg.text)
+                    return True
+                except (TelegramForbiddenError, TelegramBadRequest) as e:
+                    # Пользователь заблокировал бота или чат недоступен
+                    self.logger.info(
+                        f"Рассылка {broadcast_id}: чат {tg_id} недоступен: {e} <BroadcastEngine._run>"
+                    )
+                    return False
+                except Exception as e:
+                    self.logger.error(
+                        f"Рассылка {broadcast_id}: ошибка отправки в чат {tg_id}: {e} <BroadcastEngine._run>"
+                    )
+                    return False
+
+        try:
+            with outbound_dispatcher.priority(PRIORITY_LOW):
+                while True:
+                    recipients = await rq.get_broadcast_recipients(
+                        broadcast.role_id, cursor, self.chunk_size
+                    )
+                    if not recipients:
+                        break
+
+                    results = await asyncio.gather(
+                        *(send(tg_id) for _, tg_id in recipients)
+                    )
+                    sent = sum(results)
+                    failed = len(results) - sent
+                    cursor = recipients[-1][0]
+
+                    await rq.save_broadcast_progress(broadcast_id, cursor, sent, failed)
+                    sent_total += sent
+                    failed_total += failed
+
+                    if time.monotonic() - reported_at >= self.progress_interval:
+                        reported_at = time.monotonic()
+                        await self._report(
+                            broadcast,
+                            self.progress_text(broadcast_id, sent_total, failed_total),
+                        )
+
+            await rq.save_broadcast_progress(broadcast_id, cursor, 0, 0, "finished")
+            await self._report(
+                broadcast,
+                self.progress_text(broadcast_id, sent_total, failed_total, True),
+            )
+            self.logger.info(
+                f"Рассылка {broadcast_id} завершена: отправлено {sent_total}, ошибок {failed_total}"
+            )
+        except asyncio.CancelledError:
+            self.logger.info(
+                f"Рассылка {broadcast_id} приостановлена на users.id {cursor}"
+            )
+            raise
+        except Exception as e:
+            self.logger.exception(
+                f"Ошибка рассылки {broadcast_id}: {e} <BroadcastEngine._run>"
+            )
+            await rq.save_broadcast_progress(broadcast_id, cursor, 0, 0, "failed")
+
+    async def _report(self, broadcast, text: str) -> None:
+        if broadcast.progress_message_id is None:
+            broadcast = await rq.get_broadcast(broadcast.id)
+            if broadcast is None or broadcast.progress_message_id is None:
+                return
+        try:
+            adm_bot = bot_registry.get("TOKEN_ADM")
+            await adm_bot.edit_message_text(
+                chat_id=broadcast.admin_tg_id,
+                message_id=broadcast.progress_message_id,
+                text=text,
+            )
+        except Exception as e:
+            self.logger.warning(
+                f"Не удалось обновить прогресс рассылки {broadcast.id}: {e} <BroadcastEngine._report>"
+            )
+
+    @staticmethod
+    def progress_text(
+        broadcast_id: int, sent: int, failed: int, is_finished: bool = False
+    ) -> str:
+        status = "завершена✅" if is_finished else "выполняется⏳"
+        return (
+            f"Рассылка №{broadcast_id} {status}\n\n"
+            f"Отправлено: {sent}\nНе доставлено: {failed}"
+        )
+
+
+broadcast_engine = BroadcastEngine(
+    chunk_size=int(os.getenv("BROADCAST_CHUNK_SIZE", "200")),
+    concurrency=int(os.getenv("BROADCAST_CONCURRENCY", "30")),
+    poll_interval=float(os.getenv("BROADCAST_POLL_INTERVAL", "5")),
+)
@@ -11,6 +11,9 @@ import app.support as sup
 import app.user_messages as um
 import app.database.requests as rq
 import app.keyboards as kb
+from app.driver_index import driver_index
+from app.geo import Coord, yandex_route_url
+from app.heatmap import demand_heatmap
 
 command_router = Router()
 
@@ -235,6 +238,74 @@ async def cmd_profile(message: Message, state: FSMContext):
         await sup.send_message(message, user_id, um.common_error_message())
 
 
+@command_router.message(Command("hot_zones"))
+async def cmd_hot_zones(message: Message, state: FSMContext):
+    """
+    Обработчик команды /hot_zones.
+
+    Показывает водителю зоны повышенного спроса рядом с его последней
+    известной позицией на текущий час недели по тепловой карте заказов.
+    В случае ошибки логирует ее и отправляет сообщение об ошибке.
+    """
+    user_id = message.from_user.id
+    if not await sup.origin_check_user(user_id, message, state):
+        return
+
+    try:
+        await rq.set_message(user_id, message.message_id, message.text)
+
+        data = await state.get_data()
+        task = data.get("task")
+
+        if task is None:
+            await sup.delete_messages_from_chat(user_id, message)
+
+        driver_id = await rq.get_driver(user_id)
+        if driver_id is None:
+            await sup.send_message(
+                message, user_id, "Команда доступна только водителям."
+            )
+            return
+
+        positions = await driver_index.get_positions(
+            [user_id], max_age=driver_index.max_age
+        )
+        position = positions.get(user_id)
+        if position is None:
+            await sup.send_message(
+                message,
+                user_id,
+                "Не удалось определить ваше местоположение. "
+                "Выйдите на линию и поделитесь трансляцией геопозиции.",
+            )
+            return
+
+        zones = demand_heatmap.hot_zones(Coord(*position))
+        if not zones:
+            await sup.send_message(
+                message, user_id, "Рядом с вами пока нет данных о спросе в это время."
+            )
+            return
+
+        lines = ["*Горячие зоны рядом с вами*\n"]
+        for number, (center, demand) in enumerate(zones, start=1):
+            url = yandex_route_url(None, center)
+            demand_text = sup.escape_markdown(f"{demand:.1f}")
+            lines.append(
+                f"{number}\\) [Маршрут]({url}) — \\~{demand_text} заказа в час"
+            )
+
+        msg = await message.answer(
+            "\n".join(lines),
+            parse_mode="MarkdownV2",
+            disable_web_page_preview=True,
+        )
+        await rq.set_message(user_id, msg.message_id, msg.text)
+    except Exception as e:
+        logger.exception(f"Ошибка для пользователя {user_id}: {e} <cmd_hot_zones>")
+        await sup.send_message(message, user_id, um.common_error_message())
+
+
 @command_router.message(Command("help"))
 async def cmd_help(message: Message, state: FSMContext):
     """
@@ -0,0 +1,284 @@
+import os
+import time
+import asyncio
+import logging
+
+from redis.asyncio import Redis
+from sqlalchemy import insert
+
+from app.database.models import AsyncSessionLocal, User_message
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWriter:
+    """
+    Буфер отложенной записи журнала сообщений (таблица messages).
+
+    Строки копятся в памяти и записываются одним многострочным INSERT,
+    когда набирается batch_size строк или проходит flush_interval секунд.
+    Еще не записанные строки доступны через take/last/discard,
+    чтобы удаление и чтение сообщений видели только что отправленные.
+
+    Буфер свой у каждого процесса (main_bot, adm_bot). Когда бот
+    администраторов очищает таблицу, он записывает время очистки в Redis
+    (mark_wiped), и перед записью каждый процесс отбрасывает строки,
+    добавленные раньше этого времени. Время очистки читается из Redis
+    не чаще раза в wiped_cache_ttl секунд.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        max_pending: int = 10_000,
+        redis_url: str = "redis://localhost:6379/0",
+        wiped_key: str = "messages:wiped_at",
+        wiped_cache_ttl: float = 5.0,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval  # Период записи в секундах
+        self.max_pending = max_pending  # Предел буфера при ошибках записи
+        self.redis_url = redis_url
+        self.wiped_key = wiped_key
+        self.wiped_cache_ttl = wiped_cache_ttl
+        # Время очистки из Redis и когда оно прочитано (time.monotonic)
+        self._wiped_cache: tuple[float, float] | None = None
+        self.logger = logging.getLogger(__name__)
+        self._redis: Redis | None = None
+        self._rows: list[dict] = []
+        self._lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+        self._timer_task: asyncio.Task | None = None
+
+    def add(
+        self,
+        user_id: int,
+        message_id: int,
+        text: str,
+        order_id: int | None = None,
+        kind: str | None = None,
+    ) -> None:
+        """
+        Добавляет строку журнала сообщений в буфер.
+        """
+        self._rows.append(
+            {
+                "user_id": user_id,
+                "message_id": message_id,
+                "text": text,
+                "chat_id": user_id,
+                "order_id": order_id,
+                "kind": kind,
+                "added_at": time.time(),
+            }
+        )
+
+        if len(self._rows) >= self.batch_size:
+            self._schedule_flush()
+        else:
+            self._ensure_timer()
+
+    async def take(self, user_id: int) -> list[User_message]:
+        """
+        Извлекает из буфера еще не записанные сообщения пользователя.
+
+        Дожидается текущей записи, поэтому строки, которые уже отправлены в БД,
+        к моменту возврата видны запросам к таблице.
+
+        Returns:
+            Список несохраненных объектов User_message.
+        """
+        async with self._lock:
+            taken = [row for row in self._rows if row["user_id"] == user_id]
+            if taken:
+                self._rows = [row for row in self._rows if row["user_id"] != user_id]
+        return [_to_message(row) for row in taken]
+
+    async def restore(self, messages: list[User_message]) -> None:
+        """
+        Возвращает в буфер сообщения, извлеченные take, если их удаление
+        не удалось.
+        """
+        if not messages:
+            return
+        rows = [
+            {
+                "user_id": message.user_id,
+                "message_id": message.message_id,
+                "text": message.text,
+                "chat_id": message.chat_id,
+                "order_id": message.order_id,
+                "kind": message.kind,
+                "added_at": time.time(),
+            }
+            for message in messages
+        ]
+        async with self._lock:
+            self._rows = rows + self._rows
+        self._ensure_timer()
+
+    async def last(self, user_id: int) -> User_message | None:
+        """
+        Возвращает последнее еще не записанное сообщение пользователя.
+
+        Returns:
+            Объект User_message или None, если в буфере нет сообщений пользователя.
+        """
+        async with self._lock:
+            rows = [row for row in self._rows if row["user_id"] == user_id]
+        if not rows:
+            return None
+        return _to_message(max(rows, key=lambda row: row["message_id"]))
+
+    async def last_order_message(
+        self, chat_id: int, order_id: int, kinds: list[str] | None = None
+    ) -> int | None:
+        """
+        Ищет в буфере последнее сообщение о заказе в чате.
+
+        Дожидается текущей записи, поэтому если в буфере сообщения нет,
+        его можно искать в таблице без принудительной записи буфера.
+
+        Returns:
+            ID сообщения или None, если в буфере такого сообщения нет.
+        """
+        async with self._lock:
+            rows = [
+                row
+                for row in self._rows
+                if row["chat_id"] == chat_id
+                and row["order_id"] == order_id
+                and (not kinds or row["kind"] in kinds)
+            ]
+        return rows[-1]["message_id"] if rows else None
+
+    async def discard(
+        self,
+        user_id: int | None = None,
+        message_id: int | None = None,
+        order_id: int | None = None,
+    ) -> None:
+        """
+        Удаляет из буфера строки пользователя, с указанным ID сообщения
+        и/или об указанном заказе.
+        """
+        async with self._lock:
+            self._rows = [
+                row
+                for row in self._rows
+                if not (
+                    (user_id is None or row["user_id"] == user_id)
+                    and (message_id is None or row["message_id"] == message_id)
+                    and (order_id is None or row["order_id"] == order_id)
+                )
+            ]
+
+    async def flush(self) -> None:
+        """
+        Записывает накопленные строки одним многострочным INSERT.
+        """
+        async with self._lock:
+            if not self._rows:
+                return
+
+            rows, self._rows = self._rows, []
+            wiped_at = await self._wiped_at()
+            rows = [row for row in rows if row["added_at"] > wiped_at]
+            if not rows:
+                return
+
+            async with AsyncSessionLocal() as session:
+                try:
+                    await session.execute(
+                        insert(User_message).values([_columns(row) for row in rows])
+                    )
+                    await session.commit()
+                except Exception as e:
+                    await session.rollback()
+                    self.logger.error(
+                        f"Ошибка при записи {len(rows)} сообщений: {e} <MessageWriter.flush>"
+                    )
+                    # Возвращаем строки в буфер для следующей попытки
+                    if len(rows) + len(self._rows) <= self.max_pending:
+                        self._rows = rows + self._rows
+
+    async def mark_wiped(self, wiped_at: float) -> None:
+        """
+        Сообщает всем процессам, что таблица очищена в момент wiped_at:
+        строки, добавленные раньше, не будут записаны.
+        """
+        await self.discard()
+        self._wiped_cache = (wiped_at, time.monotonic())
+        try:
+            await self._get_redis().set(self.wiped_key, wiped_at)
+        except Exception as e:
+            self.logger.error(
+                f"Не удалось сохранить время очистки журнала: {e} <MessageWriter.mark_wiped>"
+            )
+
+    async def _wiped_at(self) -> float:
+        now = time.monotonic()
+        if (
+            self._wiped_cache is not None
+            and now - self._wiped_cache[1] < self.wiped_cache_ttl
+        ):
+            return self._wiped_cache[0]
+        try:
+            value = await self._get_redis().get(self.wiped_key)
+            wiped_at = float(value) if value is not None else 0.0
+        except Exception as e:
+            self.logger.error(
+                f"Не удалось получить время очистки журнала: {e} <MessageWriter._wiped_at>"
+            )
+            return self._wiped_cache[0] if self._wiped_cache is not None else 0.0
+        self._wiped_cache = (wiped_at, now)
+        return wiped_at
+
+    def _get_redis(self) -> Redis:
+        if self._redis is None:
+            self._redis = Redis.from_url(self.redis_url)
+        return self._redis
+
+    async def stop(self) -> None:
+        """
+        Останавливает периодическую запись и сбрасывает буфер в БД.
+        """
+        if self._timer_task is not None and not self._timer_task.done():
+            self._timer_task.cancel()
+            try:
+                await self._timer_task
+            except asyncio.CancelledError:
+                pass
+        self._timer_task = None
+
+        if self._flush_task is not None and not self._flush_task.done():
+            await self._flush_task
+
+        await self.flush()
+        self.logger.info("Буфер журнала сообщений сброшен <MessageWriter.stop>")
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+
+    def _ensure_timer(self) -> None:
+        if self._timer_task is None or self._timer_task.done():
+            self._timer_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+
+def _columns(row: dict) -> dict:
+    return {key: value for key, value in row.items() if key != "added_at"}
+
+
+def _to_message(row: dict) -> User_message:
+    return User_message(**_columns(row))
+
+
+message_writer = MessageWriter(
+    redis_url=os.getenv("REDIS_URL", "redis://localhost:6379/0")
+)
@@ -0,0 +1,255 @@
+import argparse
+import asyncio
+import logging
+import os
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки, чтобы миграции не применялись параллельно
+# при одновременном запуске нескольких процессов.
+MIGRATIONS_LOCK_KEY = 7_310_245
+
+# Версионированные изменения схемы: (версия, описание, SQL-команды).
+# Новые изменения добавляются в конец списка с увеличением версии,
+# уже примененные версии не редактируются.
+MIGRATIONS: list[tuple[int, str, list[str]]] = [
+    (
+        1,
+        "индексы для частых выборок",
+        [
+            "CREATE INDEX IF NOT EXISTS ix_users_tg_id ON users (tg_id)",
+            "CREATE INDEX IF NOT EXISTS ix_messages_user_id ON messages (user_id)",
+            "CREATE INDEX IF NOT EXISTS ix_order_histories_order_id "
+            "ON order_histories (order_id)",
+            "CREATE INDEX IF NOT EXISTS ix_orders_client_id ON orders (client_id)",
+            "CREATE INDEX IF NOT EXISTS ix_orders_status_id ON orders (status_id)",
+            "CREATE INDEX IF NOT EXISTS ix_current_orders_driver_tg_id "
+            "ON current_orders (driver_tg_id)",
+            "CREATE INDEX IF NOT EXISTS ix_current_orders_client_tg_id "
+            "ON current_orders (client_tg_id)",
+            "CREATE INDEX IF NOT EXISTS ix_drivers_user_id ON drivers (user_id)",
+        ],
+    ),
+    (
+        2,
+        "реестр сообщений: chat_id, order_id, kind",
+        [
+            "ALTER TABLE messages ADD COLUMN IF NOT EXISTS chat_id BIGINT",
+            "ALTER TABLE messages ADD COLUMN IF NOT EXISTS order_id INTEGER",
+            "ALTER TABLE messages ADD COLUMN IF NOT EXISTS kind VARCHAR(30)",
+            "UPDATE messages SET chat_id = user_id WHERE chat_id IS NULL",
+            # Сообщения с заказами в группе (ID группы отрицательный)
+            "UPDATE messages SET "
+            "order_id = substring(text from '^Заказ №([0-9]+)')::integer, "
+            "kind = CASE WHEN text LIKE '%на рассмотрении' "
+            "THEN 'group_review' ELSE 'group_order' END "
+            "WHERE user_id < 0 AND order_id IS NULL AND text ~ '^Заказ №[0-9]+'",
+            "CREATE INDEX IF NOT EXISTS ix_messages_chat_id_order_id_kind "
+            "ON messages (chat_id, order_id, kind)",
+        ],
+    ),
+    (
+        3,
+        "числовые координаты заказов и геохеш точки подачи",
+        [
+            "ALTER TABLE orders ADD COLUMN IF NOT EXISTS start_lat DOUBLE PRECISION",
+            "ALTER TABLE orders ADD COLUMN IF NOT EXISTS start_lon DOUBLE PRECISION",
+            "ALTER TABLE orders ADD COLUMN IF NOT EXISTS start_geohash VARCHAR(12)",
+            "ALTER TABLE orders ADD COLUMN IF NOT EXISTS finish_lat DOUBLE PRECISION",
+            "ALTER TABLE orders ADD COLUMN IF NOT EXISTS finish_lon DOUBLE PRECISION",
+            "ALTER TABLE current_orders "
+            "ADD COLUMN IF NOT EXISTS driver_lat DOUBLE PRECISION",
+            "ALTER TABLE current_orders "
+            "ADD COLUMN IF NOT EXISTS driver_lon DOUBLE PRECISION",
+            "CREATE INDEX IF NOT EXISTS ix_orders_start_geohash "
+            "ON orders (start_geohash text_pattern_ops)",
+        ],
+    ),
+    (
+        4,
+        "реестр сообщений: order_id для предзаказов в группе",
+        [
+            # Версия 2 пропустила сообщения "‼️ПРЕДЗАКАЗ‼️\n\nЗаказ №..."
+            "UPDATE messages SET "
+            "order_id = substring(text from "
+            "'^(?:\\S*ПРЕДЗАКАЗ\\S*\\s+)?Заказ №([0-9]+)')::integer, "
+            "kind = CASE WHEN text LIKE '%на рассмотрении' "
+            "THEN 'group_review' ELSE 'group_order' END "
+            "WHERE user_id < 0 AND order_id IS NULL "
+            "AND text ~ '^(?:\\S*ПРЕДЗАКАЗ\\S*\\s+)?Заказ №[0-9]+'",
+        ],
+    ),
+]
+
+
+async def _ensure_migrations_table(conn) -> None:
+    await conn.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, "
+            "name TEXT NOT NULL, "
+            "applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+        )
+    )
+
+
+async def get_applied_versions(engine: AsyncEngine) -> set[int]:
+    """
+    Асинхронно получает номера уже примененных миграций.
+
+    Returns:
+        Множество номеров версий.
+    """
+    async with engine.begin() as conn:
+        await _ensure_migrations_table(conn)
+        result = await conn.execute(text("SELECT version FROM schema_migrations"))
+        return {row[0] for row in result.fetchall()}
+
+
+async def run_migrations(engine: AsyncEngine) -> list[int]:
+    """
+    Асинхронно применяет неприменённые миграции по порядку версий.
+
+    Каждая миграция выполняется в отдельной транзакции вместе с записью
+    в таблицу schema_migrations.
+
+    Returns:
+        Список примененных версий.
+    """
+    applied = []
+
+    for version, name, statements in sorted(MIGRATIONS, key=lambda m: m[0]):
+        try:
+            async with engine.begin() as conn:
+                await _ensure_migrations_table(conn)
+                await conn.execute(
+                    text("SELECT pg_advisory_xact_lock(:key)"),
+                    {"key": MIGRATIONS_LOCK_KEY},
+                )
+
+                is_applied = await conn.scalar(
+                    text("SELECT 1 FROM schema_migrations WHERE version = :version"),
+                    {"version": version},
+                )
+                if is_applied:
+                    continue
+
+                for statement in statements:
+                    await conn.execute(text(statement))
+
+                await conn.execute(
+                    text(
+                        "INSERT INTO schema_migrations (version, name) "
+                        "VALUES (:version, :name)"
+                    ),
+                    {"version": version, "name": name},
+                )
+
+            applied.append(version)
+            logger.info(f"Применена миграция {version}: {name} <run_migrations>")
+        except Exception as e:
+            logger.error(
+                f"Ошибка при применении миграции {version}: {e} <run_migrations>"
+            )
+            raise
+
+    return applied
+
+
+async def backfill_order_coords(engine: AsyncEngine, batch_size: int = 1000) -> int:
+    """
+    Асинхронно заполняет числовые координаты и геохеш у существующих заказов
+    (миграция 3) по зашифрованным колонкам. Требует DATA_ENCRYPTION_KEY.
+
+    Returns:
+        Количество обновленных заказов.
+    """
+    from cryptography.fernet import Fernet
+
+    from app.geo import parse_coord
+
+    cipher = Fernet(os.getenv("DATA_ENCRYPTION_KEY").encode())
+
+    def decrypt(value: str | None):
+        try:
+            return parse_coord(cipher.decrypt(value).decode())
+        except Exception:
+            return None  # "-", почасовой тариф и старые форматы
+
+    updated = 0
+    last_id = 0
+    while True:
+        async with engine.begin() as conn:
+            rows = (
+                await conn.execute(
+                    text(
+                        "SELECT id, start_coords, finish_coords FROM orders "
+                        "WHERE id > :last_id AND start_geohash IS NULL "
+                        "ORDER BY id LIMIT :limit"
+                    ),
+                    {"last_id": last_id, "limit": batch_size},
+                )
+            ).fetchall()
+            if not rows:
+                return updated
+
+            for order_id, start_coords, finish_coords in rows:
+                start = decrypt(start_coords)
+                finish = decrypt(finish_coords)
+                if start is None:
+                    continue
+                start = start.rounded()
+                finish = finish.rounded() if finish is not None else None
+                await conn.execute(
+                    text(
+                        "UPDATE orders SET start_lat = :start_lat, "
+                        "start_lon = :start_lon, start_geohash = :geohash, "
+                        "finish_lat = :finish_lat, finish_lon = :finish_lon "
+                        "WHERE id = :id"
+                    ),
+                    {
+                        "id": order_id,
+                        "start_lat": start.lat,
+                        "start_lon": start.lon,
+                        "geohash": start.geohash(),
+                        "finish_lat": finish.lat if finish else None,
+                        "finish_lon": finish.lon if finish else None,
+                    },
+                )
+                updated += 1
+            last_id = rows[-1][0]
+
+
+async def _cli(command: str) -> None:
+    engine = create_async_engine(url=os.getenv("SQLALCHEMY_URL"))
+    try:
+        if command == "upgrade":
+            applied = await run_migrations(engine)
+            print(f"Применено миграций: {len(applied)} {applied}")
+        elif command == "backfill-coords":
+            updated = await backfill_order_coords(engine)
+            print(f"Заполнены координаты заказов: {updated}")
+        else:
+            applied = await get_applied_versions(engine)
+            for version, name, _ in sorted(MIGRATIONS, key=lambda m: m[0]):
+                mark = "x" if version in applied else " "
+                print(f"[{mark}] {version}: {name}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    # Запуск из каталога main_bot: python -m app.database.migrations upgrade
+    parser = argparse.ArgumentParser(description="Миграции схемы базы данных")
+    parser.add_argument("command", choices=["upgrade", "status", "backfill-coords"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_cli(args.command))
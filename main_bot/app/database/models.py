@@ -7,6 +7,8 @@ from sqlalchemy import (
     Numeric,
     Boolean,
     Identity,
+    Index,
+    Double,
     select,
     func,
 )
@@ -15,6 +17,8 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.exc import IntegrityError
 
+from app.database.migrations import run_migrations
+
 import os
 import logging
 from dotenv import load_dotenv
@@ -65,7 +69,7 @@ class User(Base):
     id: Mapped[int] = mapped_column(
         Integer, primary_key=True, server_default=Identity()
     )
-    tg_id = mapped_column(BigInteger)
+    tg_id = mapped_column(BigInteger, index=True)
     username: Mapped[str] = mapped_column(Text)
     name: Mapped[str] = mapped_column(String(50))
     contact: Mapped[str] = mapped_column(String(150))
@@ -97,7 +101,7 @@ class Driver(Base):
         Integer, primary_key=True, server_default=Identity()
     )
     user_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("users.id", ondelete="CASCADE")
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True
     )
     region: Mapped[str] = mapped_column(String(20))
     model_car: Mapped[str] = mapped_column(String(50))
@@ -141,17 +145,31 @@ class Feedback(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Поиск по префиксу геохеша (заказы в районе точки)
+        Index(
+            "ix_orders_start_geohash",
+            "start_geohash",
+            postgresql_ops={"start_geohash": "text_pattern_ops"},
+        ),
+    )
 
     id: Mapped[int] = mapped_column(
         Integer, primary_key=True, server_default=Identity()
     )
     client_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("clients.id", ondelete="CASCADE")
+        Integer, ForeignKey("clients.id", ondelete="CASCADE"), index=True
     )
     start: Mapped[str] = mapped_column(Text)
     start_coords: Mapped[str] = mapped_column(String(150))
     finish: Mapped[str] = mapped_column(Text)
     finish_coords: Mapped[str] = mapped_column(String(150))
+    # Открытые координаты с точностью около 100 м (точные — в *_coords)
+    start_lat: Mapped[float] = mapped_column(Double, nullable=True)
+    start_lon: Mapped[float] = mapped_column(Double, nullable=True)
+    start_geohash: Mapped[str] = mapped_column(String(12), nullable=True)
+    finish_lat: Mapped[float] = mapped_column(Double, nullable=True)
+    finish_lon: Mapped[float] = mapped_column(Double, nullable=True)
     distance: Mapped[str] = mapped_column(String(20))
     submission_time: Mapped[str] = mapped_column(String(30))
     trip_time: Mapped[str] = mapped_column(String(30))
@@ -159,7 +177,9 @@ class Order(Base):
     payment_method: Mapped[str] = mapped_column(String(30), default="-")
     payment_with_bonuses: Mapped[int] = mapped_column(Integer, default=0)
     comment: Mapped[str] = mapped_column(Text)
-    status_id: Mapped[int] = mapped_column(Integer, ForeignKey("statuses.id"))
+    status_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("statuses.id"), index=True
+    )
     rate_id: Mapped[int] = mapped_column(Integer, ForeignKey("rates.id"))
     is_deleted: Mapped[bool] = mapped_column(Boolean, default=False)
 
@@ -171,7 +191,7 @@ class Order_history(Base):
         Integer, primary_key=True, server_default=Identity()
     )
     order_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("orders.id", ondelete="CASCADE")
+        Integer, ForeignKey("orders.id", ondelete="CASCADE"), index=True
     )
     driver_id: Mapped[int] = mapped_column(
         Integer, ForeignKey("drivers.id", ondelete="CASCADE"), nullable=True
@@ -194,14 +214,16 @@ class Current_Order(Base):
     driver_id: Mapped[int] = mapped_column(
         Integer, ForeignKey("drivers.id", ondelete="CASCADE")
     )
-    driver_tg_id = mapped_column(BigInteger)
+    driver_tg_id = mapped_column(BigInteger, index=True)
     driver_username: Mapped[str] = mapped_column(Text)
     driver_location: Mapped[str] = mapped_column(Text)
     driver_coords: Mapped[str] = mapped_column(String(150))
+    driver_lat: Mapped[float] = mapped_column(Double, nullable=True)
+    driver_lon: Mapped[float] = mapped_column(Double, nullable=True)
     client_id: Mapped[int] = mapped_column(
         Integer, ForeignKey("clients.id", ondelete="CASCADE")
     )
-    client_tg_id = mapped_column(BigInteger)
+    client_tg_id = mapped_column(BigInteger, index=True)
     client_username: Mapped[str] = mapped_column(Text)
     total_time_to_client: Mapped[str] = mapped_column(String(30))
     scheduled_arrival_time_to_client: Mapped[str] = mapped_column(String(30))
@@ -214,13 +236,19 @@ class Current_Order(Base):
 
 class User_message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_chat_id_order_id_kind", "chat_id", "order_id", "kind"),
+    )
 
     id: Mapped[int] = mapped_column(
         Integer, primary_key=True, server_default=Identity()
     )
-    user_id = mapped_column(BigInteger)
+    user_id = mapped_column(BigInteger, index=True)
     message_id: Mapped[int] = mapped_column(Integer)
     text: Mapped[str] = mapped_column(Text)
+    chat_id = mapped_column(BigInteger, nullable=True)
+    order_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    kind: Mapped[str] = mapped_column(String(30), nullable=True)
 
 
 class Secret_Key(Base):
@@ -282,7 +310,25 @@ class Privacy_Policy_Signature(Base):
     signed_at: Mapped[str] = mapped_column(Text)
     document_version: Mapped[str] = mapped_column(Text)
     document_hash: Mapped[str] = mapped_column(Text)
-    
+
+
+class Broadcast(Base):
+    __tablename__ = "broadcasts"
+
+    id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, server_default=Identity()
+    )
+    admin_tg_id = mapped_column(BigInteger)
+    text: Mapped[str] = mapped_column(Text)
+    role_id: Mapped[int] = mapped_column(Integer, ForeignKey("roles.id"), nullable=True)
+    status: Mapped[str] = mapped_column(String(20), index=True)
+    last_user_id: Mapped[int] = mapped_column(Integer, default=0)
+    sent_count: Mapped[int] = mapped_column(Integer, default=0)
+    failed_count: Mapped[int] = mapped_column(Integer, default=0)
+    progress_message_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    created_at: Mapped[str] = mapped_column(Text)
+    finished_at: Mapped[str] = mapped_column(Text, nullable=True)
+
 
 async def fill_initial_data(async_session_maker: sessionmaker):
     async with async_session_maker() as session:
@@ -350,4 +396,5 @@ async def fill_initial_data(async_session_maker: sessionmaker):
 async def async_main():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    await run_migrations(engine)
     await fill_initial_data(AsyncSessionLocal)
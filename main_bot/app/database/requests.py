@@ -3,17 +3,24 @@ import logging
 import asyncio
 import pytz
 import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, fields
 
-from sqlalchemy import select, delete, desc, func, update, asc
+from sqlalchemy import select, delete, desc, func, update, asc, or_, event
 from sqlalchemy.exc import IntegrityError
-from typing import Tuple, Union
+from sqlalchemy.orm import aliased
+from typing import Awaitable, Callable, Tuple, Union
 
 from decimal import Decimal
 from asyncpg.exceptions import UniqueViolationError
 
 from app import support as sup
-from app.scheduler_manager import scheduler_manager
+from app.timers import ORDER_TIMEOUT, order_timers
 from app.database.models import AsyncSessionLocal, AsyncSession
+from app.database.message_writer import message_writer
+from app.outbound import PRIORITY_LOW, outbound_dispatcher
+from app.driver_index import driver_index
+from app.geo import Coord, geohash_area
 from app.database.models import (
     User,
     Client,
@@ -30,6 +37,7 @@ from app.database.models import (
     Admin,
     Used_Referral_Link,
     Privacy_Policy_Signature,
+    Broadcast,
 )
 
 from aiogram import Bot
@@ -37,6 +45,105 @@ from aiogram.types import Message
 
 logger = logging.getLogger(__name__)
 
+# Виды сообщений о заказе в реестре сообщений (User_message.kind)
+MESSAGE_KIND_GROUP_ORDER = "group_order"  # заказ, опубликованный в группе
+MESSAGE_KIND_GROUP_REVIEW = "group_review"  # заказ на рассмотрении у водителя
+MESSAGE_KIND_DRIVER_OFFER = "driver_offer"  # предложение заказа водителю
+
+
+@asynccontextmanager
+async def unit_of_work():
+    """
+    Открывает сессию-единицу работы, общую для нескольких запросов.
+
+    Функции модуля, получившие такую сессию, только сбрасывают изменения (flush),
+    а фиксация происходит один раз при выходе из контекста (или раньше, если
+    обработчик сам вызвал session.commit()). Ошибку такие функции пробрасывают,
+    и все изменения единицы работы откатываются. Действия вне БД, отложенные
+    через after_commit, выполняются при выходе, если их изменения были
+    зафиксированы; откат отменяет действия, отложенные после прошлой фиксации.
+    """
+    async with AsyncSessionLocal() as session:
+        pending, committed = [], []
+        session.info["unit_of_work"] = True
+        session.info["after_commit"] = pending
+
+        def on_commit(_):
+            committed.extend(pending)
+            pending.clear()
+
+        event.listen(session.sync_session, "after_commit", on_commit)
+        event.listen(session.sync_session, "after_rollback", lambda _: pending.clear())
+        try:
+            yield session
+            if session.info.get("rollback_only"):
+                await session.rollback()  # Шаг упал, а обработчик поймал ошибку
+            elif session.in_transaction():
+                await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            for action in committed:
+                try:
+                    await action()
+                except Exception as e:
+                    logger.error(f"Ошибка действия после фиксации: {e} <unit_of_work>")
+
+
+@asynccontextmanager
+async def session_scope(session: AsyncSession | None = None):
+    """
+    Возвращает переданную сессию или открывает новую, если сессия не передана.
+    """
+    if session is not None:
+        yield session
+    else:
+        async with AsyncSessionLocal() as new_session:
+            yield new_session
+
+
+async def after_commit(
+    session: AsyncSession, action: Callable[[], Awaitable[None]]
+) -> None:
+    """
+    Выполняет действие вне БД (например, обновление индекса в Redis) после
+    фиксации изменений: для сессии-единицы работы откладывает его до выхода
+    из unit_of_work, иначе выполняет сразу.
+    """
+    if session.info.get("unit_of_work"):
+        session.info["after_commit"].append(action)
+    else:
+        await action()
+
+
+async def rollback_session(session: AsyncSession, error: Exception) -> None:
+    """
+    Откатывает изменения сессии после ошибки.
+
+    Сессию-единицу работы откатывать здесь нельзя: откат отменил бы изменения
+    предыдущих шагов обработчика, а обработчик продолжил бы работу
+    и зафиксировал частичное состояние. Поэтому ошибка пробрасывается,
+    а сессия помечается на откат при выходе из unit_of_work.
+    """
+    if session.info.get("unit_of_work"):
+        session.info["rollback_only"] = True
+        raise error
+    await session.rollback()
+
+
+async def commit_session(session: AsyncSession) -> None:
+    """
+    Фиксирует изменения сессии.
+
+    Для сессии-единицы работы только сбрасывает изменения в БД,
+    фиксация выполняется владельцем сессии.
+    """
+    if session.info.get("unit_of_work"):
+        await session.flush()
+    else:
+        await session.commit()
+
 
 async def set_user(
     tg_id: int, username: str, name: str, contact: str, role_id: int
@@ -155,7 +262,7 @@ async def set_driver(
             else:
                 if user.contact != contact:
                     user.contact = contact
-                    
+
                 user.name = name
 
                 driver = await session.scalar(
@@ -176,6 +283,7 @@ async def set_driver(
                 )
 
             await session.commit()
+            await driver_index.set_online(tg_id, status_id == 1)
         except Exception as e:
             await session.rollback()
             logger.error(f"Ошибка для водителя {tg_id}: {e} <set_driver>")
@@ -194,9 +302,14 @@ async def set_order(
     comment: str,
     status_id: int,
     rate_id: int,
+    start_point: Coord | None = None,
+    finish_point: Coord | None = None,
 ) -> None:
     """
     Асинхронно создает новый заказ в базе данных.
+
+    start_coords и finish_coords передаются зашифрованными, start_point
+    и finish_point - открытые координаты для числовых колонок (округляются).
     """
     async with AsyncSessionLocal() as session:
         try:
@@ -214,6 +327,12 @@ async def set_order(
                 status_id=status_id,
                 rate_id=rate_id,
             )
+            if start_point is not None:
+                start_point = start_point.rounded()
+                order.start_lat, order.start_lon = start_point
+                order.start_geohash = start_point.geohash()
+            if finish_point is not None:
+                order.finish_lat, order.finish_lon = finish_point.rounded()
             session.add(order)
             await session.commit()
         except Exception as e:
@@ -222,12 +341,16 @@ async def set_order(
 
 
 async def set_order_history(
-    order_id: int, driver_id: int, status: str, reason: str
+    order_id: int,
+    driver_id: int,
+    status: str,
+    reason: str,
+    session: AsyncSession | None = None,
 ) -> None:
     """
     Асинхронно создает запись в истории заказов.
     """
-    async with AsyncSessionLocal() as session:
+    async with session_scope(session) as session:
         try:
             order_id = int(order_id)
 
@@ -243,10 +366,10 @@ async def set_order_history(
             )
 
             session.add(order_h)
-            await session.commit()
+            await commit_session(session)
         except Exception as e:
-            await session.rollback()
             logger.error(f"Ошибка для order_id {order_id}: {e} <set_order_history>")
+            await rollback_session(session, e)
 
 
 async def set_current_order(
@@ -265,11 +388,12 @@ async def set_current_order(
     actual_start_time_trip: str,
     scheduled_arrival_time_to_place: str,
     actual_arrival_time_to_place: str,
+    session: AsyncSession | None = None,
 ) -> None:
     """
     Асинхронно создает запись о текущем заказе.
     """
-    async with AsyncSessionLocal() as session:
+    async with session_scope(session) as session:
         try:
             order_id = int(order_id)
 
@@ -292,10 +416,72 @@ async def set_current_order(
             )
 
             session.add(current_order)
-            await session.commit()
+            await commit_session(session)
         except Exception as e:
-            await session.rollback()
             logger.error(f"Ошибка для order_id {order_id}: {e} <set_current_order>")
+            await rollback_session(session, e)
+
+
+async def set_order_state(
+    client_id: int,
+    order_id: int,
+    status_id: int,
+    driver_id: int | None = None,
+    history_status: str | None = None,
+    reason: str = "-",
+    current_order: dict | None = None,
+    session: AsyncSession | None = None,
+) -> bool:
+    """
+    Асинхронно меняет статус заказа, добавляет запись в историю и текущий заказ
+    одной транзакцией.
+
+    Запись в историю добавляется, если передан history_status,
+    текущий заказ - если переданы поля current_order.
+
+    Returns:
+        True, если изменения применены, иначе False.
+    """
+    async with session_scope(session) as session:
+        try:
+            order_id = int(order_id)
+
+            order = await session.scalar(
+                select(Order).where(
+                    (Order.client_id == client_id) & (Order.id == order_id)
+                )
+            )
+            if order is None:
+                logger.error(
+                    f"Заказ order_id {order_id} для client_id {client_id} не найден. <set_order_state>"
+                )
+                return False
+
+            order.status_id = status_id
+
+            if history_status is not None:
+                current_time = datetime.now(pytz.timezone("Etc/GMT-7"))
+                session.add(
+                    Order_history(
+                        order_id=order_id,
+                        driver_id=driver_id,
+                        order_time=current_time.strftime("%d-%m-%Y %H:%M"),
+                        status=history_status,
+                        reason=reason,
+                    )
+                )
+
+            if current_order is not None:
+                session.add(Current_Order(order_id=order_id, **current_order))
+
+            await commit_session(session)
+            return True
+        except Exception as e:
+            logger.error(
+                f"Ошибка для client_id {client_id}, order_id {order_id}: {e} <set_order_state>"
+            )
+            await rollback_session(session, e)
+            return False
 
 
 async def set_feedback(user_id: int, estimation: int, comment: str) -> None:
@@ -339,21 +525,31 @@ async def set_new_secret_key(new_key: str) -> None:
             raise  # Важно перебросить исключение, если не знаете как его обработать
 
 
-async def set_message(user_id: int, message_id: int, text: str) -> None:
+async def set_message(
+    user_id: int,
+    message_id: int,
+    text: str,
+    order_id: int | None = None,
+    kind: str | None = None,
+) -> None:
     """
     Асинхронно создает запись сообщения пользователя.
-    """
-    async with AsyncSessionLocal() as session:
-        try:
-            user_id = int(user_id)
-            new_message = User_message(
-                user_id=user_id, message_id=message_id, text=text
-            )
-            session.add(new_message)
-            await session.commit()
-        except Exception as e:
-            await session.rollback()  # Откат транзакции в случае ошибки
-            logger.error(f"Ошибка для user_id {user_id}: {e} <set_message>")
+
+    Запись выполняется пакетами через буфер message_writer.
+    Для сообщений, привязанных к заказу (например, заказ в группе),
+    передаются order_id и kind - по ним сообщение ищется в реестре.
+    """
+    try:
+        message_writer.add(
+            int(user_id),
+            message_id,
+            text,
+            int(order_id) if order_id is not None else None,
+            kind,
+        )
+    except Exception as e:
+        logger.error(f"Ошибка для user_id {user_id}: {e} <set_message>")
+
 
 async def set_privacy_policy_sign(tg_id: int) -> None:
     """
@@ -388,16 +584,26 @@ async def get_all_chats(session, roles_list: list):
 
 
 async def send_restart_message(bot: Bot, roles_list: list) -> None:
-    """Отправляет сообщение о перезагрузке бота во все чаты."""
+    """
+    Отправляет сообщение о перезагрузке бота во все чаты.
+
+    Сообщения уходят параллельно с низким приоритетом: темп отправки
+    задает outbound_dispatcher, живой трафик обслуживается раньше.
+    """
     async with AsyncSessionLocal() as session:
         chat_ids = await get_all_chats(session, roles_list)
-        message = "Бот был перезагружен. Все временные данные были стерты."
-        for chat_id in chat_ids:
-            try:
-                msg = await bot.send_message(chat_id, message)
-                await set_message(chat_id, msg.message_id, msg.text)
-            except Exception as e:
-                logger.error(f"Ошибка при отправке сообщения в чат {chat_id}: {e}")
+
+    message = "Бот был перезагружен. Все временные данные были стерты."
+
+    async def send(chat_id: int) -> None:
+        try:
+            msg = await bot.send_message(chat_id, message)
+            await set_message(chat_id, msg.message_id, msg.text)
+        except Exception as e:
+            logger.error(f"Ошибка при отправке сообщения в чат {chat_id}: {e}")
+
+    with outbound_dispatcher.priority(PRIORITY_LOW):
+        await asyncio.gather(*(send(chat_id) for chat_id in chat_ids))
 
 
 async def add_user_to_used_promo_code_table(user_tg_id: int, promo_code_name: str):
@@ -590,11 +796,13 @@ async def set_status_client(tg_id: int, status_id: int) -> None:
             logger.error(f"Ошибка для tg_id {tg_id}: {e} <set_status_client>")
 
 
-async def set_status_driver(tg_id: int, status_id: int) -> None:
+async def set_status_driver(
+    tg_id: int, status_id: int, session: AsyncSession | None = None
+) -> None:
     """
     Асинхронно устанавливает статус водителя.
     """
-    async with AsyncSessionLocal() as session:
+    async with session_scope(session) as session:
         try:
             # Выполняем запрос для получения объекта Driver
             driver = await session.scalar(
@@ -603,19 +811,245 @@ async def set_status_driver(tg_id: int, status_id: int) -> None:
 
             if driver is not None:
                 driver.status_id = status_id  # Обновляем статус
-                await session.commit()  # Сохраняем изменения
+                await commit_session(session)  # Сохраняем изменения
+                # Водитель «на линии» доступен для поиска ближайших
+                await after_commit(
+                    session, lambda: driver_index.set_online(tg_id, status_id == 1)
+                )
             else:
                 logger.error(f"Водитель с tg_id {tg_id} не найден. <set_status_driver>")
         except Exception as e:
-            await session.rollback()
             logger.error(f"Ошибка для tg_id {tg_id}: {e} <set_status_driver>")
+            await rollback_session(session, e)
 
 
-async def set_status_order(client_id: int, order_id: int, status_id: int) -> None:
+async def get_online_driver_tg_ids() -> list[int]:
     """
-    Асинхронно устанавливает статус заказа.
+    Асинхронно получает tg_id всех водителей со статусом "на линии".
+    """
+    async with AsyncSessionLocal() as session:
+        try:
+            result = await session.execute(
+                select(User.tg_id)
+                .join(Driver, Driver.user_id == User.id)
+                .where(Driver.status_id == 1, Driver.is_deleted == False)
+            )
+            return [row[0] for row in result.all()]
+        except Exception as e:
+            logger.error(f"Ошибка: {e} <get_online_driver_tg_ids>")
+            return []
+
+
+async def get_dispatch_candidates(
+    tg_ids: list[int], status_ids: tuple[int, ...] = (1,)
+) -> list[tuple[int, int, float]]:
+    """
+    Асинхронно отбирает из переданных водителей тех, кому можно предложить заказ:
+    со статусом из status_ids, с положительным балансом и не удаленных.
+
+    Returns:
+        Список кортежей (tg_id, driver_id, рейтинг водителя).
+    """
+    if not tg_ids:
+        return []
+
+    async with AsyncSessionLocal() as session:
+        try:
+            result = await session.execute(
+                select(User.tg_id, Driver.id, Driver.rate)
+                .join(Driver, Driver.user_id == User.id)
+                .where(
+                    User.tg_id.in_([int(tg_id) for tg_id in tg_ids]),
+                    User.role_id != 6,
+                    Driver.status_id.in_(status_ids),
+                    Driver.wallet > 0,
+                    Driver.is_deleted == False,
+                )
+            )
+            return [
+                (tg_id, driver_id, float(rate) if rate is not None else 5.0)
+                for tg_id, driver_id, rate in result.all()
+            ]
+        except Exception as e:
+            logger.error(f"Ошибка: {e} <get_dispatch_candidates>")
+            return []
+
+
+async def get_orders_in_area(
+    point: Coord, precision: int = 6, status_ids: tuple[int, ...] | None = None
+) -> list[Order]:
+    """
+    Асинхронно получает заказы с точкой подачи в ячейке геохеша точки
+    и соседних ячейках (precision 6 - около 1 x 0,6 км).
+    """
+    async with AsyncSessionLocal() as session:
+        try:
+            stmt = select(Order).where(
+                Order.is_deleted == False,
+                or_(
+                    *(
+                        Order.start_geohash.startswith(prefix, autoescape=True)
+                        for prefix in geohash_area(point, precision)
+                    )
+                ),
+            )
+            if status_ids is not None:
+                stmt = stmt.where(Order.status_id.in_(status_ids))
+            result = await session.scalars(stmt)
+            return list(result.all())
+        except Exception as e:
+            logger.error(f"Ошибка для точки {point}: {e} <get_orders_in_area>")
+            return []
+
+
+async def get_order_demand_since(
+    last_order_id: int, limit: int = 50_000
+) -> list[tuple[int, str, str, str | None]]:
+    """
+    Асинхронно получает точки подачи заказов, созданных после last_order_id,
+    для тепловой карты спроса (включая отмененные — это тоже спрос).
+
+    Время создания берется из первой записи истории заказа: у заказов
+    "В ближайшее время" время подачи не содержит часов.
+
+    Returns:
+        Список (id заказа, геохеш точки подачи, время подачи, время создания
+        "%d-%m-%Y %H:%M" или None) по возрастанию id.
     """
     async with AsyncSessionLocal() as session:
+        try:
+            created_at = (
+                select(Order_history.order_time)
+                .where(Order_history.order_id == Order.id)
+                .order_by(Order_history.id)
+                .limit(1)
+                .scalar_subquery()
+            )
+            result = await session.execute(
+                select(Order.id, Order.start_geohash, Order.submission_time, created_at)
+                .where(Order.id > last_order_id, Order.start_geohash.is_not(None))
+                .order_by(Order.id)
+                .limit(limit)
+            )
+            return [tuple(row) for row in result.all()]
+        except Exception as e:
+            logger.error(
+                f"Ошибка для заказов после №{last_order_id}: {e} <get_order_demand_since>"
+            )
+            return []
+
+
+async def get_open_preorders() -> list[tuple[Order, int | None]]:
+    """
+    Асинхронно получает предзаказы, ожидающие водителя или уже закрепленные
+    за водителем ("предзаказ принят").
+
+    Returns:
+        Список пар (заказ, tg_id водителя или None).
+    """
+    async with AsyncSessionLocal() as session:
+        try:
+            result = await session.execute(
+                select(Order, Current_Order.driver_tg_id)
+                .outerjoin(Current_Order, Current_Order.order_id == Order.id)
+                .where(
+                    Order.rate_id.in_((4, 5)),
+                    Order.status_id.in_((3, 14)),
+                    Order.is_deleted == False,
+                )
+            )
+            return [(order, driver_tg_id) for order, driver_tg_id in result.all()]
+        except Exception as e:
+            logger.error(f"Ошибка: {e} <get_open_preorders>")
+            return []
+
+
+async def get_orders_for_job_reconciliation(
+    order_ids: list[int],
+) -> list[tuple[int, int, bool, int | None, str | None, str | None]] | None:
+    """
+    Асинхронно получает одним запросом состояние заказов, по которым есть
+    задачи планировщика, и всех принятых предзаказов (статус 14).
+
+    Время принятия берется из последней записи истории "предзаказ принят":
+    от него зависит, за сколько до поездки напоминают водителю.
+
+    Returns:
+        Список (id заказа, статус, удален, tg_id водителя, время подачи
+        "%d-%m-%Y %H:%M", время принятия "%d-%m-%Y %H:%M" или None)
+        или None при ошибке.
+    """
+    async with AsyncSessionLocal() as session:
+        try:
+            accepted_at = (
+                select(Order_history.order_time)
+                .where(
+                    Order_history.order_id == Order.id,
+                    Order_history.status == "предзаказ принят",
+                )
+                .order_by(Order_history.id.desc())
+                .limit(1)
+                .scalar_subquery()
+            )
+            result = await session.execute(
+                select(
+                    Order.id,
+                    Order.status_id,
+                    Order.is_deleted,
+                    Current_Order.driver_tg_id,
+                    Current_Order.scheduled_arrival_time_to_client,
+                    accepted_at,
+                )
+                .outerjoin(Current_Order, Current_Order.order_id == Order.id)
+                .where(
+                    or_(
+                        Order.id.in_(order_ids),
+                        (Order.status_id == 14) & (Order.is_deleted == False),
+                    )
+                )
+            )
+            return [tuple(row) for row in result.all()]
+        except Exception as e:
+            logger.error(f"Ошибка: {e} <get_orders_for_job_reconciliation>")
+            return None
+
+
+async def claim_order(
+    order_id: int,
+    from_status_id: int,
+    to_status_id: int,
+    session: AsyncSession | None = None,
+) -> bool:
+    """
+    Асинхронно переводит заказ в новый статус, только если он еще в статусе
+    from_status_id (одним условным UPDATE, чтобы заказ мог занять только
+    один водитель).
+
+    Returns:
+        True, если статус изменен, иначе False.
+    """
+    async with session_scope(session) as session:
+        try:
+            result = await session.execute(
+                update(Order)
+                .where(Order.id == int(order_id), Order.status_id == from_status_id)
+                .values(status_id=to_status_id)
+            )
+            await commit_session(session)
+            return result.rowcount == 1
+        except Exception as e:
+            logger.error(f"Ошибка для order_id {order_id}: {e} <claim_order>")
+            await rollback_session(session, e)
+            return False
+
+
+async def set_status_order(
+    client_id: int, order_id: int, status_id: int, session: AsyncSession | None = None
+) -> None:
+    """
+    Асинхронно устанавливает статус заказа.
+    """
+    async with session_scope(session) as session:
         try:
             order_id = int(order_id)
 
@@ -628,7 +1062,7 @@ async def set_status_order(client_id: int, order_id: int, status_id: int) -> Non
 
             if order is not None:
                 order.status_id = status_id  # Обновляем статус
-                await session.commit()  # Сохраняем изменения
+                await commit_session(session)  # Сохраняем изменения
             else:
                 logger.error(
                     f"Заказ order_id {order_id} для client_id {client_id} не найден. <set_status_order>"
@@ -636,10 +1070,10 @@ async def set_status_order(client_id: int, order_id: int, status_id: int) -> Non
                 return
 
         except Exception as e:
-            await session.rollback()
             logger.error(
                 f"Ошибка для client_id {client_id}, order_id {order_id}: {e} <set_status_order>"
             )
+            await rollback_session(session, e)
 
 
 async def set_payment_method(order_id: int, payment_method: str) -> None:
@@ -694,12 +1128,15 @@ async def set_new_name_user(tg_id: int, new_name: str) -> None:
 
 
 async def set_arrival_time_to_place(
-    order_id: int, arrival_time_to_place: str, is_scheduled: bool = False
+    order_id: int,
+    arrival_time_to_place: str,
+    is_scheduled: bool = False,
+    session: AsyncSession | None = None,
 ) -> None:
     """
     Асинхронно устанавливает время прибытия в место назначения для текущего заказа.
     """
-    async with AsyncSessionLocal() as session:
+    async with session_scope(session) as session:
         try:
             order_id = int(order_id)
 
@@ -718,19 +1155,21 @@ async def set_arrival_time_to_place(
             else:
                 current_order.actual_arrival_time_to_place = arrival_time_to_place
 
-            await session.commit()
+            await commit_session(session)
         except Exception as e:
-            await session.rollback()
             logger.error(
                 f"Ошибка для order_id {order_id}: {e} <set_arrival_time_to_place>"
             )
+            await rollback_session(session, e)
 
 
-async def set_start_time_trip(order_id: int, start_time_trip: str) -> None:
+async def set_start_time_trip(
+    order_id: int, start_time_trip: str, session: AsyncSession | None = None
+) -> None:
     """
     Асинхронно устанавливает время начала поездки для текущего заказа.
     """
-    async with AsyncSessionLocal() as session:
+    async with session_scope(session) as session:
         try:
             order_id = int(order_id)
 
@@ -746,10 +1185,10 @@ async def set_start_time_trip(order_id: int, start_time_trip: str) -> None:
 
             current_order.actual_start_time_trip = start_time_trip
 
-            await session.commit()
+            await commit_session(session)
         except Exception as e:
-            await session.rollback()
             logger.error(f"Ошибка для order_id {order_id}: {e} <set_start_time_trip>")
+            await rollback_session(session, e)
 
 
 async def set_arrival_time_to_client(
@@ -791,6 +1230,7 @@ async def set_some_data_for_current_order(
     driver_coords: str,
     arrival_time_to_client: str,
     total_time: str,
+    driver_point: Coord | None = None,
 ) -> None:
     """
     Асинхронно устанавливает некоторые данные для текущего заказа.
@@ -811,6 +1251,10 @@ async def set_some_data_for_current_order(
 
             current_order.driver_location = driver_location
             current_order.driver_coords = driver_coords
+            if driver_point is not None:
+                current_order.driver_lat, current_order.driver_lon = (
+                    driver_point.rounded()
+                )
             current_order.scheduled_arrival_time_to_client = arrival_time_to_client
             current_order.total_time_to_client = total_time
 
@@ -1147,14 +1591,16 @@ async def get_client(tg_id: int) -> int | None:
             return None
 
 
-async def get_client_by_order(order_id: int) -> int | None:
+async def get_client_by_order(
+    order_id: int, session: AsyncSession | None = None
+) -> int | None:
     """
     Асинхронно получает ID клиента по ID заказа.
 
     Returns:
         ID клиента в виде целого числа или None, если заказ не найден.
     """
-    async with AsyncSessionLocal() as session:
+    async with session_scope(session) as session:
         try:
             order_id = int(order_id)
 
@@ -1171,6 +1617,7 @@ async def get_client_by_order(order_id: int) -> int | None:
                 return None  # Возвращаем None, если заказ не найден
         except Exception as e:
             logger.error(f"Ошибка для order_id {order_id}: {e} <get_client_by_order>")
+            await rollback_session(session, e)
             return None
 
 
@@ -1202,14 +1649,14 @@ async def get_driver_object(driver_id: int):
             return None
 
 
-async def get_driver(tg_id: int) -> int | None:
+async def get_driver(tg_id: int, session: AsyncSession | None = None) -> int | None:
     """
     Асинхронно получает ID водителя по его tg_id.
 
     Returns:
         ID водителя в виде целого числа или None, если водитель не найден.
     """
-    async with AsyncSessionLocal() as session:
+    async with session_scope(session) as session:
         try:
             # Находим пользователя по tg_id
             user = await session.scalar(select(User).where(User.tg_id == tg_id))
@@ -1232,6 +1679,7 @@ async def get_driver(tg_id: int) -> int | None:
             return driver.id
         except Exception as e:
             logger.error(f"Ошибка для tg_id {tg_id}: {e} <get_driver>")
+            await rollback_session(session, e)
             return None
 
 
@@ -1479,7 +1927,7 @@ async def get_client_info(client_id: int, for_driver: bool) -> str:
                         "Отсутствует ключ шифрования данных. <get_client_info>"
                     )
                     return None
-                
+
                 decrypted_contact = sup.escape_markdown(sup.decrypt_data(user.contact, encryption_key))
 
                 tg_id = sup.escape_markdown(str(user.tg_id))
@@ -1496,14 +1944,16 @@ async def get_client_info(client_id: int, for_driver: bool) -> str:
             return "Ошибка при получении информации о клиенте."
 
 
-async def get_latest_driver_id_by_order_id(order_id: int) -> int | None:
+async def get_latest_driver_id_by_order_id(
+    order_id: int, session: AsyncSession | None = None
+) -> int | None:
     """
     Асинхронно получает ID последнего водителя, назначенного на заказ, по ID заказа.
 
     Returns:
         ID последнего водителя в виде целого числа или None, если водитель не найден.
     """
-    async with AsyncSessionLocal() as session:
+    async with session_scope(session) as session:
         try:
             order_id = int(order_id)
 
@@ -1528,6 +1978,7 @@ async def get_latest_driver_id_by_order_id(order_id: int) -> int | None:
             logger.error(
                 f"Ошибка для order_id {order_id}: {e} <get_latest_driver_id_by_order_id>"
             )
+            await rollback_session(session, e)
             return None
 
 
@@ -1582,16 +2033,16 @@ async def soft_delete_user(user_id: int, message: Message):
 
                 if orders_list:
                     for order in orders_list:
-                        msg_id = await get_message_id_by_text(
-                            f"Заказ №{order.id}", False
+                        msg_id = await get_order_message_id(
+                            group_chat_id, order.id, is_need_logger_warning=False
                         )
                         if msg_id != None:
                             await message.bot.delete_message(
                                 chat_id=group_chat_id, message_id=msg_id
                             )
-                            await delete_certain_message_from_db(msg_id)
+                            await delete_order_messages_from_db(group_chat_id, order.id)
 
-                            scheduler_manager.remove_job(str(order.id))
+                            await order_timers.cancel(ORDER_TIMEOUT, order.id)
                         for table in [Order_history]:
                             task = soft_delete_related(
                                 session, table, table.order_id, order.id
@@ -1658,37 +2109,40 @@ async def soft_delete_user(user_id: int, message: Message):
 
 async def get_and_delete_user_messages(user_id: int) -> list[User_message]:
     """
-    Асинхронно извлекает и удаляет все сообщения пользователя из базы данных.
+    Асинхронно извлекает и удаляет все сообщения пользователя из базы данных
+    одним запросом DELETE ... RETURNING.
 
     Returns:
-        Список удаленных сообщений User_message.
+        Список удаленных сообщений (с полями user_id и message_id).
         В случае, если сообщения не найдены или произошла ошибка, возвращает пустой список [].
     """
+    pending_messages = []
     async with AsyncSessionLocal() as session:
         try:
             user_id = int(user_id)
-            # Извлекаем все сообщения пользователя
+            # Сообщения, еще не записанные в БД, забираем прямо из буфера
+            # (до DELETE: take дожидается текущей записи буфера в таблицу)
+            pending_messages = await message_writer.take(user_id)
+
             result = await session.execute(
-                select(User_message).where(User_message.user_id == user_id)
+                delete(User_message)
+                .where(User_message.user_id == user_id)
+                .returning(User_message.user_id, User_message.message_id)
             )
+            messages = result.all()
+            await session.commit()
 
-            messages = result.scalars().all()  # Получаем все сообщения
-
-            if not messages:
+            if not messages and not pending_messages:
                 logger.warning(
                     f"Нет сообщений для удаления для user_id {user_id}. <get_and_delete_user_messages>"
                 )
                 return []  # Возвращаем пустой список, если сообщений нет
 
-            # Удаляем сообщения из базы данных
-            for message in messages:
-                await session.delete(message)
-
-            # Сохраняем изменения в базе данных
-            await session.commit()
-            return messages  # Возвращаем список сообщений перед удалением
+            return list(messages) + pending_messages
         except Exception as e:
             await session.rollback()  # Откатываем транзакцию в случае ошибки
+            # Сообщения из буфера не удалены — возвращаем их для записи
+            await message_writer.restore(pending_messages)
             logger.error(
                 f"Ошибка для user_id {user_id}: {e} <get_and_delete_user_messages>"
             )
@@ -1702,6 +2156,10 @@ async def get_last_user_message(user_id: int) -> User_message | None:
     Returns:
         Последнее сообщение User_message или None, если сообщений нет или произошла ошибка.
     """
+    pending_message = await message_writer.last(int(user_id))
+    if pending_message is not None:
+        return pending_message
+
     async with AsyncSessionLocal() as session:
         try:
             # Извлекаем последнее сообщение пользователя, сортируя по message_id
@@ -1726,6 +2184,8 @@ async def delete_messages_from_db(user_id: int) -> None:
     """
     Асинхронно удаляет все сообщения пользователя из базы данных.
     """
+    await message_writer.discard(user_id=int(user_id))
+
     async with AsyncSessionLocal() as session:
         try:
             await session.execute(
@@ -1741,6 +2201,8 @@ async def delete_certain_message_from_db(message_id: int) -> None:
     """
     Асинхронно удаляет определенное сообщение пользователя из базы данных по ID сообщения.
     """
+    await message_writer.discard(message_id=message_id)
+
     async with AsyncSessionLocal() as session:
         try:
             await session.execute(
@@ -1755,7 +2217,9 @@ async def delete_certain_message_from_db(message_id: int) -> None:
 
 
 async def get_current_order(
-    identifier: int, identifier_type: str = "order_id"
+    identifier: int,
+    identifier_type: str = "order_id",
+    session: AsyncSession | None = None,
 ) -> Current_Order:
     """
     Асинхронно получает информацию о текущем заказе по заданному идентификатору.
@@ -1765,7 +2229,7 @@ async def get_current_order(
         Если заказ не найден или произошла ошибка, возвращает "пустой" объект Current_Order,
         где все поля установлены в значения по умолчанию (которые должны быть определены в модели).
     """
-    async with AsyncSessionLocal() as session:
+    async with session_scope(session) as session:
         try:
             identifier = int(identifier)
             if identifier_type == "order_id":
@@ -1798,6 +2262,7 @@ async def get_current_order(
 
         except Exception as e:
             logger.error(f"Ошибка при получении заказа: {e} <get_current_order>")
+            await rollback_session(session, e)
             return Current_Order()  # Возвращаем "пустой" объект
 
 
@@ -2144,8 +2609,8 @@ async def get_status_name_for_order(order_id: int) -> str | None:
                 f"Ошибка при получении статуса для заказа {order_id}: {e} <get_status_name_for_order>"
             )
             return None  # Возвращаем None в случае ошибки
-        
-        
+
+
 async def get_status_name_by_status_id(status_id: int) -> str | None:
     """
     Асинхронно получает имя статуса по его status_id.
@@ -2204,14 +2669,16 @@ async def get_latest_order_date_by_order_id(order_id: int) -> str | None:
             return None  # Возвращаем None в случае ошибки
 
 
-async def get_order_by_id(order_id: int) -> Order | None:
+async def get_order_by_id(
+    order_id: int, session: AsyncSession | None = None
+) -> Order | None:
     """
     Извлекает данные заказа по его идентификатору.
 
     Returns:
         Объект Order, если заказ найден, или None, если заказ не найден или произошла ошибка.
     """
-    async with AsyncSessionLocal() as session:
+    async with session_scope(session) as session:
         try:
             order_id = int(order_id)
 
@@ -2228,9 +2695,146 @@ async def get_order_by_id(order_id: int) -> Order | None:
             logger.error(
                 f"Ошибка при получении заказа с ID {order_id}: {e} <get_order_by_id>"
             )
+            await rollback_session(session, e)
             return None  # Возвращаем None в случае ошибки
 
 
+@dataclass(frozen=True, slots=True)
+class OrderData:
+    """
+    Копия полей заказа, которые читают обработчики.
+
+    ORM-объект общей сессии истекает после фиксации или отката, и чтение
+    его полей потребовало бы нового запроса; копия от сессии не зависит.
+    """
+
+    id: int
+    client_id: int
+    status_id: int
+    rate_id: int
+    start: str
+    start_coords: str
+    finish: str
+    finish_coords: str
+    distance: str
+    submission_time: str
+    trip_time: str
+    price: int
+    comment: str
+    payment_method: str
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(**{item.name: getattr(row, item.name) for item in fields(cls)})
+
+
+@dataclass(frozen=True, slots=True)
+class CurrentOrderData:
+    """
+    Копия полей текущего заказа, которые читают обработчики.
+    """
+
+    order_id: int
+    driver_id: int
+    driver_tg_id: int
+    driver_username: str
+    client_id: int
+    client_tg_id: int
+    client_username: str
+    total_time_to_client: str
+    scheduled_arrival_time_to_client: str
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(**{item.name: getattr(row, item.name) for item in fields(cls)})
+
+
+@dataclass(frozen=True, slots=True)
+class OrderContext:
+    """
+    Неизменяемый набор данных о заказе для обработчиков водителя и клиента.
+    """
+
+    order: OrderData
+    current_order: CurrentOrderData | None
+    rate_id: int
+    client_id: int
+    client_tg_id: int
+    client_username: str | None
+    driver_id: int | None
+    driver_tg_id: int | None
+    driver_username: str | None
+
+
+async def get_order_context(
+    order_id: int,
+    driver_tg_id: int | None = None,
+    session: AsyncSession | None = None,
+) -> OrderContext | None:
+    """
+    Асинхронно получает заказ, пользователя-клиента, пользователя-водителя и тариф
+    одним запросом.
+
+    Если driver_tg_id не передан, водитель берется из текущего заказа.
+
+    Returns:
+        Объект OrderContext или None, если заказ не найден или произошла ошибка.
+    """
+    async with session_scope(session) as session:
+        try:
+            order_id = int(order_id)
+
+            client_user = aliased(User)
+            driver_user = aliased(User)
+
+            stmt = (
+                select(Order, Current_Order, client_user, Driver, driver_user)
+                .join(Client, Client.id == Order.client_id)
+                .join(client_user, client_user.id == Client.user_id)
+                .outerjoin(Current_Order, Current_Order.order_id == Order.id)
+            )
+
+            if driver_tg_id is None:
+                stmt = stmt.outerjoin(
+                    Driver, Driver.id == Current_Order.driver_id
+                ).outerjoin(driver_user, driver_user.id == Driver.user_id)
+            else:
+                stmt = stmt.outerjoin(
+                    driver_user, driver_user.tg_id == int(driver_tg_id)
+                ).outerjoin(Driver, Driver.user_id == driver_user.id)
+
+            result = await session.execute(stmt.where(Order.id == order_id).limit(1))
+            row = result.first()
+
+            if row is None:
+                logger.warning(f"Заказ с ID {order_id} не найден <get_order_context>")
+                return None
+
+            order, current_order, client, driver, driver_account = row
+
+            return OrderContext(
+                order=OrderData.from_row(order),
+                current_order=(
+                    CurrentOrderData.from_row(current_order)
+                    if current_order is not None
+                    else None
+                ),
+                rate_id=order.rate_id,
+                client_id=order.client_id,
+                client_tg_id=client.tg_id,
+                client_username=client.username,
+                driver_id=driver.id if driver else None,
+                driver_tg_id=driver_account.tg_id if driver_account else None,
+                driver_username=driver_account.username if driver_account else None,
+            )
+        except Exception as e:
+            logger.error(
+                f"Ошибка при получении контекста заказа с ID {order_id}: {e} <get_order_context>"
+            )
+            await rollback_session(session, e)
+            return None
+
+
 async def get_order_by_id_with_client(
     order_id: int,
 ) -> Union[Tuple["Order", str], Tuple[None, None]]:
@@ -2302,14 +2906,16 @@ async def get_order_data(order_history_id: int) -> Union[str, None]:
             return None  # Возвращаем None в случае ошибки
 
 
-async def get_tg_id_by_driver_id(driver_id: int) -> Union[int, None]:
+async def get_tg_id_by_driver_id(
+    driver_id: int, session: AsyncSession | None = None
+) -> Union[int, None]:
     """
     Извлекает Telegram ID (tg_id) пользователя по ID водителя (driver_id).
 
     Returns:
         Telegram ID (int), если найден, или None, если Telegram ID не найден или произошла ошибка.
     """
-    async with AsyncSessionLocal() as session:
+    async with session_scope(session) as session:
         try:
             # Формируем запрос для получения tg_id водителя по driver_id
             stmt = (
@@ -2335,17 +2941,20 @@ async def get_tg_id_by_driver_id(driver_id: int) -> Union[int, None]:
             logger.error(
                 f"Ошибка при получении Telegram ID для водителя с ID {driver_id}: {e} <get_tg_id_by_driver_id>"
             )
+            await rollback_session(session, e)
             return None  # Возвращаем None в случае ошибки
 
 
-async def get_tg_id_by_client_id(client_id: int) -> Union[int, None]:
+async def get_tg_id_by_client_id(
+    client_id: int, session: AsyncSession | None = None
+) -> Union[int, None]:
     """
     Извлекает Telegram ID (tg_id) пользователя по ID клиента (client_id).
 
     Returns:
         Telegram ID (int), если найден, или None, если Telegram ID не найден или произошла ошибка.
     """
-    async with AsyncSessionLocal() as session:
+    async with session_scope(session) as session:
         try:
             # Формируем запрос для получения tg_id клиента по client_id
             stmt = (
@@ -2371,6 +2980,7 @@ async def get_tg_id_by_client_id(client_id: int) -> Union[int, None]:
             logger.error(
                 f"Ошибка при получении Telegram ID для клиента с ID {client_id}: {e} <get_tg_id_by_client_id>"
             )
+            await rollback_session(session, e)
             return None  # Возвращаем None в случае ошибки
 
 
@@ -2402,14 +3012,16 @@ async def get_promo_code_object(name_promo_code: str) -> Union["Promo_Code", Non
             return None  # Возвращаем None в случае ошибки
 
 
-async def get_user_by_tg_id(user_tg_id: int) -> Union["User", None]:
+async def get_user_by_tg_id(
+    user_tg_id: int, session: AsyncSession | None = None
+) -> Union["User", None]:
     """
     Извлекает данные пользователя по его Telegram ID.
 
     Returns:
         Объект User, если пользователь найден, или None, если пользователь не найден или произошла ошибка.
     """
-    async with AsyncSessionLocal() as session:
+    async with session_scope(session) as session:
         try:
             user_tg_id = int(user_tg_id)
             # Выполняем запрос для получения пользователя по его Telegram ID
@@ -2429,6 +3041,7 @@ async def get_user_by_tg_id(user_tg_id: int) -> Union["User", None]:
             logger.error(
                 f"Ошибка при получении пользователя с Telegram ID {user_tg_id}: {e} <get_user_by_tg_id>"
             )
+            await rollback_session(session, e)
             return None  # Возвращаем None в случае ошибки
 
 
@@ -2495,14 +3108,16 @@ async def get_user_by_client_id(client_id: int) -> Union["User", None]:
             return None  # Возвращаем None в случае ошибки
 
 
-async def get_user_by_driver(driver_id: int) -> Union["User", None]:
+async def get_user_by_driver(
+    driver_id: int, session: AsyncSession | None = None
+) -> Union["User", None]:
     """
     Извлекает данные пользователя по ID водителя.
 
     Returns:
         Объект User, если пользователь найден, или None, если пользователь не найден или произошла ошибка.
     """
-    async with AsyncSessionLocal() as session:
+    async with session_scope(session) as session:
         try:
             # Выполняем запрос и получаем результат
             result = await session.execute(
@@ -2526,43 +3141,78 @@ async def get_user_by_driver(driver_id: int) -> Union["User", None]:
             logger.error(
                 f"Ошибка при получении пользователя для водителя с ID {driver_id}: {e} <get_user_by_driver>"
             )
+            await rollback_session(session, e)
             return None  # Возвращаем None в случае ошибки
 
 
-async def get_message_id_by_text(
-    message_text: str, is_need_logger_warning: bool = True
+async def get_order_message_id(
+    chat_id: int,
+    order_id: int,
+    kinds: list[str] | None = None,
+    is_need_logger_warning: bool = True,
 ) -> Union[int, None]:
     """
-    Извлекает ID сообщения (message_id) из таблицы User_message по тексту сообщения.
+    Извлекает ID последнего сообщения о заказе в чате из реестра сообщений.
+
+    Если kinds не передан, ищется сообщение любого вида. Сначала сообщение
+    ищется в буфере message_writer (там самые новые), затем в таблице.
 
     Returns:
         ID сообщения (int), если найдено, или None, если сообщение не найдено или произошла ошибка.
     """
+    message_id = await message_writer.last_order_message(
+        int(chat_id), int(order_id), kinds
+    )
+    if message_id is not None:
+        return message_id
+
     async with AsyncSessionLocal() as session:
         try:
-            # Выполняем запрос к таблице User_message
-            query = select(User_message.message_id).filter(
-                func.lower(User_message.text).contains(func.lower(message_text))
+            query = select(User_message.message_id).where(
+                User_message.chat_id == int(chat_id),
+                User_message.order_id == int(order_id),
             )
+            if kinds:
+                query = query.where(User_message.kind.in_(kinds))
 
-            # Выполняем запрос
-            result = await session.execute(query)
-            message = result.first()
+            message_id = await session.scalar(
+                query.order_by(User_message.id.desc()).limit(1)
+            )
 
-            # Возвращаем message_id, если он найден
-            if message:
-                return int(message[0])
-            else:
-                if is_need_logger_warning:
-                    logger.warning(
-                        f"Сообщение с текстом '{message_text}' не найдено <get_message_id_by_text>"
-                    )
-                return None
+            if message_id is None and is_need_logger_warning:
+                logger.warning(
+                    f"Сообщение о заказе {order_id} ({kinds}) в чате {chat_id} не найдено <get_order_message_id>"
+                )
+
+            return message_id
         except Exception as e:
             logger.error(
-                f"Ошибка при получении message_id по тексту '{message_text}': {e} <get_message_id_by_text>"
+                f"Ошибка при получении сообщения о заказе {order_id} в чате {chat_id}: {e} <get_order_message_id>"
+            )
+            return None
+
+
+async def delete_order_messages_from_db(chat_id: int, order_id: int) -> None:
+    """
+    Асинхронно удаляет из реестра все сообщения о заказе в указанном чате
+    (и еще не записанные строки в буфере message_writer).
+    """
+    await message_writer.discard(user_id=int(chat_id), order_id=int(order_id))
+
+    async with AsyncSessionLocal() as session:
+        try:
+            await session.execute(
+                delete(User_message).where(
+                    User_message.chat_id == int(chat_id),
+                    User_message.order_id == int(order_id),
+                )
+            )
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            logger.error(
+                f"Ошибка при удалении сообщений о заказе {order_id} в чате {chat_id}: {e} <delete_order_messages_from_db>"
             )
-            return None  # Возвращаем None в случае ошибки
 
 
 async def check_status(tg_id: int) -> Union[int, None]:
@@ -2593,14 +3243,16 @@ async def check_status(tg_id: int) -> Union[int, None]:
             return None  # Обработка ошибки
 
 
-async def check_rate(tg_id: int, order_id: int) -> Union[int, None]:
+async def check_rate(
+    tg_id: int, order_id: int, session: AsyncSession | None = None
+) -> Union[int, None]:
     """
     Проверяет ID тарифа для заказа.
 
     Returns:
         ID тарифа (int), если заказ найден, или None, если заказ не найден или произошла ошибка.
     """
-    async with AsyncSessionLocal() as session:
+    async with session_scope(session) as session:
         try:
             order_id = int(order_id)
 
@@ -2620,6 +3272,7 @@ async def check_rate(tg_id: int, order_id: int) -> Union[int, None]:
             logger.error(
                 f"Ошибка при выполнении запроса для заказа с ID {order_id}: {e} <check_rate>"
             )
+            await rollback_session(session, e)
             return None  # Обработка ошибки
 
 
@@ -2777,7 +3430,7 @@ async def check_used_referral_link(tg_id: int) -> bool:
                 f"Ошибка при выполнении запроса для пользователя {tg_id}: {e} <check_used_referral_link>"
             )
             return False
-        
+
 async def check_sign_privacy_policy(tg_id: int) -> bool:
     """
     Проверяет наличие пользователя в таблице подписей соглашений.
@@ -2826,11 +3479,13 @@ async def delete_order(order_id: int) -> None:
             )
 
 
-async def delete_current_order(order_id: int) -> None:
+async def delete_current_order(
+    order_id: int, session: AsyncSession | None = None
+) -> None:
     """
     Удаляет текущий заказ (запись из таблицы Current_Order) по его ID.
     """
-    async with AsyncSessionLocal() as session:
+    async with session_scope(session) as session:
         try:
             order_id = int(order_id)
 
@@ -2842,7 +3497,7 @@ async def delete_current_order(order_id: int) -> None:
 
             if order_to_delete:
                 await session.delete(order_to_delete)  # Удаляем запись
-                await session.commit()  # Коммитим изменения
+                await commit_session(session)  # Коммитим изменения
             else:
                 logger.warning(
                     f"Заказ с ID {order_id} не найден <delete_current_order>"
@@ -2851,6 +3506,7 @@ async def delete_current_order(order_id: int) -> None:
             logger.error(
                 f"Ошибка при удалении заказа с ID {order_id}: {e} <delete_current_order>"
             )
+            await rollback_session(session, e)
 
 
 async def count_available_cars() -> int:
@@ -2880,3 +3536,96 @@ async def count_available_cars() -> int:
                 f"Ошибка при подсчете доступных машин: {e} <count_available_cars>"
             )  # Логируем ошибку
             return 0  # Возвращаем 0 в случае ошибки
+
+
+async def get_broadcast(broadcast_id: int) -> Broadcast | None:
+    """
+    Асинхронно получает рассылку по ID.
+    """
+    async with AsyncSessionLocal() as session:
+        try:
+            return await session.get(Broadcast, broadcast_id)
+        except Exception as e:
+            logger.error(
+                f"Ошибка при получении рассылки {broadcast_id}: {e} <get_broadcast>"
+            )
+            return None
+
+
+async def get_running_broadcasts() -> list[Broadcast]:
+    """
+    Асинхронно получает незавершенные рассылки (для продолжения после перезапуска).
+    """
+    async with AsyncSessionLocal() as session:
+        try:
+            result = await session.scalars(
+                select(Broadcast)
+                .where(Broadcast.status == "running")
+                .order_by(asc(Broadcast.id))
+            )
+            return list(result.all())
+        except Exception as e:
+            logger.error(f"Ошибка при получении рассылок: {e} <get_running_broadcasts>")
+            return []
+
+
+async def get_broadcast_recipients(
+    role_id: int | None, after_user_id: int, limit: int
+) -> list[tuple[int, int]]:
+    """
+    Асинхронно получает следующую порцию получателей рассылки
+    с ключевой пагинацией по users.id (без OFFSET).
+
+    Returns:
+        Список пар (users.id, tg_id), упорядоченных по users.id.
+    """
+    async with AsyncSessionLocal() as session:
+        try:
+            query = select(User.id, User.tg_id).where(
+                User.id > after_user_id, User.is_deleted == False
+            )
+            if role_id is not None:
+                query = query.where(User.role_id == role_id)
+
+            result = await session.execute(query.order_by(asc(User.id)).limit(limit))
+            return [(row.id, row.tg_id) for row in result.all()]
+        except Exception as e:
+            logger.error(
+                f"Ошибка при получении получателей после {after_user_id}: {e} <get_broadcast_recipients>"
+            )
+            return []
+
+
+async def save_broadcast_progress(
+    broadcast_id: int,
+    last_user_id: int,
+    sent: int,
+    failed: int,
+    status: str | None = None,
+) -> bool:
+    """
+    Асинхронно сохраняет контрольную точку рассылки: курсор и счетчики.
+    """
+    async with AsyncSessionLocal() as session:
+        try:
+            values = {
+                "last_user_id": last_user_id,
+                "sent_count": Broadcast.sent_count + sent,
+                "failed_count": Broadcast.failed_count + failed,
+            }
+            if status is not None:
+                values["status"] = status
+                current_time = datetime.now(pytz.timezone("Etc/GMT-7"))
+                values["finished_at"] = current_time.strftime("%d-%m-%Y %H:%M")
+
+            await session.execute(
+                update(Broadcast).where(Broadcast.id == broadcast_id).values(**values)
+            )
+            await session.commit()
+            return True
+        except Exception as e:
+            await session.rollback()
+            logger.error(
+                f"Ошибка при сохранении прогресса рассылки {broadcast_id}: {e} <save_broadcast_progress>"
+            )
+            return False
@@ -0,0 +1,529 @@
+import os
+import asyncio
+import logging
+from dataclasses import dataclass, field
+
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import support as sup
+from app import keyboards as kb
+from app.database import requests as rq
+from app.bot_registry import bot_registry
+from app.driver_index import driver_index
+from app.eta import eta_service
+from app.timers import DISPATCH_ESCALATE, order_timers
+
+logger = logging.getLogger(__name__)
+
+# Тарифы, заказы которых предлагаются водителям волнами (предзаказы — в группу)
+DISPATCH_RATES = (1, 2)
+
+# Веса ранжирования кандидатов (меньше балл — выше в очереди)
+ETA_WEIGHT = 0.6
+RATING_WEIGHT = 0.2
+ACCEPTANCE_WEIGHT = 0.2
+
+
+@dataclass
+class Dispatch:
+    order_id: int
+    rate_id: int
+    start_coords: str
+    order_info: str  # Текст заказа для группы
+    offers: dict[int, int] = field(default_factory=dict)  # tg_id -> message_id
+    pending: set[int] = field(default_factory=set)  # Водители текущей волны
+    offered: set[int] = field(default_factory=set)  # Все, кому предлагали
+    wave_done: asyncio.Event = field(default_factory=asyncio.Event)
+    claimed_by: int | None = None
+    task: asyncio.Task | None = None
+
+
+class OrderDispatcher:
+    """
+    Волновое распределение новых заказов между ближайшими водителями.
+
+    В каждой волне заказ предлагается wave_size лучшим водителям «на линии»
+    в радиусе волны (ранжирование по расстоянию, рейтингу и доле принятых
+    предложений). Волна завершается, когда заказ принят, все водители
+    отказались или истек offer_timeout. Если ни одна волна не нашла
+    водителя, заказ публикуется в группе водителей, как раньше.
+
+    Волны ведет процесс, создавший заказ, но состояние волны хранится
+    в Redis: водители текущей волны и принявший заказ водитель видны
+    всем экземплярам бота, поэтому ответ водителя может обработать любой
+    из них. При запуске планируется таймер order_timers на крайний срок
+    всех волн: если процесс остановится посреди волны, заказ опубликует
+    в группе экземпляр, забравший таймер. Публикация выполняется один раз
+    (ключ escalated в Redis).
+    """
+
+    def __init__(
+        self,
+        wave_size: int = 3,
+        offer_timeout: float = 30.0,
+        radii: tuple[float, ...] = (2.0, 4.0, 8.0),
+        redis_url: str = "redis://localhost:6379/0",
+        enabled: bool = True,
+        poll_interval: float = 1.0,
+    ):
+        self.wave_size = wave_size
+        self.offer_timeout = offer_timeout  # Время на ответ водителя в секундах
+        self.radii = radii  # Радиусы поиска по волнам, км
+        self.redis_url = redis_url
+        self.enabled = enabled
+        self.poll_interval = poll_interval  # Проверка ответов с других экземпляров
+        # Крайний срок всех волн с запасом на ранжирование и отправку
+        self.escalation_delay = len(radii) * offer_timeout + 60
+        self.state_ttl = 3600  # Срок жизни состояния распределения в Redis
+        self.stats_key = "dispatch:acceptance"
+        self.logger = logger
+        self._redis: Redis | None = None
+        self._dispatches: dict[int, Dispatch] = {}
+
+    def _get_redis(self) -> Redis:
+        if self._redis is None:
+            self._redis = Redis.from_url(self.redis_url)
+        return self._redis
+
+    def handles(self, rate_id: int) -> bool:
+        return self.enabled and rate_id in DISPATCH_RATES
+
+    @staticmethod
+    def _key(order_id: int, name: str) -> str:
+        return f"dispatch:{order_id}:{name}"
+
+    async def start(
+        self, order_id: int, rate_id: int, start_coords: str, order_info: str
+    ) -> None:
+        """
+        Запускает распределение заказа в фоне.
+        """
+        await order_timers.schedule(
+            DISPATCH_ESCALATE,
+            order_id,
+            self.escalation_delay,
+            {"order_id": order_id, "rate_id": rate_id},
+        )
+        dispatch = Dispatch(order_id, rate_id, start_coords, order_info)
+        self._dispatches[order_id] = dispatch
+        dispatch.task = asyncio.create_task(
+            self._run(dispatch), name=f"dispatch-{order_id}"
+        )
+
+    async def claim(
+        self, order_id: int, tg_id: int, session: AsyncSession | None = None
+    ) -> bool:
+        """
+        Закрепляет заказ за водителем, принявшим предложение.
+
+        Заказ переводится в статус "на рассмотрении у водителя" условным
+        UPDATE, поэтому из нескольких водителей заказ получит только первый.
+        С сессией-единицей работы обработчика UPDATE фиксируется вместе
+        с остальными изменениями, а распределение узнает о принятии только
+        после фиксации. Предложения остальным водителям отзываются.
+
+        Returns:
+            True, если заказ закреплен за водителем, иначе False.
+        """
+        if not await rq.claim_order(order_id, 3, 13, session=session):
+            return False
+
+        if session is None:
+            await self._claimed(order_id, tg_id)
+        else:
+            await rq.after_commit(session, lambda: self._claimed(order_id, tg_id))
+        return True
+
+    async def _claimed(self, order_id: int, tg_id: int) -> None:
+        try:
+            async with self._get_redis().pipeline(transaction=True) as pipe:
+                pipe.set(self._key(order_id, "claimed"), tg_id, ex=self.state_ttl)
+                pipe.delete(self._key(order_id, "pending"))
+                await pipe.execute()
+        except Exception as e:
+            self.logger.error(
+                f"Не удалось сохранить принятие заказа №{order_id}: {e} <_claimed>"
+            )
+        await order_timers.cancel(DISPATCH_ESCALATE, order_id)
+
+        dispatch = self._dispatches.get(order_id)
+        if dispatch is not None:
+            dispatch.claimed_by = tg_id
+            dispatch.offers.pop(tg_id, None)
+            dispatch.wave_done.set()
+        await self._record(tg_id, "accepted")
+
+    async def decline(self, order_id: int, tg_id: int) -> None:
+        """
+        Учитывает отказ водителя от предложения.
+        """
+        try:
+            await self._get_redis().srem(self._key(order_id, "pending"), tg_id)
+        except Exception as e:
+            self.logger.error(
+                f"Не удалось сохранить отказ от заказа №{order_id}: {e} <decline>"
+            )
+
+        dispatch = self._dispatches.get(order_id)
+        if dispatch is None:
+            return
+
+        dispatch.offers.pop(tg_id, None)
+        dispatch.pending.discard(tg_id)
+        if not dispatch.pending:
+            dispatch.wave_done.set()  # Все водители волны отказались
+
+    async def stop(self) -> None:
+        """
+        Останавливает распределение: незавершенные заказы публикуются в группе.
+        """
+        dispatches = list(self._dispatches.values())
+        self._dispatches.clear()
+        for dispatch in dispatches:
+            if dispatch.task is not None:
+                dispatch.task.cancel()
+                try:
+                    await dispatch.task
+                except asyncio.CancelledError:
+                    pass
+            await self._withdraw_offers(dispatch)
+            if await self._is_waiting(dispatch.order_id):
+                await self._escalate(dispatch.order_id, dispatch.order_info)
+
+    async def _run(self, dispatch: Dispatch) -> None:
+        order_id = dispatch.order_id
+        finished = False
+        try:
+            latitude, longitude = (
+                float(value) for value in dispatch.start_coords.split(",")
+            )
+
+            for wave, radius in enumerate(self.radii, start=1):
+                if not await self._is_waiting(order_id):
+                    finished = True
+                    return
+
+                candidates = await self._rank(
+                    latitude, longitude, radius, dispatch.offered
+                )
+                if not candidates:
+                    continue
+
+                dispatch.wave_done.clear()
+                for tg_id in candidates[: self.wave_size]:
+                    await self._offer(dispatch, tg_id)
+                if not dispatch.pending:
+                    continue
+
+                self.logger.info(
+                    f"Заказ №{order_id}: волна {wave}, радиус {radius} км, "
+                    f"предложен водителям {sorted(dispatch.pending)} <_run>"
+                )
+                await self._start_wave(dispatch)
+                await self._wait_wave(dispatch)
+
+                await self._withdraw_offers(dispatch)
+                if dispatch.claimed_by is not None:
+                    finished = True
+                    return
+
+            if await self._is_waiting(order_id):
+                self.logger.info(
+                    f"Заказ №{order_id} не принят ближайшими водителями, публикуется в группе <_run>"
+                )
+                finished = await self._escalate(order_id, dispatch.order_info)
+            else:
+                finished = True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.error(
+                f"Ошибка распределения заказа №{order_id}: {e} <_run>", exc_info=True
+            )
+            await self._withdraw_offers(dispatch)
+            if await self._is_waiting(order_id):
+                finished = await self._escalate(order_id, dispatch.order_info)
+            else:
+                finished = True
+        finally:
+            if self._dispatches.get(order_id) is dispatch:
+                self._dispatches.pop(order_id, None)
+            if finished:
+                # Заказ принят, отменен или опубликован: страховка не нужна.
+                # Если публикация не удалась, ее повторит обработчик таймера
+                await order_timers.cancel(DISPATCH_ESCALATE, order_id)
+
+    async def _start_wave(self, dispatch: Dispatch) -> None:
+        key = self._key(dispatch.order_id, "pending")
+        try:
+            async with self._get_redis().pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.sadd(key, *dispatch.pending)
+                pipe.expire(key, self.state_ttl)
+                await pipe.execute()
+        except Exception as e:
+            self.logger.error(
+                f"Не удалось сохранить волну заказа №{dispatch.order_id}: {e} <_start_wave>"
+            )
+
+    async def _wait_wave(self, dispatch: Dispatch) -> None:
+        """
+        Ждет конца волны: ответа в этом процессе (событие wave_done), ответа
+        на другом экземпляре (состояние в Redis) или истечения offer_timeout.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.offer_timeout
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                await asyncio.wait_for(
+                    dispatch.wave_done.wait(),
+                    timeout=min(self.poll_interval, remaining),
+                )
+                return
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                async with self._get_redis().pipeline(transaction=False) as pipe:
+                    pipe.get(self._key(dispatch.order_id, "claimed"))
+                    pipe.scard(self._key(dispatch.order_id, "pending"))
+                    claimed_by, pending = await pipe.execute()
+            except Exception as e:
+                self.logger.warning(
+                    f"Не удалось прочитать волну заказа №{dispatch.order_id}: {e} <_wait_wave>"
+                )
+                continue
+
+            if claimed_by is not None:
+                dispatch.claimed_by = int(claimed_by)
+                dispatch.offers.pop(dispatch.claimed_by, None)
+                return
+            if not pending:
+                return  # Все водители волны отказались
+
+    async def _is_waiting(self, order_id: int) -> bool:
+        # Заказ ждет водителя, пока клиент его не отменил и никто не принял
+        order = await rq.get_order_by_id(order_id)
+        return order is not None and order.status_id == 3
+
+    async def _rank(
+        self, latitude: float, longitude: float, radius: float, exclude: set[int]
+    ) -> list[int]:
+        nearest = await driver_index.nearest_online_drivers(
+            latitude, longitude, k=self.wave_size * 5, radius=radius
+        )
+        distances = {
+            tg_id: distance for tg_id, distance in nearest if tg_id not in exclude
+        }
+        candidates = await rq.get_dispatch_candidates(list(distances))
+        if not candidates:
+            return []
+
+        tg_ids = [tg_id for tg_id, _, _ in candidates]
+        acceptance = await self._acceptance_rates(tg_ids)
+        etas = await self._etas(tg_ids, latitude, longitude)
+        slowest = max(max(etas.values()), 60.0)
+
+        scores = {
+            tg_id: ETA_WEIGHT * etas[tg_id] / slowest
+            + RATING_WEIGHT * (1 - min(rating, 5.0) / 5)
+            + ACCEPTANCE_WEIGHT * (1 - acceptance[tg_id])
+            for tg_id, _, rating in candidates
+        }
+        return sorted(scores, key=scores.get)
+
+    async def _etas(
+        self, tg_ids: list[int], latitude: float, longitude: float
+    ) -> dict[int, float]:
+        # Время подъезда по дорогам (один запрос матрицы на всех кандидатов)
+        positions = await driver_index.get_positions(tg_ids)
+        located = [tg_id for tg_id in tg_ids if tg_id in positions]
+        etas = await eta_service.one_to_many(
+            [f"{positions[tg_id][0]},{positions[tg_id][1]}" for tg_id in located],
+            f"{latitude},{longitude}",
+        )
+        seconds = {tg_id: eta[1] for tg_id, eta in zip(located, etas)}
+        fallback = max(seconds.values(), default=60.0)
+        return {tg_id: seconds.get(tg_id, fallback) for tg_id in tg_ids}
+
+    async def send_offer(
+        self, tg_id: int, order_id: int, rate_id: int, start_coords: str
+    ) -> int | None:
+        """
+        Отправляет водителю предложение заказа с кнопками принятия и отказа.
+
+        Returns:
+            ID сообщения с предложением или None, если отправить не удалось.
+        """
+        try:
+            order_info = await sup.check_rate_for_order_info(rate_id, order_id)
+            if order_info is None:
+                return None
+
+            msg = await bot_registry.get().send_message(
+                chat_id=tg_id,
+                text=f"🔔Вам предложен заказ!\n\n{order_info}",
+                reply_markup=await kb.create_consider_button(start_coords),
+            )
+            await rq.set_message(
+                tg_id,
+                msg.message_id,
+                msg.text,
+                order_id,
+                rq.MESSAGE_KIND_DRIVER_OFFER,
+            )
+            await self._record(tg_id, "offered")
+            return msg.message_id
+        except Exception as e:
+            self.logger.error(
+                f"Не удалось предложить заказ №{order_id} водителю {tg_id}: {e} <send_offer>"
+            )
+            return None
+
+    async def _offer(self, dispatch: Dispatch, tg_id: int) -> None:
+        dispatch.offered.add(tg_id)
+        message_id = await self.send_offer(
+            tg_id, dispatch.order_id, dispatch.rate_id, dispatch.start_coords
+        )
+        if message_id is not None:
+            dispatch.offers[tg_id] = message_id
+            dispatch.pending.add(tg_id)
+
+    async def _withdraw_offers(self, dispatch: Dispatch) -> None:
+        bot = bot_registry.get()
+        for tg_id, message_id in list(dispatch.offers.items()):
+            try:
+                await bot.delete_message(chat_id=tg_id, message_id=message_id)
+            except Exception as e:
+                self.logger.warning(
+                    f"Не удалось удалить предложение заказа №{dispatch.order_id} у водителя {tg_id}: {e} <_withdraw_offers>"
+                )
+            await rq.delete_order_messages_from_db(tg_id, dispatch.order_id)
+        dispatch.offers.clear()
+        dispatch.pending.clear()
+
+    async def escalation_due(self, payload: dict) -> None:
+        """
+        Обработчик таймера DISPATCH_ESCALATE: публикует в группе заказ,
+        распределение которого не завершилось к крайнему сроку.
+
+        Таймер подтверждается, только когда заказ опубликован или больше
+        не ждет водителя; иначе обработчик завершается ошибкой и таймер
+        срабатывает снова после аренды.
+        """
+        order_id = payload["order_id"]
+        if order_id in self._dispatches:
+            # Волны еще идут в этом процессе: проверяем позже. Если процесс
+            # остановится, таймер заберет другой экземпляр
+            if not await order_timers.schedule(
+                DISPATCH_ESCALATE, order_id, self.offer_timeout, payload
+            ):
+                raise RuntimeError(f"Не удалось отложить публикацию заказа №{order_id}")
+            return
+        order = await rq.get_order_by_id(order_id)
+        if order is None or order.status_id != 3:
+            return
+
+        order_info = await sup.get_order_info(payload["rate_id"], order)
+        if order_info is None:
+            raise RuntimeError(f"Нет информации о заказе №{order_id}")
+        self.logger.warning(
+            f"Распределение заказа №{order_id} не завершилось, публикуется в группе <escalation_due>"
+        )
+        if not await self._escalate(order_id, order_info):
+            raise RuntimeError(f"Заказ №{order_id} не опубликован в группе")
+
+    async def _escalate(self, order_id: int, order_info: str) -> bool:
+        """
+        Публикует заказ в группе водителей (один раз на все экземпляры).
+
+        Returns:
+            True, если заказ опубликован (в том числе другим экземпляром).
+        """
+        group_chat_id = os.getenv("GROUP_CHAT_ID")
+        if not group_chat_id:
+            self.logger.error(
+                "Отсутствует Телеграмм-ID группы (GROUP_CHAT_ID) <_escalate>"
+            )
+            return False
+
+        try:
+            # Публикует только первый: процесс волн или обработчик таймера
+            is_first = await self._get_redis().set(
+                self._key(order_id, "escalated"), 1, nx=True, ex=self.state_ttl
+            )
+        except Exception as e:
+            self.logger.warning(
+                f"Не удалось проверить публикацию заказа №{order_id}: {e} <_escalate>"
+            )
+            is_first = True
+        if not is_first:
+            return True
+
+        try:
+            msg = await bot_registry.get().send_message(
+                chat_id=group_chat_id,
+                text=order_info,
+                reply_markup=kb.group_message_button,
+            )
+            await rq.set_message(
+                int(group_chat_id),
+                msg.message_id,
+                msg.text,
+                order_id,
+                rq.MESSAGE_KIND_GROUP_ORDER,
+            )
+            return True
+        except Exception as e:
+            self.logger.error(
+                f"Не удалось опубликовать заказ №{order_id} в группе: {e} <_escalate>"
+            )
+        try:
+            # Разрешаем повторную публикацию обработчику таймера
+            await self._get_redis().delete(self._key(order_id, "escalated"))
+        except Exception as e:
+            self.logger.warning(
+                f"Не удалось сбросить публикацию заказа №{order_id}: {e} <_escalate>"
+            )
+        return False
+
+    async def _record(self, tg_id: int, event: str) -> None:
+        try:
+            await self._get_redis().hincrby(self.stats_key, f"{tg_id}:{event}", 1)
+        except Exception as e:
+            self.logger.warning(f"Ошибка учета предложения: {e} <_record>")
+
+    async def _acceptance_rates(self, tg_ids: list[int]) -> dict[int, float]:
+        # Доля принятых предложений со сглаживанием: у новых водителей 0.5
+        try:
+            fields = [
+                f"{tg_id}:{event}"
+                for tg_id in tg_ids
+                for event in ("offered", "accepted")
+            ]
+            values = await self._get_redis().hmget(self.stats_key, fields)
+        except Exception as e:
+            self.logger.warning(
+                f"Ошибка чтения статистики предложений: {e} <_acceptance_rates>"
+            )
+            return {tg_id: 0.5 for tg_id in tg_ids}
+
+        rates = {}
+        for index, tg_id in enumerate(tg_ids):
+            offered = int(values[index * 2] or 0)
+            accepted = int(values[index * 2 + 1] or 0)
+            rates[tg_id] = (accepted + 1) / (offered + 2)
+        return rates
+
+
+order_dispatcher = OrderDispatcher(
+    wave_size=int(os.getenv("DISPATCH_WAVE_SIZE", "3")),
+    offer_timeout=float(os.getenv("DISPATCH_OFFER_TIMEOUT", "30")),
+    radii=tuple(
+        float(radius) for radius in os.getenv("DISPATCH_RADII", "2,4,8").split(",")
+    ),
+    redis_url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+    enabled=os.getenv("ORDER_DISPATCH_ENABLED", "1") == "1",
+)
+order_timers.register(DISPATCH_ESCALATE, order_dispatcher.escalation_due)
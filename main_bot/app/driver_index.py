@@ -0,0 +1,235 @@
+import os
+import time
+import logging
+
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+
+class DriverGeoIndex:
+    """
+    Индекс последних известных позиций водителей «на линии» в Redis GEO.
+
+    Позиции всех водителей хранятся в хэше (чтобы при выходе на линию
+    водитель сразу попадал в индекс), в GEO-множество попадают только
+    водители со статусом «на линии». Позиции старше max_age секунд
+    периодически вычищаются из GEO-множества.
+    """
+
+    def __init__(
+        self,
+        redis_url: str = "redis://localhost:6379/0",
+        max_age: int = 1800,
+        prune_interval: float = 60.0,
+        prefix: str = "drivers",
+        offline_cache_ttl: float = 30.0,
+    ):
+        self.redis_url = redis_url
+        self.max_age = max_age  # Срок актуальности позиции в секундах
+        self.prune_interval = prune_interval
+        self.geo_key = f"{prefix}:online:geo"
+        self.online_key = f"{prefix}:online"
+        self.seen_key = f"{prefix}:online:seen"
+        self.positions_key = f"{prefix}:positions"
+        self.logger = logger
+        self._redis: Redis | None = None
+        self._pruned_at = 0.0
+        # Пользователи не «на линии», чьи трансляции геопозиции пропускаются
+        # без запроса к Redis: tg_id -> до какого времени (time.monotonic)
+        self.offline_cache_ttl = offline_cache_ttl
+        self._offline_until: dict[int, float] = {}
+
+    def _get_redis(self) -> Redis:
+        if self._redis is None:
+            self._redis = Redis.from_url(self.redis_url)
+        return self._redis
+
+    async def update_position(
+        self,
+        tg_id: int,
+        latitude: float,
+        longitude: float,
+        only_if_online: bool = False,
+    ) -> None:
+        """
+        Сохраняет позицию водителя и обновляет индекс, если он «на линии».
+
+        Args:
+            only_if_online: Не сохранять позицию пользователя не «на линии»
+                (для трансляций геопозиции, которые присылают и клиенты).
+                Такой пользователь запоминается на offline_cache_ttl секунд.
+        """
+        if only_if_online and self._offline_until.get(tg_id, 0) > time.monotonic():
+            return
+
+        try:
+            redis = self._get_redis()
+            is_online = await redis.sismember(self.online_key, tg_id)
+            if only_if_online and not is_online:
+                now = time.monotonic()
+                if len(self._offline_until) > 10_000:
+                    self._offline_until = {
+                        key: until
+                        for key, until in self._offline_until.items()
+                        if until > now
+                    }
+                self._offline_until[tg_id] = now + self.offline_cache_ttl
+                return
+
+            now = time.time()
+            pipe = redis.pipeline(transaction=False)
+            pipe.hset(self.positions_key, tg_id, f"{latitude},{longitude},{now}")
+            if is_online:
+                pipe.geoadd(self.geo_key, (longitude, latitude, tg_id))
+                pipe.zadd(self.seen_key, {tg_id: now})
+            await pipe.execute()
+        except Exception as e:
+            self.logger.error(
+                f"Ошибка обновления позиции водителя {tg_id}: {e} <update_position>"
+            )
+
+    async def set_online(self, tg_id: int, is_online: bool) -> None:
+        """
+        Добавляет водителя в индекс (по последней позиции) или удаляет из него.
+        """
+        self._offline_until.pop(tg_id, None)
+        try:
+            redis = self._get_redis()
+            if not is_online:
+                pipe = redis.pipeline(transaction=False)
+                pipe.srem(self.online_key, tg_id)
+                pipe.zrem(self.geo_key, tg_id)
+                pipe.zrem(self.seen_key, tg_id)
+                await pipe.execute()
+                return
+
+            await redis.sadd(self.online_key, tg_id)
+            position = await redis.hget(self.positions_key, tg_id)
+            if position is not None:
+                latitude, longitude, seen_at = (
+                    float(value) for value in position.decode().split(",")
+                )
+                if time.time() - seen_at <= self.max_age:
+                    pipe = redis.pipeline(transaction=False)
+                    pipe.geoadd(self.geo_key, (longitude, latitude, tg_id))
+                    pipe.zadd(self.seen_key, {tg_id: seen_at})
+                    await pipe.execute()
+                    return
+
+            # В поиск ближайших водитель попадет с первой новой геопозицией
+            self.logger.info(
+                f"Водитель {tg_id} на линии без актуальной позиции <set_online>"
+            )
+        except Exception as e:
+            self.logger.error(
+                f"Ошибка смены статуса водителя {tg_id} в индексе: {e} <set_online>"
+            )
+
+    async def sync_online(self, tg_ids: list[int]) -> None:
+        """
+        Приводит множество водителей «на линии» к состоянию БД (при запуске).
+        """
+        try:
+            redis = self._get_redis()
+            current = {int(member) for member in await redis.smembers(self.online_key)}
+            expected = {int(tg_id) for tg_id in tg_ids}
+
+            for tg_id in current - expected:
+                await self.set_online(tg_id, False)
+            for tg_id in expected - current:
+                await self.set_online(tg_id, True)
+
+            # Водители без актуальной позиции на линии, но не в GEO-множестве
+            located = await redis.zcard(self.geo_key)
+            self.logger.info(
+                f"Индекс водителей синхронизирован: на линии {len(expected)}, "
+                f"с актуальной позицией {located}, без позиции "
+                f"{len(expected) - located} <sync_online>"
+            )
+        except Exception as e:
+            self.logger.error(
+                f"Ошибка синхронизации индекса водителей: {e} <sync_online>"
+            )
+
+    async def get_positions(
+        self, tg_ids: list[int], max_age: float | None = None
+    ) -> dict[int, tuple[float, float]]:
+        """
+        Возвращает последние известные позиции водителей (не старше max_age секунд).
+
+        Returns:
+            Словарь {tg_id: (широта, долгота)} для водителей с известной позицией.
+        """
+        if not tg_ids:
+            return {}
+
+        try:
+            values = await self._get_redis().hmget(self.positions_key, tg_ids)
+        except Exception as e:
+            self.logger.error(f"Ошибка чтения позиций водителей: {e} <get_positions>")
+            return {}
+
+        now = time.time()
+        positions = {}
+        for tg_id, value in zip(tg_ids, values):
+            if value is None:
+                continue
+            latitude, longitude, seen_at = (
+                float(part) for part in value.decode().split(",")
+            )
+            if max_age is None or now - seen_at <= max_age:
+                positions[tg_id] = (latitude, longitude)
+        return positions
+
+    async def nearest_online_drivers(
+        self, latitude: float, longitude: float, k: int = 10, radius: float = 3.0
+    ) -> list[tuple[int, float]]:
+        """
+        Ищет ближайших водителей «на линии».
+
+        Args:
+            k: Максимальное количество водителей.
+            radius: Радиус поиска в километрах.
+
+        Returns:
+            Список пар (tg_id водителя, расстояние в км) по возрастанию расстояния.
+        """
+        try:
+            await self._prune_stale()
+            result = await self._get_redis().geosearch(
+                self.geo_key,
+                longitude=longitude,
+                latitude=latitude,
+                radius=radius,
+                unit="km",
+                sort="ASC",
+                count=k,
+                withdist=True,
+            )
+            return [(int(member), float(distance)) for member, distance in result]
+        except Exception as e:
+            self.logger.error(
+                f"Ошибка поиска водителей рядом с {latitude},{longitude}: {e} <nearest_online_drivers>"
+            )
+            return []
+
+    async def _prune_stale(self) -> None:
+        now = time.time()
+        if now - self._pruned_at < self.prune_interval:
+            return
+        self._pruned_at = now
+
+        redis = self._get_redis()
+        stale = await redis.zrangebyscore(self.seen_key, 0, now - self.max_age)
+        if stale:
+            pipe = redis.pipeline(transaction=False)
+            pipe.zrem(self.geo_key, *stale)
+            pipe.zrem(self.seen_key, *stale)
+            await pipe.execute()
+
+
+driver_index = DriverGeoIndex(
+    redis_url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+    max_age=int(os.getenv("DRIVER_POSITION_MAX_AGE", "1800")),
+)
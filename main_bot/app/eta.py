@@ -0,0 +1,173 @@
+import os
+import time
+import logging
+from datetime import datetime
+from collections import OrderedDict
+
+import pytz
+
+from app.geo import Coord
+from app.http_client import http_client
+from app.route_estimator import route_estimator
+
+logger = logging.getLogger(__name__)
+
+MATRIX_URL = "https://graphhopper.com/api/1/matrix"
+
+
+class EtaService:
+    """
+    Пакетный расчет времени подъезда от многих точек к одной (один-ко-многим).
+
+    Все непокрытые кэшем пары считаются одним запросом GraphHopper Matrix
+    (с разбиением на части по max_points). Если сервис недоступен или не
+    вернул значение, используется локальная оценка route_estimator.
+    Результаты кэшируются по округленным координатам и интервалу времени суток.
+    """
+
+    def __init__(
+        self,
+        ttl: int = 300,
+        maxsize: int = 20_000,
+        coord_precision: int = 3,
+        bucket_minutes: int = 30,
+        max_points: int = 50,
+    ):
+        self.ttl = ttl  # Время жизни ячейки кэша в секундах
+        self.maxsize = maxsize
+        self.coord_precision = coord_precision
+        self.bucket_minutes = bucket_minutes
+        self.max_points = max_points  # Максимум исходных точек в одном запросе
+        self.logger = logger
+        self._cells: OrderedDict[tuple, tuple[float, float, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _quantize(self, coords: Coord | str) -> str:
+        latitude, longitude = Coord.parse(coords)
+        precision = self.coord_precision
+        return f"{round(latitude, precision):.{precision}f},{round(longitude, precision):.{precision}f}"
+
+    def _time_bucket(self) -> int:
+        now = datetime.now(pytz.timezone("Etc/GMT-7"))
+        return (now.hour * 60 + now.minute) // self.bucket_minutes
+
+    async def one_to_many(
+        self, origins: list[str], destination: str
+    ) -> list[tuple[float, float, bool]]:
+        """
+        Считает расстояние и время в пути от каждой точки origins до destination.
+
+        Args:
+            origins: Координаты исходных точек в формате "широта,долгота".
+            destination: Координаты точки назначения.
+
+        Returns:
+            Список (расстояние в метрах, время в секундах, признак оценки)
+            в порядке origins.
+        """
+        bucket = self._time_bucket()
+        destination_key = self._quantize(destination)
+        now = time.monotonic()
+
+        results: list[tuple[float, float, bool] | None] = [None] * len(origins)
+        missing: dict[str, list[int]] = {}
+        for index, origin in enumerate(origins):
+            key = (self._quantize(origin), destination_key, bucket)
+            cell = self._cells.get(key)
+            if cell is not None and cell[0] > now:
+                self._cells.move_to_end(key)
+                self.hits += 1
+                results[index] = (cell[1], cell[2], False)
+            else:
+                self.misses += 1
+                missing.setdefault(key[0], []).append(index)
+
+        if missing:
+            points = list(missing)
+            for start in range(0, len(points), self.max_points):
+                chunk = points[start : start + self.max_points]
+                row = await self._request_matrix(chunk, destination)
+                for origin_key, cell in zip(chunk, row):
+                    if cell is None:
+                        meters, minutes = route_estimator.estimate(
+                            origin_key, destination
+                        )
+                        value = (meters, minutes * 60, True)
+                    else:
+                        value = (cell[0], cell[1], False)
+                        self._store((origin_key, destination_key, bucket), cell)
+                    for index in missing[origin_key]:
+                        results[index] = value
+
+        return results
+
+    async def eta(self, origin: str, destination: str) -> tuple[float, float, bool]:
+        return (await self.one_to_many([origin], destination))[0]
+
+    async def _request_matrix(
+        self, origins: list[str], destination: str
+    ) -> list[tuple[float, float] | None]:
+        graphhopper_key = os.getenv("GRAPHHOPPER_API_KEY")
+        if graphhopper_key is None:
+            self.logger.error(
+                "Отсутствует ключ API (GRAPHHOPPER_API_KEY) <_request_matrix>"
+            )
+            return [None] * len(origins)
+
+        def to_point(coords: str) -> list[float]:
+            point = Coord.parse(coords)
+            return [point.lon, point.lat]
+
+        payload = {
+            "from_points": [to_point(origin) for origin in origins],
+            "to_points": [to_point(destination)],
+            "out_arrays": ["distances", "times"],
+            "profile": "car",
+            "fail_fast": False,  # Недостижимые точки — null вместо ошибки
+        }
+
+        try:
+            response = await http_client.request(
+                "graphhopper_matrix",
+                "POST",
+                MATRIX_URL,
+                params={"key": graphhopper_key},
+                json=payload,
+            )
+        except Exception as e:
+            self.logger.error(f"Сервис матриц недоступен: {e} <_request_matrix>")
+            return [None] * len(origins)
+
+        if response.status != 200 or not response.data:
+            self.logger.error(
+                f"GraphHopper Matrix ответил статусом {response.status} <_request_matrix>"
+            )
+            return [None] * len(origins)
+
+        distances = response.data.get("distances") or []
+        times = response.data.get("times") or []
+        row = []
+        for index in range(len(origins)):
+            try:
+                meters, seconds = distances[index][0], times[index][0]
+            except (IndexError, TypeError):
+                meters = seconds = None
+            row.append(None if meters is None or seconds is None else (meters, seconds))
+        return row
+
+    def _store(self, key: tuple, cell: tuple[float, float]) -> None:
+        self._cells[key] = (time.monotonic() + self.ttl, *cell)
+        self._cells.move_to_end(key)
+        if len(self._cells) > self.maxsize:
+            self._cells.popitem(last=False)
+
+    def clear(self) -> None:
+        self._cells.clear()
+
+
+eta_service = EtaService(
+    ttl=int(os.getenv("ETA_CACHE_TTL", "300")),
+    coord_precision=int(os.getenv("ETA_CACHE_COORD_PRECISION", "3")),
+    max_points=int(os.getenv("ETA_MATRIX_MAX_POINTS", "50")),
+)
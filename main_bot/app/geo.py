@@ -0,0 +1,122 @@
+from typing import NamedTuple
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_DECODE = {char: index for index, char in enumerate(GEOHASH_ALPHABET)}
+
+# Точность хранимых в открытом виде координат (около 100 м): точные
+# координаты хранятся только в зашифрованных колонках *_coords
+COORD_COLUMN_PRECISION = 3
+GEOHASH_COLUMN_PRECISION = 7  # Ячейка около 150 x 150 м
+
+
+class Coord(NamedTuple):
+    """
+    Координаты точки (широта, долгота).
+
+    Строковое представление "широта,долгота" совпадает с форматом,
+    в котором координаты хранятся и передаются в API.
+    """
+
+    lat: float
+    lon: float
+
+    @classmethod
+    def parse(cls, value: "Coord | str") -> "Coord":
+        if isinstance(value, Coord):
+            return value
+        latitude, longitude = value.split(",")
+        return cls(float(latitude), float(longitude))
+
+    def __str__(self) -> str:
+        return f"{self.lat},{self.lon}"
+
+    def rounded(self, precision: int = COORD_COLUMN_PRECISION) -> "Coord":
+        return Coord(round(self.lat, precision), round(self.lon, precision))
+
+    def geohash(self, precision: int = GEOHASH_COLUMN_PRECISION) -> str:
+        return geohash_encode(self.lat, self.lon, precision)
+
+
+def parse_coord(value: "Coord | str | None") -> Coord | None:
+    """Разбирает координаты; для "-", пустых и некорректных значений возвращает None."""
+    try:
+        return Coord.parse(value)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        # Биты долготы и широты чередуются, начиная с долготы
+        value, bounds = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        if value >= middle:
+            bits = bits * 2 + 1
+            bounds[0] = middle
+        else:
+            bits *= 2
+            bounds[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = bit_count = 0
+    return "".join(chars)
+
+
+def geohash_bounds(geohash: str) -> tuple[float, float, float, float]:
+    """
+    Returns:
+        Границы ячейки (юг, запад, север, восток).
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = GEOHASH_DECODE[char]
+        for shift in range(4, -1, -1):
+            bounds = lon_range if even else lat_range
+            middle = (bounds[0] + bounds[1]) / 2
+            if (bits >> shift) & 1:
+                bounds[0] = middle
+            else:
+                bounds[1] = middle
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def geohash_area(point: Coord, precision: int, ring: int = 1) -> list[str]:
+    """
+    Ячейка точки и соседние с ней в пределах ring ячеек (при ring=1 — восемь
+    соседних) — для поиска «в районе точки» без краевых эффектов на границах ячеек.
+    """
+    south, west, north, east = geohash_bounds(point.geohash(precision))
+    lat_step = north - south
+    lon_step = east - west
+    center_lat = (south + north) / 2
+    center_lon = (west + east) / 2
+    return sorted(
+        {
+            geohash_encode(
+                center_lat + d_lat * lat_step, center_lon + d_lon * lon_step, precision
+            )
+            for d_lat in range(-ring, ring + 1)
+            for d_lon in range(-ring, ring + 1)
+        }
+    )
+
+
+def yandex_route_url(*points: "Coord | str | None") -> str:
+    """
+    Ссылка на маршрут в Яндекс Картах; пустая первая точка — от текущего
+    местоположения пользователя.
+    """
+    return "https://yandex.ru/maps/?rtext=" + "~".join(
+        "" if point is None else str(parse_coord(point) or point) for point in points
+    )
@@ -0,0 +1,208 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+FORWARD = "forward"  # Адрес -> координаты (geocode_address)
+REVERSE = "reverse"  # Координаты -> адрес (search_location)
+
+
+class GeoCache:
+    """
+    Двухуровневый кэш геокодирования: LRU в памяти процесса и Redis с TTL.
+
+    Прямые запросы хранятся по нормализованному тексту адреса,
+    обратные — по координатам, округленным до coord_precision знаков
+    (4 знака — около 10 м). Попадания и промахи считаются по уровням
+    и накапливаются в хэше Redis (общем для основного и админ-бота).
+    Записи LRU живут lru_ttl секунд, чтобы очистка кэша администратором
+    (из другого процесса) доходила и до памяти основного бота.
+    """
+
+    def __init__(
+        self,
+        redis_url: str = "redis://localhost:6379/0",
+        maxsize: int = 5_000,
+        ttl: int = 30 * 24 * 3600,
+        lru_ttl: int = 600,
+        coord_precision: int = 4,
+        prefix: str = "geocache",
+    ):
+        self.redis_url = redis_url
+        self.maxsize = maxsize
+        self.ttl = ttl  # Время жизни записи в Redis в секундах
+        self.lru_ttl = lru_ttl  # Время жизни записи в памяти в секундах
+        self.coord_precision = coord_precision
+        self.prefix = prefix
+        self.stats_key = f"{prefix}_stats"
+        self.logger = logger
+        self._lru: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._redis: Redis | None = None
+        self._pending_stats: dict[str, int] = {}  # Еще не записанные в Redis
+
+    @staticmethod
+    def normalize_address(address: str) -> str:
+        address = address.lower().replace("ё", "е")
+        return re.sub(r"[\W_]+", " ", address).strip()
+
+    def forward_key(self, address: str) -> str:
+        digest = hashlib.sha1(
+            self.normalize_address(address).encode("utf-8")
+        ).hexdigest()
+        return f"{self.prefix}:{FORWARD}:{digest}"
+
+    def reverse_key(self, latitude: float, longitude: float) -> str:
+        lat = round(float(latitude), self.coord_precision)
+        lon = round(float(longitude), self.coord_precision)
+        return f"{self.prefix}:{REVERSE}:{lat:.{self.coord_precision}f}:{lon:.{self.coord_precision}f}"
+
+    def _get_redis(self) -> Redis:
+        if self._redis is None:
+            self._redis = Redis.from_url(self.redis_url)
+        return self._redis
+
+    def _lru_set(self, key: str, value) -> None:
+        self._lru[key] = (time.monotonic() + self.lru_ttl, value)
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    async def _get(self, kind: str, key: str):
+        entry = self._lru.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._lru.move_to_end(key)
+                await self._count(kind, "lru_hits")
+                return value
+            del self._lru[key]
+
+        try:
+            raw = await self._get_redis().get(key)
+        except Exception as e:
+            self.logger.warning(f"Redis недоступен: {e} <GeoCache._get>")
+            raw = None
+
+        if raw is None:
+            await self._count(kind, "misses", flush=True)
+            return None
+
+        value = json.loads(raw)
+        if isinstance(value, list):
+            value = tuple(value)
+        self._lru_set(key, value)
+        await self._count(kind, "redis_hits", flush=True)
+        return value
+
+    async def _count(self, kind: str, counter: str, flush: bool = False) -> None:
+        field = f"{kind}:{counter}"
+        self._pending_stats[field] = self._pending_stats.get(field, 0) + 1
+        if not flush:
+            return
+
+        # Счетчики попаданий в LRU отправляются вместе с ближайшим обращением к Redis
+        pending, self._pending_stats = self._pending_stats, {}
+        try:
+            pipe = self._get_redis().pipeline(transaction=False)
+            for field, value in pending.items():
+                pipe.hincrby(self.stats_key, field, value)
+            await pipe.execute()
+        except Exception as e:
+            self.logger.warning(f"Redis недоступен: {e} <GeoCache._count>")
+
+    async def _set(self, key: str, value) -> None:
+        self._lru_set(key, value)
+        try:
+            await self._get_redis().set(
+                key, json.dumps(value, ensure_ascii=False), ex=self.ttl
+            )
+        except Exception as e:
+            self.logger.warning(f"Redis недоступен: {e} <GeoCache._set>")
+
+    async def get_forward(self, address: str) -> tuple[str, str] | None:
+        return await self._get(FORWARD, self.forward_key(address))
+
+    async def set_forward(self, address: str, result: tuple[str, str]) -> None:
+        await self._set(self.forward_key(address), result)
+
+    async def get_reverse(self, latitude: float, longitude: float) -> str | None:
+        return await self._get(REVERSE, self.reverse_key(latitude, longitude))
+
+    async def set_reverse(
+        self, latitude: float, longitude: float, address: str
+    ) -> None:
+        await self._set(self.reverse_key(latitude, longitude), address)
+
+    async def invalidate(self, address: str) -> None:
+        """
+        Удаляет из кэша результат прямого геокодирования адреса.
+        """
+        key = self.forward_key(address)
+        self._lru.pop(key, None)
+        try:
+            await self._get_redis().delete(key)
+        except Exception as e:
+            self.logger.warning(f"Redis недоступен: {e} <GeoCache.invalidate>")
+
+    async def clear(self) -> int:
+        """
+        Полностью очищает кэш (память процесса и записи в Redis).
+
+        Returns:
+            Количество удаленных ключей Redis.
+        """
+        self._lru.clear()
+        deleted = 0
+        try:
+            redis = self._get_redis()
+            async for key in redis.scan_iter(match=f"{self.prefix}:*", count=500):
+                deleted += await redis.delete(key)
+        except Exception as e:
+            self.logger.warning(f"Redis недоступен: {e} <GeoCache.clear>")
+        return deleted
+
+    async def get_stats(self) -> dict[str, dict[str, int]]:
+        """
+        Возвращает накопленные счетчики попаданий и промахов по видам запросов.
+        """
+        stats = {
+            kind: {"lru_hits": 0, "redis_hits": 0, "misses": 0}
+            for kind in (FORWARD, REVERSE)
+        }
+        try:
+            raw = await self._get_redis().hgetall(self.stats_key)
+        except Exception as e:
+            self.logger.warning(f"Redis недоступен: {e} <GeoCache.get_stats>")
+            raw = {}
+
+        for field, value in raw.items():
+            kind, counter = field.decode().split(":", 1)
+            if kind in stats and counter in stats[kind]:
+                stats[kind][counter] = int(value)
+        return stats
+
+    async def stats_text(self) -> str:
+        lines = []
+        for kind, counters in (await self.get_stats()).items():
+            total = sum(counters.values())
+            hits = counters["lru_hits"] + counters["redis_hits"]
+            hit_rate = hits / total * 100 if total else 0.0
+            lines.append(
+                f"{kind}: LRU {counters['lru_hits']}, Redis {counters['redis_hits']}, "
+                f"промахи {counters['misses']} (попадания {hit_rate:.1f}%)"
+            )
+        return "\n".join(lines)
+
+
+geo_cache = GeoCache(
+    redis_url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+    ttl=int(os.getenv("GEOCACHE_TTL", str(30 * 24 * 3600))),
+    coord_precision=int(os.getenv("GEOCACHE_COORD_PRECISION", "4")),
+)
@@ -0,0 +1,140 @@
+import os
+import logging
+
+from app.geo import Coord, parse_coord
+
+logger = logging.getLogger(__name__)
+
+# Зона обслуживания по умолчанию: Новосибирск с Академгородком, Кольцово,
+# Обью и аэропортом Толмачево. Вершины (широта, долгота) по часовой стрелке
+NOVOSIBIRSK_POLYGON = (
+    (55.16, 82.85),
+    (55.13, 83.05),
+    (55.05, 83.18),
+    (54.95, 83.22),
+    (54.82, 83.16),
+    (54.78, 83.05),
+    (54.85, 82.93),
+    (54.93, 82.75),
+    (54.95, 82.58),
+    (55.05, 82.60),
+    (55.12, 82.72),
+)
+
+OUTSIDE, INSIDE, BOUNDARY = 0, 1, 2
+
+
+def parse_polygon(value: str) -> list[Coord]:
+    """Разбирает многоугольник из строки "широта,долгота;широта,долгота;..."."""
+    return [Coord.parse(point.strip()) for point in value.split(";") if point.strip()]
+
+
+class Geofence:
+    """
+    Проверка попадания точки в зону обслуживания без обращения к внешним API.
+
+    Точка сначала сравнивается с ограничивающим прямоугольником многоугольника,
+    затем по сетке grid x grid: для ячеек целиком внутри или снаружи ответ
+    известен заранее, полный подсчет пересечений луча со сторонами
+    (ray casting) выполняется только для ячеек, через которые проходит граница.
+    """
+
+    def __init__(self, polygon: list[Coord] | tuple, grid: int = 32):
+        if len(polygon) < 3:
+            raise ValueError("Многоугольник зоны обслуживания должен иметь 3+ вершины")
+
+        self.polygon = [Coord(*point) for point in polygon]
+        self.edges = list(zip(self.polygon, self.polygon[1:] + self.polygon[:1]))
+        self.south = min(point.lat for point in self.polygon)
+        self.north = max(point.lat for point in self.polygon)
+        self.west = min(point.lon for point in self.polygon)
+        self.east = max(point.lon for point in self.polygon)
+        self.grid = grid
+        self.lat_step = (self.north - self.south) / grid
+        self.lon_step = (self.east - self.west) / grid
+        self.cells = self._build_grid()
+
+    def _cell(self, latitude: float, longitude: float) -> tuple[int, int]:
+        row = min(int((latitude - self.south) / self.lat_step), self.grid - 1)
+        column = min(int((longitude - self.west) / self.lon_step), self.grid - 1)
+        return row, column
+
+    def _build_grid(self) -> list[list[int]]:
+        cells = [[None] * self.grid for _ in range(self.grid)]
+
+        # Ячейки, которые задевает прямоугольник стороны, считаем граничными
+        for start, end in self.edges:
+            low_row, low_column = self._cell(
+                min(start.lat, end.lat), min(start.lon, end.lon)
+            )
+            high_row, high_column = self._cell(
+                max(start.lat, end.lat), max(start.lon, end.lon)
+            )
+            for row in range(low_row, high_row + 1):
+                for column in range(low_column, high_column + 1):
+                    cells[row][column] = BOUNDARY
+
+        # Остальные ячейки границу не пересекают: достаточно проверить центр
+        for row in range(self.grid):
+            for column in range(self.grid):
+                if cells[row][column] is None:
+                    center_lat = self.south + (row + 0.5) * self.lat_step
+                    center_lon = self.west + (column + 0.5) * self.lon_step
+                    cells[row][column] = (
+                        INSIDE if self._ray_cast(center_lat, center_lon) else OUTSIDE
+                    )
+        return cells
+
+    def _ray_cast(self, latitude: float, longitude: float) -> bool:
+        inside = False
+        for start, end in self.edges:
+            if (start.lat > latitude) != (end.lat > latitude):
+                crossing = start.lon + (latitude - start.lat) * (
+                    end.lon - start.lon
+                ) / (end.lat - start.lat)
+                if longitude < crossing:
+                    inside = not inside
+        return inside
+
+    def contains(self, point: Coord) -> bool:
+        latitude, longitude = point
+        if not (
+            self.south <= latitude <= self.north and self.west <= longitude <= self.east
+        ):
+            return False
+
+        row, column = self._cell(latitude, longitude)
+        cell = self.cells[row][column]
+        if cell == BOUNDARY:
+            return self._ray_cast(latitude, longitude)
+        return cell == INSIDE
+
+    def check(self, coords: Coord | str | dict | None) -> bool:
+        """
+        Проверяет координаты в формате "широта,долгота", Coord или словаря
+        геопозиции Telegram. Нераспознанные координаты не отклоняются:
+        с ними разбираются обработчики геокодирования.
+        """
+        if isinstance(coords, dict):
+            coords = f"{coords.get('latitude')},{coords.get('longitude')}"
+        point = parse_coord(coords)
+        if point is None:
+            return True
+        return self.contains(point)
+
+
+def load_geofence() -> Geofence:
+    polygon_text = os.getenv("SERVICE_AREA_POLYGON")
+    grid = int(os.getenv("SERVICE_AREA_GRID", "32"))
+    if polygon_text:
+        try:
+            return Geofence(parse_polygon(polygon_text), grid)
+        except (TypeError, ValueError) as e:
+            logger.error(
+                f"Некорректная зона обслуживания SERVICE_AREA_POLYGON: {e}, "
+                f"используется зона по умолчанию <load_geofence>"
+            )
+    return Geofence(NOVOSIBIRSK_POLYGON, grid)
+
+
+service_area = load_geofence()
@@ -1,4 +1,5 @@
 import os
+import math
 import logging
 import asyncio
 from datetime import datetime, timedelta
@@ -11,14 +12,21 @@ from aiogram_calendar import SimpleCalendar, SimpleCalendarCallback
 
 from aiogram.fsm.context import FSMContext
 
+from sqlalchemy.ext.asyncio import AsyncSession
+
 import app.states as st
 import app.keyboards as kb
 import app.database.requests as rq
 import app.support as sup
+from app.routecache import route_cache
+from app.driver_index import driver_index
+from app.dispatch import order_dispatcher
+from app.eta import eta_service
+from app.geo import parse_coord
+from app.geofence import service_area
 import app.user_messages as um
 from .scheduler_manager import scheduler_manager
 
-from apscheduler.jobstores.base import JobLookupError
 
 
 handlers_router = Router()
@@ -940,6 +948,13 @@ async def order_description(callback: CallbackQuery, state: FSMContext):
 
         decrypted_start_coords = sup.decrypt_data(order.start_coords, encryption_key)
 
+        # Заказ из группы рассматривает только первый водитель (условный UPDATE)
+        if not await rq.claim_order(order_id, 3, 13):
+            await callback.answer(
+                "Заказ уже принят другим водителем или отменен", show_alert=True
+            )
+            return
+
         msg = await callback.bot.send_message(
             chat_id=user_id,
             text=order_info,
@@ -954,7 +969,6 @@ async def order_description(callback: CallbackQuery, state: FSMContext):
         await rq.set_message(client_tg_id, msg.message_id, msg.text)
 
         await rq.set_status_driver(user_id, 9)
-        await rq.set_status_order(client_id, order_id, 13)
         await rq.set_order_history(
             order_id, driver_id, "на рассмотрении у водителя", "-"
         )
@@ -970,7 +984,13 @@ async def order_description(callback: CallbackQuery, state: FSMContext):
             text=f"Заказ №{order_id} на рассмотрении",
             reply_markup=kb.under_consideration_button,
         )
-        await rq.set_message(group_chat_id, msg.message_id, msg.text)
+        await rq.set_message(
+            group_chat_id,
+            msg.message_id,
+            msg.text,
+            order_id,
+            rq.MESSAGE_KIND_GROUP_REVIEW,
+        )
 
     except Exception as e:
         logger.error(
@@ -980,13 +1000,16 @@ async def order_description(callback: CallbackQuery, state: FSMContext):
 
 
 @handlers_router.callback_query(F.data == "accept_order")  # State() для водителя
-async def accept_order(callback: CallbackQuery, state: FSMContext):
+async def accept_order(
+    callback: CallbackQuery, state: FSMContext, session: AsyncSession
+):
     """
     Обработчик колбэка для принятия заказа водителем.
 
     Args:
         callback (CallbackQuery): Объект CallbackQuery.
         state (FSMContext): Объект FSMContext для управления состоянием.
+        session (AsyncSession): Сессия БД текущего апдейта.
 
     Returns:
         None
@@ -1003,87 +1026,122 @@ async def accept_order(callback: CallbackQuery, state: FSMContext):
             )
             return
 
-        client_id = await rq.get_client_by_order(order_id)
-        if client_id is None:
+        context = await rq.get_order_context(order_id, user_id, session=session)
+        if context is None:
             logger.error(
-                f"Не удалось получить ID клиента для заказа {order_id} <accept_order>"
+                f"Не удалось получить информацию о заказе {order_id} <accept_order>"
             )
             return
 
-        client_tg_id = await rq.get_tg_id_by_client_id(client_id)
-        if client_tg_id is None:
-            logger.error(
-                f"Не удалось получить Telegram ID клиента для клиента {client_id} <accept_order>"
-            )
-            return
-
-        driver_id = await rq.get_driver(user_id)
-        if driver_id is None:
+        if context.driver_id is None:
             logger.error(
                 f"Не удалось получить ID водителя для пользователя {user_id} <accept_order>"
             )
             return
 
-        driver_tg_id = await rq.get_tg_id_by_driver_id(driver_id)
-        if driver_tg_id is None:
-            logger.error(
-                f"Не удалось получить Telegram ID водителя для водителя {driver_id} <accept_order>"
-            )
-            return
+        client_id = context.client_id
+        client_tg_id = context.client_tg_id
+        driver_id = context.driver_id
+        driver_tg_id = context.driver_tg_id
 
-        user_driver = await rq.get_user_by_tg_id(driver_tg_id)
-        if user_driver is None:
-            logger.error(
-                f"Не удалось получить пользователя для Telegram ID водителя {driver_tg_id} <accept_order>"
-            )
-            return
+        if context.order.status_id != 13:
+            # Заказ предложен водителю напрямую: закрепляем его за первым принявшим
+            user_status = await rq.check_status(user_id)
+            if user_status == 2:
+                await callback.answer("Вы не на линии", show_alert=True)
+                return
+            elif context.rate_id not in [4, 5] and user_status == 9:
+                await callback.answer("Есть текущий заказ", show_alert=True)
+                return
 
-        user_client = await rq.get_user_by_tg_id(client_tg_id)
-        if user_client is None:
-            logger.error(
-                f"Не удалось получить пользователя для Telegram ID клиента {client_tg_id} <accept_order>"
+            if not await order_dispatcher.claim(order_id, user_id, session=session):
+                await callback.answer(
+                    "Заказ уже принят другим водителем или отменен", show_alert=True
+                )
+                await callback.message.delete()
+                await rq.delete_order_messages_from_db(user_id, order_id)
+                return
+
+            await rq.set_status_driver(user_id, 9, session=session)
+            await rq.set_order_history(
+                order_id,
+                driver_id,
+                "на рассмотрении у водителя",
+                "-",
+                session=session,
             )
-            return
+        else:
+            # Заказ из группы: принять его может только рассматривающий водитель
+            # (устаревшее предложение волны — нет) и только один раз
+            reviewer_id = await rq.get_latest_driver_id_by_order_id(
+                order_id, session=session
+            )
+            if reviewer_id != driver_id or not await rq.claim_order(
+                order_id, 13, 4, session=session
+            ):
+                await callback.answer(
+                    "Заказ уже принят другим водителем или отменен", show_alert=True
+                )
+                await callback.message.delete()
+                await rq.delete_order_messages_from_db(user_id, order_id)
+                return
 
         group_chat_id = os.getenv("GROUP_CHAT_ID")
         if not group_chat_id:
+            await session.rollback()
             logger.error(
                 "Отсутствует Телеграмм-ID группы (GROUP_CHAT_ID) <accept_order>"
             )
             return
 
-        msg_id = await rq.get_message_id_by_text(f"Заказ №{order_id} на рассмотрении")
+        is_applied = await rq.set_order_state(
+            client_id,
+            order_id,
+            4,
+            current_order={
+                "driver_id": driver_id,
+                "driver_tg_id": driver_tg_id,
+                "driver_username": context.driver_username,
+                "driver_location": "-",
+                "driver_coords": "-",
+                "client_id": client_id,
+                "client_tg_id": client_tg_id,
+                "client_username": context.client_username,
+                "total_time_to_client": "-",
+                "scheduled_arrival_time_to_client": "-",
+                "actual_arrival_time_to_client": "-",
+                "actual_start_time_trip": "-",
+                "scheduled_arrival_time_to_place": "-",
+                "actual_arrival_time_to_place": "-",
+            },
+            session=session,
+        )
+        if not is_applied:
+            # Откатываем и закрепление заказа: он остается у распределения
+            await session.rollback()
+            logger.error(
+                f"Не удалось сохранить принятие заказа {order_id} водителем {driver_id} <accept_order>"
+            )
+            await callback.answer(um.common_error_message(), show_alert=True)
+            return
+
+        # Фиксируем до обращений к Telegram, чтобы не держать блокировку заказа
+        await session.commit()
+
+        # Сообщение о заказе в группе: на рассмотрении или опубликованный после
+        # волн заказ, принятый по предложению волны
+        msg_id = await rq.get_order_message_id(
+            group_chat_id,
+            order_id,
+            [rq.MESSAGE_KIND_GROUP_REVIEW, rq.MESSAGE_KIND_GROUP_ORDER],
+        )
         if msg_id != None:
             await callback.message.bot.delete_message(
                 chat_id=group_chat_id, message_id=msg_id
             )
-            await rq.delete_certain_message_from_db(msg_id)
+            await rq.delete_order_messages_from_db(group_chat_id, order_id)
 
-        await rq.set_status_order(client_id, order_id, 4)
-        await rq.set_current_order(
-            order_id,
-            driver_id,
-            driver_tg_id,
-            user_driver.username,
-            "-",
-            "-",
-            client_id,
-            client_tg_id,
-            user_client.username,
-            "-",
-            "-",
-            "-",
-            "-",
-            "-",
-            "-",
-        )
-
-        rate_id = await rq.check_rate(user_id, order_id)
-        if rate_id is None:
-            logger.error(
-                f"Не удалось получить ID тарифа для пользователя {user_id} и заказа {order_id} <order_description>"
-            )
-            return
+        rate_id = context.rate_id
 
         if rate_id in [4, 5]:
             await driver_location_confirm_start_order(
@@ -1108,6 +1166,7 @@ async def accept_order(callback: CallbackQuery, state: FSMContext):
             await state.set_state(st.Driving_process.driver_location)
 
     except Exception as e:
+        await session.rollback()  # Изменения, еще не зафиксированные до ошибки
         await state.clear()
         logger.error(f"Ошибка в функции accept_order для пользователя {user_id}: {e}")
         await callback.answer(um.common_error_message(), show_alert=True)
@@ -1169,6 +1228,9 @@ async def handler_driver_location(message: Message, state: FSMContext):
             }
             start_coords = f"{locale['latitude']},{locale['longitude']}"
             await rq.set_message(user_id, message.message_id, "location")
+            await driver_index.update_position(
+                user_id, locale["latitude"], locale["longitude"]
+            )
             corrected_address = await sup.get_address(locale)
             if corrected_address is None:
                 await state.clear()
@@ -1253,14 +1315,6 @@ async def driver_location_confirm_start_order(
 
     decrypted_order_start_coords = sup.decrypt_data(order.start_coords, encryption_key)
 
-    result = await sup.send_route(start_coords, decrypted_order_start_coords)
-    if result is None:
-        msg = await message.answer(
-            "Не удалось получить информацию о маршруте. Обратитесь в поддержку."
-        )
-        await rq.set_message(user_id, msg.message_id, msg.text)
-        return
-
     photo_response = await sup.send_driver_photos(message, client_tg_id, driver_info)
     if photo_response:
         await sup.send_message(message, user_id, photo_response)
@@ -1274,7 +1328,13 @@ async def driver_location_confirm_start_order(
             f'👤За вами приедет:\n{driver_info["text"]}\n\n'
         )
     else:
-        total_distance, total_time, price = result
+        # Время подъезда водителя к клиенту (матрица GraphHopper или оценка)
+        meters, seconds, _ = await eta_service.eta(
+            start_coords, decrypted_order_start_coords
+        )
+        total_distance, total_time, _ = sup.format_route(
+            meters, math.ceil(seconds / 60)
+        )
 
         encrypted_driver_location = sup.encrypt_data(driver_location, encryption_key)
         encrypted_start_coords = sup.encrypt_data(start_coords, encryption_key)
@@ -1287,6 +1347,7 @@ async def driver_location_confirm_start_order(
             encrypted_start_coords,
             scheduled_time,
             total_time,
+            driver_point=parse_coord(start_coords),
         )
 
         formatted_time = scheduled_time.split()[1]
@@ -1316,12 +1377,15 @@ async def driver_location_confirm_start_order(
 
 
 @handlers_router.callback_query(F.data == "client_accept_order")  # State() клиента
-async def client_accept(callback: CallbackQuery, state: FSMContext):
+async def client_accept(
+    callback: CallbackQuery, state: FSMContext, session: AsyncSession
+):
     """
     Обработчик колбэка для подтверждения заказа клиентом.
 
     Args:
         callback (CallbackQuery): Объект CallbackQuery.
+        session (AsyncSession): Сессия БД текущего апдейта.
 
     Returns:
         None
@@ -1338,14 +1402,15 @@ async def client_accept(callback: CallbackQuery, state: FSMContext):
             )
             return
 
-        order = await rq.get_order_by_id(order_id)
-        if order is None:
+        context = await rq.get_order_context(order_id, session=session)
+        if context is None:
             logger.error(
                 f"Не удалось получить информацию о заказе по ID {order_id} для пользователя {user_id} <client_accept>"
             )
             return
 
-        current_order = await rq.get_current_order(order_id, identifier_type="order_id")
+        order = context.order
+        current_order = context.current_order
         if current_order is None:
             logger.error(
                 f"Не удалось получить текущий заказ по ID {order_id} для пользователя {user_id} <client_accept>"
@@ -1380,12 +1445,7 @@ async def client_accept(callback: CallbackQuery, state: FSMContext):
             )
             return
 
-        rate_id = await rq.check_rate(user_id, order_id)
-        if rate_id is None:
-            logger.error(
-                f"Не удалось получить ID тарифа для пользователя {user_id} и заказа {order_id} <client_accept>"
-            )
-            return
+        rate_id = context.rate_id
 
         order_info = await sup.check_rate_for_order_info(rate_id, order_id)
         if order_info is None:
@@ -1412,7 +1472,6 @@ async def client_accept(callback: CallbackQuery, state: FSMContext):
             day_month = order.submission_time.split()[0]
             submission_time = order.submission_time.split()[1]
             exact_time_preorder_str = f"{day_month}-{year} {submission_time}"
-            formatted_time = order.submission_time.split()[1]
 
             await rq.set_arrival_time_to_client(order_id, exact_time_preorder_str, True)
 
@@ -1440,25 +1499,11 @@ async def client_accept(callback: CallbackQuery, state: FSMContext):
                 )
                 return
 
-            scheduler_manager.add_job(
-                sup.scheduled_switch_order_status_and_block_driver,
-                "date",
-                run_date=run_date,
-                misfire_grace_time=60,
-                args=[
-                    order,
-                    client_id,
-                    driver_id,
-                    5,
-                    int(driver_tg_id),
-                    int(client_tg_id),
-                    rate_id,
-                    order_info,
-                    order_info_for_client,
-                    user_client,
-                    formatted_time,
-                ],
-                id=f"{order.id}_switch_order_status",
+            sup.schedule_order_job(
+                sup.ORDER_JOB_START_TRIP,
+                order.id,
+                run_date,
+                f"{order.id}_switch_order_status",
             )
 
             await sup.delete_messages_from_chat(driver_tg_id, callback.message)
@@ -1468,49 +1513,16 @@ async def client_accept(callback: CallbackQuery, state: FSMContext):
             )
             await rq.set_message(driver_tg_id, msg.message_id, msg.text)
 
-            order_info_for_driver = await sup.get_order_info_for_driver(
-                rate_id,
-                order.submission_time,
-                order.id,
-                order.start,
-                order.finish,
-                order.comment,
-                "предзаказ принят",
-                order.price,
-                order.distance,
-                order.trip_time,
-            )
-            if order_info_for_driver is None:
-                logger.error(
-                    f"Не удалось получить информацию о заказе для тарифа {rate_id} и заказа {order_id} <handler_remind_callback>"
-                )
-                return
-
             time_diff = await sup.calculate_time_diff(order.submission_time)
-            time_diff_minutes = time_diff.total_seconds() / 60
-            time_diff_hours = int(time_diff.total_seconds() / 3600)
-            remind_time = ""
-
-            if time_diff_hours > 24:
-                remind_time = "8 часов"
-                run_date -= timedelta(minutes=470)
-            elif time_diff_minutes >= 60:
-                remind_time = "30 минут"
-                run_date -= timedelta(minutes=30)
-            elif 25 <= time_diff_minutes < 60:
-                remind_time = "20 минут"
-                run_date -= timedelta(minutes=10)
-
-            scheduler_manager.add_job(
-                sup.scheduled_driver_reminder_preorder,
-                "date",
-                run_date=run_date,
-                misfire_grace_time=60,
-                args=[
-                    driver_tg_id,
-                    order_info_for_driver,
-                ],
-                id=f"{order.id}_remind_{driver_tg_id}",
+            remind_time, remind_offset = sup.driver_remind_offset(time_diff)
+            run_date -= remind_offset
+
+            sup.schedule_order_job(
+                sup.ORDER_JOB_REMIND_DRIVER,
+                order.id,
+                run_date,
+                f"{order.id}_remind_{driver_tg_id}",
+                tg_id=int(driver_tg_id),
             )
 
             msg = await callback.bot.send_message(
@@ -1598,10 +1610,7 @@ async def client_accept(callback: CallbackQuery, state: FSMContext):
         logger.error(f"Ошибка в функции client_accept для пользователя {user_id}: {e}")
         await callback.answer(um.common_error_message(), show_alert=True)
     finally:
-        try:
-            scheduler_manager.remove_job(str(order_id))
-        except JobLookupError as e:
-            logger.error(f"Задание с ID {str(order_id)} не найдено <client_accept>")
+        await sup.cancel_order_timeout(order_id)
 
 
 @handlers_router.callback_query(F.data.startswith("remind_"))
@@ -1663,24 +1672,6 @@ async def handler_remind_callback(callback: CallbackQuery, state: FSMContext):
             )
             return
 
-        order_info_for_client = await sup.get_order_info_for_client_with_driver(
-            rate_id,
-            order.submission_time,
-            order.id,
-            order.start,
-            order.finish,
-            order.comment,
-            "предзаказ принят",
-            order.price,
-            order.distance,
-            order.trip_time,
-        )
-        if order_info_for_client is None:
-            logger.error(
-                f"Не удалось получить информацию о заказе для тарифа {rate_id} и заказа {order_id} <handler_remind_callback>"
-            )
-            return
-
         current_order = await rq.get_current_order(order_id, identifier_type="order_id")
         if current_order is None:
             logger.error(
@@ -1708,16 +1699,12 @@ async def handler_remind_callback(callback: CallbackQuery, state: FSMContext):
         run_date = run_date.replace(tzinfo=pytz.timezone("Etc/GMT-7"))
         run_date -= tdelta
 
-        scheduler_manager.add_job(
-            sup.scheduled_client_reminder_preorder,
-            "date",
-            run_date=run_date,
-            misfire_grace_time=60,
-            args=[
-                client_tg_id,
-                order_info_for_client,
-            ],
-            id=f"{order.id}_remind_{user_id}",
+        sup.schedule_order_job(
+            sup.ORDER_JOB_REMIND_CLIENT,
+            order.id,
+            run_date,
+            f"{order.id}_remind_{user_id}",
+            tg_id=int(client_tg_id),
         )
 
         msg = await callback.message.answer(
@@ -1732,13 +1719,16 @@ async def handler_remind_callback(callback: CallbackQuery, state: FSMContext):
 
 
 @handlers_router.callback_query(F.data == "in_place")  # State() водителя
-async def handler_in_place(callback: CallbackQuery, state: FSMContext):
+async def handler_in_place(
+    callback: CallbackQuery, state: FSMContext, session: AsyncSession
+):
     """
     Обработчик колбэка для отметки водителем прибытия на место.
 
     Args:
         callback (CallbackQuery): Объект CallbackQuery.
         state (FSMContext): Объект FSMContext для управления состоянием.
+        session (AsyncSession): Сессия БД текущего апдейта.
 
     Returns:
         None
@@ -1755,7 +1745,15 @@ async def handler_in_place(callback: CallbackQuery, state: FSMContext):
             )
             return
 
-        current_order = await rq.get_current_order(order_id, identifier_type="order_id")
+        context = await rq.get_order_context(order_id, session=session)
+        if context is None:
+            logger.error(
+                f"Не удалось получить информацию о заказе по ID {order_id} для пользователя {user_id} <handler_in_place>"
+            )
+            return
+
+        order = context.order
+        current_order = context.current_order
         if current_order is None:
             logger.error(
                 f"Не удалось получить текущий заказ по ID {order_id} для пользователя {user_id} <handler_in_place>"
@@ -1786,17 +1784,14 @@ async def handler_in_place(callback: CallbackQuery, state: FSMContext):
         current_arrival_time = datetime.now(pytz.timezone("Etc/GMT-7"))
 
         await rq.set_arrival_time_to_client(
-            order_id, current_arrival_time.strftime("%d-%m-%Y %H:%M")
+            order_id, current_arrival_time.strftime("%d-%m-%Y %H:%M"), session=session
+        )
+        await rq.set_order_state(
+            client_id, order_id, 12, driver_id, "водитель на месте", session=session
         )
-        await rq.set_status_order(client_id, order_id, 12)
-        await rq.set_order_history(order_id, driver_id, "водитель на месте", "-")
+        await session.commit()
 
-        rate_id = await rq.check_rate(user_id, order_id)
-        if rate_id is None:
-            logger.error(
-                f"Не удалось получить ID тарифа для пользователя {user_id} и заказа {order_id} <handler_in_place>"
-            )
-            return
+        rate_id = context.rate_id
 
         order_info = await sup.check_rate_for_order_info(rate_id, order_id)
         if order_info is None:
@@ -1805,13 +1800,6 @@ async def handler_in_place(callback: CallbackQuery, state: FSMContext):
             )
             return
 
-        order = await rq.get_order_by_id(order_id)
-        if order is None:
-            logger.error(
-                f"Не удалось получить информацию о заказе по ID {order_id} для пользователя {user_id} <handler_in_place>"
-            )
-            return
-
         order_info_for_client = await sup.get_order_info_for_client_with_driver(
             rate_id,
             order.submission_time,
@@ -1844,8 +1832,7 @@ async def handler_in_place(callback: CallbackQuery, state: FSMContext):
             )
             return
 
-        await sup.delete_messages_from_chat(user_id, callback.message)
-        await sup.delete_messages_from_chat(client_tg_id, callback.message)
+        await sup.delete_messages_from_chats([user_id, client_tg_id], callback.message)
 
         driver_info = await rq.get_driver_info(current_order.driver_id, True)
         if driver_info is None:
@@ -1882,13 +1869,16 @@ async def handler_in_place(callback: CallbackQuery, state: FSMContext):
 
 
 @handlers_router.callback_query(F.data == "start_trip")  # State() водителя
-async def handler_start_trip(callback: CallbackQuery, state: FSMContext):
+async def handler_start_trip(
+    callback: CallbackQuery, state: FSMContext, session: AsyncSession
+):
     """
     Обработчик колбэка для начала поездки водителем.
 
     Args:
         callback (CallbackQuery): Объект CallbackQuery.
         state (FSMContext): Объект FSMContext для управления состоянием.
+        session (AsyncSession): Сессия БД текущего апдейта.
 
     Returns:
         None
@@ -1956,8 +1946,9 @@ async def handler_start_trip(callback: CallbackQuery, state: FSMContext):
             )
             return
 
-        await rq.set_status_order(client_id, order_id, 6)
-        await rq.set_order_history(order_id, driver_id, "в пути", "-")
+        await rq.set_order_state(
+            client_id, order_id, 6, driver_id, "в пути", session=session
+        )
 
         if rate_id in [2, 5]:
             scheduled_time = await sup.calculate_new_time_by_current_time(
@@ -1969,11 +1960,15 @@ async def handler_start_trip(callback: CallbackQuery, state: FSMContext):
             )
 
         current_time = datetime.now(pytz.timezone("Etc/GMT-7"))
-        await rq.set_arrival_time_to_place(order_id, scheduled_time, True)
-        await rq.set_start_time_trip(order_id, current_time.strftime("%d-%m-%Y %H:%M"))
+        await rq.set_arrival_time_to_place(
+            order_id, scheduled_time, True, session=session
+        )
+        await rq.set_start_time_trip(
+            order_id, current_time.strftime("%d-%m-%Y %H:%M"), session=session
+        )
+        await session.commit()
 
-        await sup.delete_messages_from_chat(user_id, callback.message)
-        await sup.delete_messages_from_chat(client_tg_id, callback.message)
+        await sup.delete_messages_from_chats([user_id, client_tg_id], callback.message)
 
         formatted_time = scheduled_time.split()[1]
 
@@ -2014,30 +2009,20 @@ async def handler_start_trip(callback: CallbackQuery, state: FSMContext):
             return
 
         if rate_id in [2, 5]:
-            scheduler_manager.add_job(
-                sup.scheduled_reminder_finish_trip,
-                "date",
-                run_date=current_time + timedelta(minutes=30),
-                misfire_grace_time=60,
-                args=[
-                    client_tg_id,
-                    user_id,
-                    30,
-                ],
-                id=f"{order.id}_30min",
-            )
-
-            scheduler_manager.add_job(
-                sup.scheduled_reminder_finish_trip,
-                "date",
-                run_date=current_time + timedelta(minutes=50),
-                misfire_grace_time=60,
-                args=[
-                    client_tg_id,
-                    user_id,
-                    10,
-                ],
-                id=f"{order.id}_10min",
+            sup.schedule_order_job(
+                sup.ORDER_JOB_FINISH_TRIP_REMINDER,
+                order.id,
+                current_time + timedelta(minutes=30),
+                f"{order.id}_30min",
+                minutes=30,
+            )
+
+            sup.schedule_order_job(
+                sup.ORDER_JOB_FINISH_TRIP_REMINDER,
+                order.id,
+                current_time + timedelta(minutes=50),
+                f"{order.id}_10min",
+                minutes=10,
             )
 
             msg = await callback.bot.send_message(
@@ -2258,17 +2243,12 @@ async def handler_go_to_new_trip(callback: CallbackQuery, state: FSMContext):
             datetime.strptime(scheduled_time, "%d-%m-%Y %H:%M")
         ) - timedelta(minutes=30)
 
-        scheduler_manager.add_job(
-            sup.scheduled_reminder_finish_trip,
-            "date",
-            run_date=run_date,
-            misfire_grace_time=60,
-            args=[
-                user_id,
-                driver_tg_id,
-                30,
-            ],
-            id=f"{order.id}_30min",
+        sup.schedule_order_job(
+            sup.ORDER_JOB_FINISH_TRIP_REMINDER,
+            order.id,
+            run_date,
+            f"{order.id}_30min",
+            minutes=30,
         )
 
         tz = pytz.timezone("Etc/GMT-7")
@@ -2276,17 +2256,12 @@ async def handler_go_to_new_trip(callback: CallbackQuery, state: FSMContext):
             datetime.strptime(scheduled_time, "%d-%m-%Y %H:%M")
         ) - timedelta(minutes=10)
 
-        scheduler_manager.add_job(
-            sup.scheduled_reminder_finish_trip,
-            "date",
-            run_date=run_date,
-            misfire_grace_time=60,
-            args=[
-                user_id,
-                driver_tg_id,
-                10,
-            ],
-            id=f"{order.id}_10min",
+        sup.schedule_order_job(
+            sup.ORDER_JOB_FINISH_TRIP_REMINDER,
+            order.id,
+            run_date,
+            f"{order.id}_10min",
+            minutes=10,
         )
 
         formatted_time = scheduled_time.split()[1]
@@ -2354,12 +2329,15 @@ async def handler_go_to_new_trip(callback: CallbackQuery, state: FSMContext):
 
 
 @handlers_router.callback_query(F.data == "finish_trip")  # State() для водителя
-async def handler_finish_trip(callback: CallbackQuery, state: FSMContext):
+async def handler_finish_trip(
+    callback: CallbackQuery, state: FSMContext, session: AsyncSession
+):
     """
     Обработчик колбэка для завершения поездки водителем.
 
     Args:
         callback (CallbackQuery): Объект CallbackQuery.
+        session (AsyncSession): Сессия БД текущего апдейта.
 
     Returns:
         None
@@ -2413,11 +2391,13 @@ async def handler_finish_trip(callback: CallbackQuery, state: FSMContext):
 
         current_arrival_time = datetime.now(pytz.timezone("Etc/GMT-7"))
 
-        await rq.set_status_order(client_id, order_id, 11)
+        await rq.set_order_state(
+            client_id, order_id, 11, driver_id, "производится оплата", session=session
+        )
         await rq.set_arrival_time_to_place(
-            order_id, current_arrival_time.strftime("%d-%m-%Y %H:%M")
+            order_id, current_arrival_time.strftime("%d-%m-%Y %H:%M"), session=session
         )
-        await rq.set_order_history(order_id, driver_id, "производится оплата", "-")
+        await session.commit()
 
         await sup.delete_messages_from_chat(user_id, callback.message)
 
@@ -3073,8 +3053,7 @@ async def client_reject(callback: CallbackQuery, state: FSMContext):
         await rq.set_status_driver(driver_tg_id, 1)
         await rq.set_status_order(client_id, order_id, 3)
 
-        await sup.delete_messages_from_chat(driver_tg_id, callback.message)
-        await sup.delete_messages_from_chat(user_id, callback.message)
+        await sup.delete_messages_from_chats([driver_tg_id, user_id], callback.message)
 
         current_order = await rq.get_current_order(order_id, identifier_type="order_id")
         await rq.delete_current_order(current_order.order_id)
@@ -3195,7 +3174,13 @@ async def reject_answer(message: Message, state: FSMContext):
             text=order_info,
             reply_markup=kb.group_message_button,
         )
-        await rq.set_message(int(group_chat_id), msg.message_id, msg.text)
+        await rq.set_message(
+            int(group_chat_id),
+            msg.message_id,
+            msg.text,
+            order_id,
+            rq.MESSAGE_KIND_GROUP_ORDER,
+        )
 
         msg = await message.answer(
             text='🚫Водитель отменен!\nОжидайте нового водителя или отмените заказ перейдя в "Ваши текущие заказы".',
@@ -3216,12 +3201,15 @@ async def reject_answer(message: Message, state: FSMContext):
 
 
 @handlers_router.callback_query(F.data == "reject_order")
-async def reject_order(callback: CallbackQuery, state: FSMContext):
+async def reject_order(
+    callback: CallbackQuery, state: FSMContext, session: AsyncSession
+):
     """
     Обработчик колбэка для отклонения заказа водителем.
 
     Args:
         callback (CallbackQuery): Объект CallbackQuery.
+        session (AsyncSession): Сессия БД текущего апдейта.
 
     Returns:
         None
@@ -3231,8 +3219,6 @@ async def reject_order(callback: CallbackQuery, state: FSMContext):
         return
 
     try:
-        await rq.set_status_driver(user_id, 1)
-
         order_id = await sup.extract_order_number(callback.message.text)
         if order_id is None:
             logger.error(
@@ -3240,29 +3226,35 @@ async def reject_order(callback: CallbackQuery, state: FSMContext):
             )
             return
 
-        client_id = await rq.get_client_by_order(order_id)
-        if client_id is None:
+        context = await rq.get_order_context(order_id, user_id, session=session)
+        if context is None:
             logger.error(
-                f"Не удалось получить ID клиента для заказа {order_id} <reject_order>"
+                f"Не удалось получить информацию о заказе по ID {order_id} для пользователя {user_id} <reject_order>"
             )
             return
 
-        user_client = await rq.get_user_by_client_id(client_id)
-        if user_client is None:
-            logger.error(
-                f"Не удалось получить пользователя клиента для клиента {client_id} <reject_order>"
-            )
+        if context.order.status_id != 13:
+            # Отказ от предложения заказа: заказ остается у распределения
+            await order_dispatcher.decline(order_id, user_id)
+            await callback.message.delete()
+            await rq.delete_order_messages_from_db(user_id, order_id)
+            await callback.answer(f"Вы отказались от заказа №{order_id}")
             return
 
-        driver_id = await rq.get_latest_driver_id_by_order_id(order_id)
+        await rq.set_status_driver(user_id, 1, session=session)
+
+        client_id = context.client_id
+        driver_id = context.driver_id
         if driver_id is None:
             logger.error(
                 f"Не удалось получить ID водителя для заказа {order_id} <reject_order>"
             )
             return
 
-        await rq.set_status_order(client_id, order_id, 3)
-        await rq.set_order_history(order_id, driver_id, "отклонен водителем", "-")
+        await rq.set_order_state(
+            client_id, order_id, 3, driver_id, "отклонен водителем", session=session
+        )
+        await session.commit()
 
         group_chat_id = os.getenv("GROUP_CHAT_ID")
         if not group_chat_id:
@@ -3271,26 +3263,17 @@ async def reject_order(callback: CallbackQuery, state: FSMContext):
             )
             return
 
-        msg_id = await rq.get_message_id_by_text(f"Заказ №{order_id} на рассмотрении")
+        msg_id = await rq.get_order_message_id(
+            group_chat_id, order_id, [rq.MESSAGE_KIND_GROUP_REVIEW]
+        )
         if msg_id != None:
             await callback.message.bot.delete_message(
                 chat_id=group_chat_id, message_id=msg_id
             )
-            await rq.delete_certain_message_from_db(msg_id)
+            await rq.delete_order_messages_from_db(group_chat_id, order_id)
 
-        order = await rq.get_order_by_id(order_id)
-        if order is None:
-            logger.error(
-                f"Не удалось получить информацию о заказе по ID {order_id} для пользователя {user_id} <reject_order>"
-            )
-            return
-
-        rate_id = await rq.check_rate(user_id, order_id)
-        if rate_id is None:
-            logger.error(
-                f"Не удалось получить ID тарифа для пользователя {user_id} и заказа {order_id} <reject_order>"
-            )
-            return
+        order = context.order
+        rate_id = context.rate_id
 
         order_info = await sup.get_order_info(rate_id, order)
         if order_info is None:
@@ -3305,7 +3288,13 @@ async def reject_order(callback: CallbackQuery, state: FSMContext):
             text=order_info,
             reply_markup=kb.group_message_button,
         )
-        await rq.set_message(int(group_chat_id), msg.message_id, msg.text)
+        await rq.set_message(
+            int(group_chat_id),
+            msg.message_id,
+            msg.text,
+            order_id,
+            rq.MESSAGE_KIND_GROUP_ORDER,
+        )
 
         await sup.delete_messages_from_chat(user_id, callback.message)
 
@@ -3316,10 +3305,10 @@ async def reject_order(callback: CallbackQuery, state: FSMContext):
         await rq.set_message(user_id, msg.message_id, msg.text)
 
         msg = await callback.message.bot.send_message(
-            chat_id=user_client.tg_id,
+            chat_id=context.client_tg_id,
             text="🚫Водитель отказался от заказа\nСкоро найдется новый🔎",
         )
-        await rq.set_message(user_client.tg_id, msg.message_id, msg.text)
+        await rq.set_message(context.client_tg_id, msg.message_id, msg.text)
 
     except Exception as e:
         logger.error(f"Ошибка в функции reject_order для пользователя {user_id}: {e}")
@@ -3703,6 +3692,17 @@ async def local_point(message: Message, state: FSMContext):
                 await rq.set_message(user_id, msg.message_id, msg.text)
                 return
 
+            if not service_area.check(s_c):
+                logger.warning(
+                    f"Точка {s_c} вне зоны обслуживания для пользователя {user_id} <local_point>"
+                )
+                msg = await message.answer(
+                    um.out_of_service_area_text(),
+                    reply_markup=kb.cancel_button,
+                )
+                await rq.set_message(user_id, msg.message_id, msg.text)
+                return
+
             await state.update_data(location_point=corrected_address)
             await state.update_data(start_coords=s_c)
 
@@ -3744,6 +3744,17 @@ async def local_point(message: Message, state: FSMContext):
                 "longitude": user_location.longitude,
             }
             await rq.set_message(user_id, message.message_id, text_for_message)
+            if not service_area.check(locale):
+                logger.warning(
+                    f"Точка {locale['latitude']},{locale['longitude']} вне зоны обслуживания для пользователя {user_id} <local_point>"
+                )
+                msg = await message.answer(
+                    um.out_of_service_area_text(),
+                    reply_markup=kb.cancel_button,
+                )
+                await rq.set_message(user_id, msg.message_id, msg.text)
+                return
+
             await state.update_data(location_point=locale)
 
             corrected_address = await sup.get_address(locale)
@@ -3804,8 +3815,8 @@ async def reg_tow(message: Message, state: FSMContext):
         return
 
     try:
+        text_for_message = "location"
         if message.text:
-            text_for_message = "location"
             if message.text == um.button_cancel_text():
                 await rq.set_message(user_id, message.message_id, message.text)
 
@@ -3838,6 +3849,17 @@ async def reg_tow(message: Message, state: FSMContext):
                     await rq.set_message(user_id, msg.message_id, msg.text)
                     return
 
+                if not service_area.check(e_c):
+                    logger.warning(
+                        f"Точка {e_c} вне зоны обслуживания для пользователя {user_id} <reg_tow>"
+                    )
+                    msg = await message.answer(
+                        um.out_of_service_area_text(),
+                        reply_markup=kb.cancel_button,
+                    )
+                    await rq.set_message(user_id, msg.message_id, msg.text)
+                    return
+
                 await state.update_data(destination_point=corrected_address)
                 await state.update_data(end_coords=e_c)
                 await sup.delete_messages_from_chat(user_id, message)
@@ -3852,6 +3874,17 @@ async def reg_tow(message: Message, state: FSMContext):
                 "longitude": user_location_end.longitude,
             }
             await rq.set_message(user_id, message.message_id, text_for_message)
+            if not service_area.check(locale_end):
+                logger.warning(
+                    f"Точка {locale_end['latitude']},{locale_end['longitude']} вне зоны обслуживания для пользователя {user_id} <reg_tow>"
+                )
+                msg = await message.answer(
+                    um.out_of_service_area_text(),
+                    reply_markup=kb.cancel_button,
+                )
+                await rq.set_message(user_id, msg.message_id, msg.text)
+                return
+
             await state.update_data(destination_point=locale_end)
 
             address_end = await sup.get_address(locale_end)
@@ -3920,6 +3953,14 @@ async def handler_confirm_start(callback: CallbackQuery, state: FSMContext):
             await rq.set_message(user_id, msg.message_id, msg.text)
             return
 
+        if not service_area.check(s_c):
+            logger.warning(
+                f"Точка {s_c} вне зоны обслуживания для пользователя {user_id} <handler_confirm_start>"
+            )
+            msg = await callback.message.answer(um.out_of_service_area_text())
+            await rq.set_message(user_id, msg.message_id, msg.text)
+            return
+
         await state.update_data(location_point=corrected_address)
         await state.update_data(start_coords=s_c)
 
@@ -3997,6 +4038,14 @@ async def handler_confirm_end(callback: CallbackQuery, state: FSMContext):
             await rq.set_message(user_id, msg.message_id, msg.text)
             return
 
+        if not service_area.check(e_c):
+            logger.warning(
+                f"Точка {e_c} вне зоны обслуживания для пользователя {user_id} <handler_confirm_end>"
+            )
+            msg = await callback.message.answer(um.out_of_service_area_text())
+            await rq.set_message(user_id, msg.message_id, msg.text)
+            return
+
         await state.update_data(destination_point=corrected_address)
         await state.update_data(end_coords=e_c)
 
@@ -4035,6 +4084,25 @@ async def trip_info(user_id: int, message: Message, state: FSMContext):
     decition = data.get("drive_decition")
     location_start = data.get("location_point")
     location_end = data.get("destination_point")
+    pre_quote_msg = None
+
+    async def show_error(text: str) -> None:
+        # Предварительная оценка не должна остаться в чате после ошибки
+        if pre_quote_msg is not None:
+            try:
+                await pre_quote_msg.edit_text(text)
+                return
+            except Exception:
+                try:
+                    await pre_quote_msg.delete()
+                    await rq.delete_certain_message_from_db(pre_quote_msg.message_id)
+                except Exception as e:
+                    logger.warning(
+                        f"Не удалось удалить предварительную оценку для пользователя {user_id}: {e} <trip_info>"
+                    )
+        msg = await message.answer(text)
+        await rq.set_message(user_id, msg.message_id, msg.text)
+
     try:
         if decition == "drive":
             await state.update_data(drive_decition="-")
@@ -4047,10 +4115,22 @@ async def trip_info(user_id: int, message: Message, state: FSMContext):
 
         start_coords = data.get("start_coords")
         end_coords = data.get("end_coords")
+
+        # Пока строится точный маршрут, показываем предварительную оценку
+        if route_cache.peek(start_coords, end_coords) is None:
+            estimate = sup.estimate_route(start_coords, end_coords)
+            if estimate is not None:
+                pre_quote_msg = await message.answer(
+                    f"📍Откуда: {location_start}\n📍Куда: {location_end}\n\n⏳Рассчитываем маршрут...\n📍Примерная длина пути: {estimate[0]}\n🕑Примерное время в пути: {estimate[1]}\n💰Примерная стоимость: {estimate[2]} рублей"
+                )
+                await rq.set_message(
+                    user_id, pre_quote_msg.message_id, pre_quote_msg.text
+                )
+
         result = await sup.send_route(start_coords, end_coords)
         # Проверяем, что результат не None
         if result is None:
-            await message.answer("Не удалось получить информацию о маршруте.")
+            await show_error("Не удалось получить информацию о маршруте.")
             return
 
         total_distance, total_time, price = result
@@ -4061,29 +4141,37 @@ async def trip_info(user_id: int, message: Message, state: FSMContext):
             logger.error(
                 f"Ошибка при получении информации о маршруте для пользователя {user_id} <trip_info>"
             )
-            msg = await message.answer(
-                "Ошибка при получении информации о маршруте. Попробуйте сделать заказ снова.",
+            await show_error(
+                "Ошибка при получении информации о маршруте. Попробуйте сделать заказ снова."
             )
-            await rq.set_message(user_id, msg.message_id, msg.text)
             return
 
         await state.update_data(distance=total_distance)
         await state.update_data(trip_time=total_time)
         await state.update_data(price=price)
 
-        msg = await message.answer(
-            f"🗓Когда: {submission_time}\n📍Откуда: {location_start}\n📍Куда: {location_end}\n\n📍Общая длина пути: {total_distance}\n🕑Время в пути: {total_time}\n💰Стоимость: {price} рублей",
-            reply_markup=kb.confirm_start_button_for_client,
-        )
-        await rq.set_message(user_id, msg.message_id, msg.text)
+        trip_text = f"🗓Когда: {submission_time}\n📍Откуда: {location_start}\n📍Куда: {location_end}\n\n📍Общая длина пути: {total_distance}\n🕑Время в пути: {total_time}\n💰Стоимость: {price} рублей"
+        if getattr(result, "is_estimate", False):
+            trip_text += "\n\n⚠️Расчет приблизительный: сервис маршрутов недоступен"
+
+        if pre_quote_msg is not None:
+            # Заменяем предварительную оценку точным расчетом
+            await pre_quote_msg.edit_text(
+                trip_text, reply_markup=kb.confirm_start_button_for_client
+            )
+        else:
+            msg = await message.answer(
+                trip_text,
+                reply_markup=kb.confirm_start_button_for_client,
+            )
+            await rq.set_message(user_id, msg.message_id, msg.text)
 
     except Exception as e:
         await state.clear()
         logger.error(f"Ошибка в функции trip_info для пользователя {user_id}: {e}")
-        msg = await message.answer(
-            "Произошла ошибка при обработке вашего местоположения. Пожалуйста, попробуйте сделать заказ снова.",
+        await show_error(
+            "Произошла ошибка при обработке вашего местоположения. Пожалуйста, попробуйте сделать заказ снова."
         )
-        await rq.set_message(user_id, msg.message_id, msg.text)
 
 
 @handlers_router.callback_query(F.data == "accept_confirm_start")
@@ -4185,6 +4273,7 @@ async def confirmation_order(message: Message, state: FSMContext):
                     user_comment,
                     3,
                     5,
+                    start_point=parse_coord(start_coords),
                 )
             else:
                 await rq.set_order(
@@ -4200,6 +4289,7 @@ async def confirmation_order(message: Message, state: FSMContext):
                     user_comment,
                     3,
                     2,
+                    start_point=parse_coord(start_coords),
                 )
         else:
             address_end = data.get("destination_point")
@@ -4225,6 +4315,8 @@ async def confirmation_order(message: Message, state: FSMContext):
                     user_comment,
                     3,
                     4,
+                    start_point=parse_coord(start_coords),
+                    finish_point=parse_coord(end_coords),
                 )
             else:
                 await rq.set_order(
@@ -4240,6 +4332,8 @@ async def confirmation_order(message: Message, state: FSMContext):
                     user_comment,
                     3,
                     1,
+                    start_point=parse_coord(start_coords),
+                    finish_point=parse_coord(end_coords),
                 )
 
         order = await rq.get_last_order_by_client_id(client_id)
@@ -4278,26 +4372,24 @@ async def confirmation_order(message: Message, state: FSMContext):
             await state.clear()
             return
 
-        msg = await message.bot.send_message(
-            chat_id=group_chat_id,
-            text=order_info,
-            reply_markup=kb.group_message_button,
-        )
-        await rq.set_message(int(group_chat_id), msg.message_id, msg.text)
-
-        scheduler_manager.add_job(
-            sup.scheduled_delete_message_in_group,
-            "date",
-            run_date=datetime.now(pytz.timezone("Etc/GMT-7")) + timedelta(minutes=30),
-            misfire_grace_time=60,
-            args=[
+        if order_dispatcher.handles(rate_id):
+            # Заказ предлагается ближайшим водителям, в группу — если не примут
+            await order_dispatcher.start(order.id, rate_id, start_coords, order_info)
+        else:
+            msg = await message.bot.send_message(
+                chat_id=group_chat_id,
+                text=order_info,
+                reply_markup=kb.group_message_button,
+            )
+            await rq.set_message(
+                int(group_chat_id),
+                msg.message_id,
+                msg.text,
                 order.id,
-                group_chat_id,
-                user_id,
-                client_id,
-            ],
-            id=str(order.id),
-        )
+                rq.MESSAGE_KIND_GROUP_ORDER,
+            )
+
+        await sup.schedule_order_timeout(order.id, group_chat_id, user_id, client_id)
 
         msg = await message.answer(
             f'✅Ваш заказ №{order.id} сформирован!\nОжидайте уведомления.\n\nДля отмены заказа можете перейти в "Ваши текущие заказы"',
@@ -4318,10 +4410,7 @@ async def confirmation_order(message: Message, state: FSMContext):
 
 
 async def job_remover(order_id: int):
-    try:
-        scheduler_manager.remove_job(str(order_id))
-    except JobLookupError as e:
-        logger.error(f"Задание с ID {str(order_id)} не найдено: {e} <job_remover>")
+    await sup.cancel_order_timeout(int(order_id))
 
 
 @handlers_router.callback_query(F.data.startswith("cancel_order_"))
@@ -4396,12 +4485,14 @@ async def origin_client_cancel_order(callback: CallbackQuery, state: FSMContext)
 
             await job_remover(order_id)
 
-            msg_id = await rq.get_message_id_by_text(order_info)
+            msg_id = await rq.get_order_message_id(
+                group_chat_id, order_id, [rq.MESSAGE_KIND_GROUP_ORDER]
+            )
             if msg_id != None:
                 await callback.message.bot.delete_message(
                     chat_id=group_chat_id, message_id=msg_id
                 )
-                await rq.delete_certain_message_from_db(msg_id)
+                await rq.delete_order_messages_from_db(group_chat_id, order_id)
 
             msg = await callback.message.answer(
                 um.reject_client_comment_text(order_id),
@@ -4431,14 +4522,14 @@ async def origin_client_cancel_order(callback: CallbackQuery, state: FSMContext)
             await sup.delete_messages_from_chat(user_driver.tg_id, callback.message)
             await job_remover(order_id)
 
-            msg_id = await rq.get_message_id_by_text(
-                f"Заказ №{order_id} на рассмотрении"
+            msg_id = await rq.get_order_message_id(
+                group_chat_id, order_id, [rq.MESSAGE_KIND_GROUP_REVIEW]
             )
             if msg_id != None:
                 await callback.message.bot.delete_message(
                     chat_id=group_chat_id, message_id=msg_id
                 )
-                await rq.delete_certain_message_from_db(msg_id)
+                await rq.delete_order_messages_from_db(group_chat_id, order_id)
 
             msg = await callback.bot.send_message(
                 chat_id=user_driver.tg_id,
@@ -4606,21 +4697,19 @@ async def origin_client_cancel_order(callback: CallbackQuery, state: FSMContext)
                     text=order_info,
                     reply_markup=kb.group_message_button,
                 )
-                await rq.set_message(int(group_chat_id), msg.message_id, msg.text)
-
-                scheduler_manager.add_job(
-                    sup.scheduled_delete_message_in_group,
-                    "date",
-                    run_date=datetime.now(pytz.timezone("Etc/GMT-7"))
-                    + timedelta(minutes=30),
-                    misfire_grace_time=60,
-                    args=[
-                        order.id,
-                        group_chat_id,
-                        current_order.client_tg_id,
-                        current_order.client_id,
-                    ],
-                    id=str(order.id),
+                await rq.set_message(
+                    int(group_chat_id),
+                    msg.message_id,
+                    msg.text,
+                    order_id,
+                    rq.MESSAGE_KIND_GROUP_ORDER,
+                )
+
+                await sup.schedule_order_timeout(
+                    order.id,
+                    group_chat_id,
+                    current_order.client_tg_id,
+                    current_order.client_id,
                 )
 
                 msg = await callback.message.answer(
@@ -5469,3 +5558,26 @@ async def handler_name_referral_link(message: Message, state: FSMContext):
             text=um.common_error_message(),
         )
         await rq.set_message(user_id, msg.message_id, msg.text)
+
+
+@handlers_router.edited_message(F.chat.type == "private", F.location.live_period)
+async def handler_live_location(message: Message):
+    """
+    Обработчик обновлений трансляции геопозиции.
+
+    Обновляет позицию водителя "на линии" в индексе ближайших водителей.
+    Принимаются только трансляции (live_period) в личном чате с ботом:
+    обычные геопозиции и сообщения групп не проверяются в Redis.
+
+    Args:
+        message (Message): Объект Message с обновленной геопозицией.
+
+    Returns:
+        None
+    """
+    await driver_index.update_position(
+        message.from_user.id,
+        message.location.latitude,
+        message.location.longitude,
+        only_if_online=True,
+    )
@@ -0,0 +1,310 @@
+import io
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+
+import numpy as np
+import pytz
+from redis.asyncio import Redis
+
+from app import support as sup
+from app.database import requests as rq
+from app.geo import Coord, geohash_area, geohash_bounds
+
+logger = logging.getLogger(__name__)
+
+HOURS_IN_WEEK = 7 * 24
+
+
+def hour_of_week(moment: datetime) -> int:
+    return moment.weekday() * 24 + moment.hour
+
+
+class DemandHeatmap:
+    """
+    Тепловая карта спроса: число заказов по ячейкам геохеша и часам недели.
+
+    Счетчики хранятся в массиве формы (ячейки, 168), ячейка ищется по словарю
+    геохеш -> строка, поэтому ответ «горячие зоны рядом» не обращается к БД
+    и не зависит от объема истории. Обновление инкрементальное: с прошлого
+    запуска досчитываются только заказы с большим id. Снимок (npz) хранится
+    в Redis и загружается при старте, чтобы не пересчитывать всю историю.
+    Досчет выполняет лидер планировщика; остальные экземпляры раз
+    в sync_interval секунд сверяют версию снимка и загружают новый.
+    Заказы без геохеша (до миграции 3) учитываются только после
+    backfill-coords, выполненного до первого запуска.
+    """
+
+    def __init__(
+        self,
+        redis_url: str = "redis://localhost:6379/0",
+        precision: int = 6,
+        ring: int = 2,
+        # v2: снимки v1 пропустили заказы "В ближайшее время", пересчитываем
+        snapshot_key: str = "heatmap:demand:v2",
+        batch_size: int = 50_000,
+        sync_interval: float = 60.0,
+        history_grace: float = 600.0,
+    ):
+        self.redis_url = redis_url
+        self.precision = precision  # Ячейка около 1,2 x 0,6 км
+        self.ring = ring  # Сколько соседних ячеек смотреть в каждую сторону
+        self.snapshot_key = snapshot_key
+        self.batch_size = batch_size
+        self.sync_interval = sync_interval
+        self.version_key = f"{snapshot_key}:version"
+        self.version = 0  # Версия загруженного или сохраненного снимка
+        self._sync_task: asyncio.Task | None = None
+        # Сколько ждать записи истории заказа "В ближайшее время", секунд
+        self.history_grace = history_grace
+        self._waiting: tuple[int, float] | None = None  # (ID заказа, с какого времени)
+        self.logger = logger
+        self._redis: Redis | None = None
+        self._rows: dict[str, int] = {}
+        self._cells: list[str] = []
+        self.counts = np.zeros((0, HOURS_IN_WEEK), dtype=np.uint32)
+        self.last_order_id = 0
+        self.first_at = 0.0  # Время подачи самого раннего учтенного заказа
+        self.last_at = 0.0
+
+    def _get_redis(self) -> Redis:
+        if self._redis is None:
+            self._redis = Redis.from_url(self.redis_url)
+        return self._redis
+
+    def _weeks(self) -> float:
+        return max(1.0, (self.last_at - self.first_at) / (HOURS_IN_WEEK * 3600))
+
+    def add(self, orders: list[tuple[int, str, str, str | None]]) -> int:
+        """
+        Добавляет заказы (id, геохеш, время подачи, время создания) в счетчики.
+
+        Предзаказ учитывается по времени подачи (год определяется по времени
+        создания), заказ "В ближайшее время" — по времени создания. Заказ,
+        для которого еще нет записи истории, и все следующие за ним ждут
+        следующего обновления: last_order_id сдвигается только
+        за обработанные заказы. Историю ждут не дольше history_grace секунд
+        (при ошибке оформления ее может не быть вовсе), затем заказ
+        пропускается.
+
+        Returns:
+            Число учтенных заказов.
+        """
+        timezone = pytz.timezone("Etc/GMT-7")
+        now = datetime.now(timezone)
+        rows, hours, stamps = [], [], []
+        for order_id, geohash, submission_time, created_at in orders:
+            try:
+                created = timezone.localize(
+                    datetime.strptime(created_at, "%d-%m-%Y %H:%M")
+                )
+            except (TypeError, ValueError):
+                created = None
+            # Год подачи ищется рядом с временем создания заказа: от текущего
+            # времени старые предзаказы попали бы в другой год и день недели
+            moment = sup.parse_submission_time(submission_time, created or now)
+            if moment is None:
+                if created_at is None and self._wait_for_history(order_id):
+                    break  # История заказа еще не записана
+                if created is None:
+                    self.last_order_id = max(self.last_order_id, order_id)
+                    continue  # Время не восстановить: заказ пропускается
+                moment = created
+            self.last_order_id = max(self.last_order_id, order_id)
+
+            cell = geohash[: self.precision]
+            row = self._rows.get(cell)
+            if row is None:
+                row = self._rows[cell] = len(self._cells)
+                self._cells.append(cell)
+            rows.append(row)
+            hours.append(hour_of_week(moment))
+            stamps.append(moment.timestamp())
+
+        if not rows:
+            return 0
+
+        if len(self._cells) > self.counts.shape[0]:
+            grown = np.zeros((len(self._cells), HOURS_IN_WEEK), dtype=np.uint32)
+            grown[: self.counts.shape[0]] = self.counts
+            self.counts = grown
+        np.add.at(self.counts, (np.array(rows), np.array(hours)), 1)
+
+        earliest = min(stamps)
+        self.first_at = min(self.first_at, earliest) if self.first_at else earliest
+        self.last_at = max(self.last_at, max(stamps))
+        return len(rows)
+
+    def _wait_for_history(self, order_id: int) -> bool:
+        """
+        Returns:
+            True, пока история заказа ожидается не дольше history_grace.
+        """
+        now = time.monotonic()
+        if self._waiting is None or self._waiting[0] != order_id:
+            self._waiting = (order_id, now)
+        if now - self._waiting[1] < self.history_grace:
+            return True
+
+        self._waiting = None
+        self.logger.warning(
+            f"Заказ №{order_id} без записи истории пропущен <_wait_for_history>"
+        )
+        return False
+
+    async def refresh(self) -> int:
+        """
+        Досчитывает заказы, появившиеся после прошлого обновления,
+        и сохраняет снимок.
+
+        Returns:
+            Число учтенных заказов.
+        """
+        added = 0
+        while True:
+            orders = await rq.get_order_demand_since(
+                self.last_order_id, self.batch_size
+            )
+            added += self.add(orders)
+            if len(orders) < self.batch_size or self.last_order_id < orders[-1][0]:
+                break
+
+        if added:
+            await self.save()
+        return added
+
+    def hot_zones(
+        self, point: Coord, moment: datetime | None = None, limit: int = 3
+    ) -> list[tuple[Coord, float]]:
+        """
+        Горячие зоны рядом с точкой на текущий час недели (с соседними часами).
+
+        Returns:
+            Список (центр ячейки, среднее число заказов за час в неделю)
+            по убыванию спроса.
+        """
+        if moment is None:
+            moment = datetime.now(pytz.timezone("Etc/GMT-7"))
+        hour = hour_of_week(moment)
+        columns = [(hour + shift) % HOURS_IN_WEEK for shift in (-1, 0, 1)]
+
+        cells = [
+            (cell, self._rows[cell])
+            for cell in geohash_area(point, self.precision, self.ring)
+            if cell in self._rows
+        ]
+        if not cells:
+            return []
+
+        demand = self.counts[np.ix_([row for _, row in cells], columns)].sum(axis=1)
+        demand = demand / (len(columns) * self._weeks())
+
+        zones = []
+        for index in np.argsort(-demand)[:limit]:
+            if demand[index] <= 0:
+                break
+            south, west, north, east = geohash_bounds(cells[index][0])
+            center = Coord(round((south + north) / 2, 5), round((west + east) / 2, 5))
+            zones.append((center, float(demand[index])))
+        return zones
+
+    async def save(self) -> None:
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            cells=np.array(self._cells, dtype=f"<U{self.precision}"),
+            counts=self.counts,
+            meta=np.array([self.last_order_id, self.first_at, self.last_at]),
+        )
+        try:
+            async with self._get_redis().pipeline(transaction=True) as pipe:
+                pipe.set(self.snapshot_key, buffer.getvalue())
+                pipe.incr(self.version_key)
+                _, self.version = await pipe.execute()
+        except Exception as e:
+            self.logger.error(f"Не удалось сохранить снимок тепловой карты: {e} <save>")
+
+    async def load(self) -> bool:
+        """
+        Загружает снимок из Redis.
+
+        Returns:
+            True, если снимок найден и загружен.
+        """
+        try:
+            async with self._get_redis().pipeline(transaction=True) as pipe:
+                pipe.get(self.snapshot_key)
+                pipe.get(self.version_key)
+                blob, version = await pipe.execute()
+            if blob is None:
+                return False
+
+            with np.load(io.BytesIO(blob), allow_pickle=False) as snapshot:
+                cells = [str(cell) for cell in snapshot["cells"]]
+                counts = snapshot["counts"].astype(np.uint32)
+                last_order_id, first_at, last_at = snapshot["meta"].tolist()
+        except Exception as e:
+            self.logger.error(f"Не удалось загрузить снимок тепловой карты: {e} <load>")
+            return False
+
+        if cells and len(cells[0]) != self.precision:
+            return False  # Сменилась точность — пересчитываем заново
+
+        self._cells = cells
+        self._rows = {cell: row for row, cell in enumerate(cells)}
+        self.counts = counts
+        self.last_order_id = int(last_order_id)
+        self.first_at, self.last_at = first_at, last_at
+        self.version = int(version or 0)
+        return True
+
+    async def start(self) -> None:
+        """
+        Загружает снимок и запускает фоновую сверку его версии.
+        """
+        await self.load()
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self._sync(), name="heatmap-sync")
+
+    async def stop(self) -> None:
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            try:
+                await self._sync_task
+            except asyncio.CancelledError:
+                pass
+            self._sync_task = None
+
+    async def _sync(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                version = int(await self._get_redis().get(self.version_key) or 0)
+                if version != self.version:
+                    await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Ошибка сверки снимка тепловой карты: {e} <_sync>")
+
+
+demand_heatmap = DemandHeatmap(
+    redis_url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+    precision=int(os.getenv("HEATMAP_GEOHASH_PRECISION", "6")),
+    ring=int(os.getenv("HEATMAP_RING", "2")),
+    sync_interval=float(os.getenv("HEATMAP_SYNC_INTERVAL_SECONDS", "60")),
+    history_grace=float(os.getenv("HEATMAP_HISTORY_GRACE_SECONDS", "600")),
+)
+
+
+async def scheduled_refresh_heatmap() -> None:
+    try:
+        added = await demand_heatmap.refresh()
+        if added:
+            logger.info(
+                f"Тепловая карта спроса обновлена: +{added} заказов <scheduled_refresh_heatmap>"
+            )
+    except Exception as e:
+        logger.error(f"Ошибка: {e} <scheduled_refresh_heatmap>", exc_info=True)
@@ -0,0 +1,226 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Any
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы задержек, мс (последняя корзина — все, что больше)
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+@dataclass(frozen=True, slots=True)
+class EndpointPolicy:
+    timeout: float  # Таймаут одной попытки, с
+    budget: float  # Общий бюджет на запрос со всеми повторами, с
+    retries: int = 2  # Количество повторов после первой попытки
+    backoff: float = 0.2  # Базовая пауза перед повтором, с
+    hedge_after: float | None = None  # Через сколько секунд отправить дубль запроса
+
+
+@dataclass(slots=True)
+class HttpResponse:
+    status: int
+    data: Any = None  # Разобранный JSON при статусе 200
+
+
+ENDPOINT_POLICIES = {
+    "dadata_geolocate": EndpointPolicy(timeout=2.0, budget=5.0, hedge_after=0.8),
+    # Платный запрос стандартизации: без дублирования
+    "dadata_clean": EndpointPolicy(timeout=3.0, budget=7.0),
+    "graphhopper_route": EndpointPolicy(timeout=4.0, budget=9.0, hedge_after=1.5),
+    # Матрица расходует кредиты за каждую пару точек: без дублирования
+    "graphhopper_matrix": EndpointPolicy(timeout=4.0, budget=8.0, retries=1),
+}
+
+DEFAULT_POLICY = EndpointPolicy(timeout=5.0, budget=10.0)
+
+
+class LatencyHistogram:
+    __slots__ = ("counts", "total", "sum_ms", "errors")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.errors = 0
+
+    def observe(self, elapsed_ms: float) -> None:
+        self.counts[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.total += 1
+        self.sum_ms += elapsed_ms
+
+    def percentile(self, q: float) -> float:
+        # Верхняя граница корзины, в которую попадает q-й процентиль
+        if not self.total:
+            return 0.0
+        threshold = q * self.total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= threshold:
+                if index < len(LATENCY_BUCKETS_MS):
+                    return float(LATENCY_BUCKETS_MS[index])
+                return float("inf")
+        return float("inf")
+
+
+class HttpClient:
+    """
+    Общий HTTP-клиент для внешних API (DaData, GraphHopper) на время жизни бота.
+
+    Держит пул keep-alive соединений, применяет к каждому эндпоинту
+    таймаут попытки и общий бюджет времени, повторяет запрос с джиттером
+    при сетевых ошибках и статусах 429/5xx, может отправить дублирующий
+    запрос, если первый отвечает дольше hedge_after, и ведет гистограммы
+    задержек по эндпоинтам.
+    """
+
+    def __init__(self, pool_size: int = 100, keepalive_timeout: float = 60.0):
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.logger = logger
+        self.histograms: dict[str, LatencyHistogram] = {}
+        self._session: aiohttp.ClientSession | None = None
+
+    async def start(self) -> None:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            self.logger.info("HTTP-клиент внешних API запущен")
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            self.logger.info(f"HTTP-клиент остановлен. {self.stats_text()}")
+        self._session = None
+
+    async def request(
+        self, endpoint: str, method: str, url: str, **kwargs
+    ) -> HttpResponse:
+        """
+        Выполняет запрос к эндпоинту по его политике.
+
+        Raises:
+            aiohttp.ClientError, asyncio.TimeoutError: если все попытки
+            в пределах бюджета завершились ошибкой.
+        """
+        if self._session is None or self._session.closed:
+            await self.start()
+
+        policy = ENDPOINT_POLICIES.get(endpoint, DEFAULT_POLICY)
+        deadline = time.monotonic() + policy.budget
+        attempt = 0
+
+        while True:
+            remaining = deadline - time.monotonic()
+            timeout = min(policy.timeout, remaining)
+            try:
+                response = await self._hedged(
+                    endpoint, policy, method, url, timeout, kwargs
+                )
+                if response.status not in RETRY_STATUSES:
+                    return response
+                error = None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                response, error = None, e
+
+            attempt += 1
+            # Полный джиттер: пауза случайна в пределах экспоненциального окна
+            delay = random.uniform(0, policy.backoff * 2 ** (attempt - 1))
+            if attempt > policy.retries or time.monotonic() + delay + 0.05 >= deadline:
+                if error is not None:
+                    raise error
+                return response
+
+            self.logger.warning(
+                f"Повтор {attempt} запроса {endpoint}: "
+                f"{error or f'статус {response.status}'} <HttpClient.request>"
+            )
+            await asyncio.sleep(delay)
+
+    async def _hedged(
+        self,
+        endpoint: str,
+        policy: EndpointPolicy,
+        method: str,
+        url: str,
+        timeout: float,
+        kwargs: dict,
+    ) -> HttpResponse:
+        first = asyncio.create_task(
+            self._attempt(endpoint, method, url, timeout, kwargs)
+        )
+        if policy.hedge_after is None or policy.hedge_after >= timeout:
+            return await first
+
+        done, _ = await asyncio.wait({first}, timeout=policy.hedge_after)
+        if done:
+            return first.result()
+
+        second = asyncio.create_task(
+            self._attempt(endpoint, method, url, timeout - policy.hedge_after, kwargs)
+        )
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            # Обе попытки завершились ошибкой
+            raise first.exception() or second.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _attempt(
+        self, endpoint: str, method: str, url: str, timeout: float, kwargs: dict
+    ) -> HttpResponse:
+        histogram = self.histograms.setdefault(endpoint, LatencyHistogram())
+        started = time.perf_counter()
+        try:
+            async with self._session.request(
+                method,
+                url,
+                timeout=aiohttp.ClientTimeout(total=timeout),
+                **kwargs,
+            ) as response:
+                data = await response.json() if response.status == 200 else None
+                histogram.observe((time.perf_counter() - started) * 1000)
+                return HttpResponse(status=response.status, data=data)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            histogram.errors += 1
+            raise
+
+    def stats_text(self) -> str:
+        lines = []
+        for endpoint, histogram in self.histograms.items():
+            average = histogram.sum_ms / histogram.total if histogram.total else 0.0
+            lines.append(
+                f"{endpoint}: запросов {histogram.total}, ошибок {histogram.errors}, "
+                f"среднее {average:.0f} мс, p50 <= {histogram.percentile(0.5):.0f} мс, "
+                f"p95 <= {histogram.percentile(0.95):.0f} мс"
+            )
+        return "; ".join(lines) or "запросов не было"
+
+
+http_client = HttpClient(
+    pool_size=int(os.getenv("HTTP_POOL_SIZE", "100")),
+)
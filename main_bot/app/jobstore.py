@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import itertools
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+from apscheduler.job import Job
+from apscheduler.jobstores.base import BaseJobStore, ConflictingIdError, JobLookupError
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+
+logger = logging.getLogger(__name__)
+
+
+def _detach(job: Job) -> Job:
+    """Копия задачи для записи в фоне: планировщик может менять оригинал."""
+    copy = Job.__new__(Job)
+    copy.__setstate__(job.__getstate__())
+    return copy
+
+
+def _state(job: Job) -> bytes:
+    """
+    Сериализованное состояние задачи, как его хранит SQLAlchemyJobStore.
+
+    Триггеры не сравниваются по значению, поэтому сравниваются байты:
+    так видны изменения не только времени запуска, но и триггера,
+    аргументов, функции и остальных параметров.
+    """
+    return pickle.dumps(job.__getstate__(), pickle.HIGHEST_PROTOCOL)
+
+
+class WriteBehindJobStore(BaseJobStore):
+    """
+    Хранилище задач, которое не выполняет операций с БД в цикле событий.
+
+    Все чтения (поиск задачи, выборка задач к запуску, время следующего
+    запуска) обслуживаются из памяти. Изменения применяются к памяти сразу,
+    а в таблицу SQLAlchemyJobStore записываются по порядку в отдельном
+    потоке со своим небольшим пулом соединений. При старте задачи один раз
+    загружаются из таблицы, при остановке очередь записей дописывается.
+
+    Если таблицу меняют другие экземпляры бота, reload() сверяет память
+    с таблицей; on_persisted вызывается (в потоке записи) после каждой
+    записи, чтобы оповестить их.
+    """
+
+    def __init__(
+        self,
+        engine,
+        tablename: str = "apscheduler_jobs",
+        on_persisted=None,
+        **options,
+    ):
+        super().__init__()
+        self.on_persisted = on_persisted
+        self._sequence = itertools.count(1)
+        self._last_write: dict[str, int] = {}  # job_id -> номер последней записи
+        self._sql_store = SQLAlchemyJobStore(
+            engine=engine, tablename=tablename, **options
+        )
+        self._memory_store = MemoryJobStore()
+        # Один поток сохраняет порядок записей
+        self._writer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="jobstore-writer"
+        )
+
+    def start(self, scheduler, alias):
+        super().start(scheduler, alias)
+        self._sql_store.start(scheduler, alias)
+        self._memory_store.start(scheduler, alias)
+        jobs = self._sql_store.get_all_jobs()
+        for job in jobs:
+            self._memory_store.add_job(job)
+        self._logger.info(f"Загружено задач из БД: {len(jobs)}")
+
+    def shutdown(self):
+        self._writer.shutdown(wait=True)  # Дописываем очередь изменений
+        self._sql_store.shutdown()
+        self._memory_store.shutdown()
+
+    def lookup_job(self, job_id):
+        return self._memory_store.lookup_job(job_id)
+
+    def get_due_jobs(self, now):
+        return self._memory_store.get_due_jobs(now)
+
+    def get_next_run_time(self):
+        return self._memory_store.get_next_run_time()
+
+    def get_all_jobs(self):
+        return self._memory_store.get_all_jobs()
+
+    def add_job(self, job):
+        self._memory_store.add_job(job)  # ConflictingIdError — синхронно
+        self._submit(self._persist_add, _detach(job))
+
+    def update_job(self, job):
+        self._memory_store.update_job(job)  # JobLookupError — синхронно
+        self._submit(self._persist_update, _detach(job))
+
+    def remove_job(self, job_id):
+        # Задачу мог добавить другой экземпляр: удаляем из таблицы в любом случае
+        self._submit(self._persist_remove, job_id)
+        self._memory_store.remove_job(job_id)
+
+    def remove_all_jobs(self):
+        self._memory_store.remove_all_jobs()
+        self._submit(self._sql_store.remove_all_jobs)
+
+    async def reload(self) -> int:
+        """
+        Сверяет задачи в памяти с таблицей (изменения других экземпляров).
+
+        Чтение выполняется в потоке записи, поэтому видит все ранее поставленные
+        записи этого экземпляра; задачи, измененные после чтения, не трогаются.
+
+        Returns:
+            Число добавленных, обновленных и удаленных в памяти задач.
+        """
+        sequence = next(self._sequence)
+        jobs = await asyncio.wrap_future(
+            self._writer.submit(self._sql_store.get_all_jobs)
+        )
+        stored = {job.id: job for job in jobs}
+
+        changed = 0
+        for job in self._memory_store.get_all_jobs():
+            if job.id not in stored and self._last_write.get(job.id, 0) < sequence:
+                self._memory_store.remove_job(job.id)
+                changed += 1
+        for job_id, job in stored.items():
+            if self._last_write.get(job_id, 0) > sequence:
+                continue
+            current = self._memory_store.lookup_job(job_id)
+            if current is None:
+                self._memory_store.add_job(job)
+                changed += 1
+            elif _state(current) != _state(job):
+                self._memory_store.update_job(job)
+                changed += 1
+
+        self._last_write = {
+            job_id: number
+            for job_id, number in self._last_write.items()
+            if number > sequence
+        }
+        return changed
+
+    def flush(self) -> None:
+        """Ждет завершения всех поставленных в очередь записей."""
+        self._writer.submit(lambda: None).result()
+
+    def _submit(self, func, *args):
+        if args:
+            job_id = args[0] if isinstance(args[0], str) else args[0].id
+            self._last_write[job_id] = next(self._sequence)
+        future = self._writer.submit(func, *args)
+        future.add_done_callback(self._after_write)
+
+    def _after_write(self, future):
+        error = future.exception()
+        if error is not None:
+            self._logger.error(f"Ошибка записи задачи в БД: {error} <_submit>")
+        elif self.on_persisted is not None:
+            self.on_persisted()
+
+    # Таблица может разойтись с памятью (например, после сбоя записи),
+    # поэтому добавление и обновление взаимозаменяемы
+    def _persist_add(self, job):
+        try:
+            self._sql_store.add_job(job)
+        except ConflictingIdError:
+            self._sql_store.update_job(job)
+
+    def _persist_update(self, job):
+        try:
+            self._sql_store.update_job(job)
+        except JobLookupError:
+            self._sql_store.add_job(job)
+
+    def _persist_remove(self, job_id):
+        try:
+            self._sql_store.remove_job(job_id)
+        except JobLookupError:
+            pass
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} ({self._sql_store!r})>"
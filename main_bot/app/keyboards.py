@@ -12,6 +12,7 @@ from aiogram_calendar import SimpleCalendar
 import os
 import app.user_messages as um
 import app.support as sup
+from app.geo import Coord, yandex_route_url
 
 from dotenv import load_dotenv
 
@@ -32,13 +33,13 @@ async def create_calendar():
     return calendar_keyboard
 
 
-async def create_consider_button(start_coords: str):
+async def create_consider_button(start_coords: Coord | str):
     consider_button = InlineKeyboardMarkup(
         inline_keyboard=[
             [
                 InlineKeyboardButton(
                     text="Маршрут до клиента",
-                    url=f"https://yandex.ru/maps/?rtext=~{start_coords}",
+                    url=yandex_route_url(None, start_coords),
                 )
             ],
             [InlineKeyboardButton(text="Подтвердить✅", callback_data="accept_order")],
@@ -297,13 +298,15 @@ async def create_driving_process_keyboard(order, rate_id):
                 [
                     InlineKeyboardButton(
                         text="Маршрут до клиента",
-                        url=f"https://yandex.ru/maps/?rtext=~{decrypted_order_start_coords}",
+                        url=yandex_route_url(None, decrypted_order_start_coords),
                     )
                 ],
                 [
                     InlineKeyboardButton(
                         text=um.button_from_A_to_B_text(),
-                        url=f"https://yandex.ru/maps/?rtext={decrypted_order_start_coords}~{decrypted_order_finish_coords}",
+                        url=yandex_route_url(
+                            decrypted_order_start_coords, decrypted_order_finish_coords
+                        ),
                     )
                 ],
             ]
@@ -319,7 +322,7 @@ async def create_driving_process_keyboard(order, rate_id):
                 [
                     InlineKeyboardButton(
                         text="Маршрут до точки А",
-                        url=f"https://yandex.ru/maps/?rtext=~{order.start_coords}",
+                        url=yandex_route_url(None, decrypted_order_start_coords),
                     )
                 ],
             ]
@@ -335,7 +338,7 @@ async def create_in_trip_keyboard(rate_id, finish_coords):
                 [
                     InlineKeyboardButton(
                         text=um.button_from_A_to_B_text(),
-                        url=f"https://yandex.ru/maps/?rtext=~{finish_coords}",
+                        url=yandex_route_url(None, finish_coords),
                     )
                 ],
                 [
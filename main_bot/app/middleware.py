@@ -1,10 +1,12 @@
 import logging
-from aiogram.types import Message
+from aiogram.types import Message, TelegramObject
 from aiogram import BaseMiddleware
 from aiogram.fsm.storage.redis import RedisStorage  # Import RedisStorage
 from typing import Any, Dict, Callable, Awaitable
 import asyncio
 
+import app.database.requests as rq
+
 # Инициализируем логгер
 logger = logging.getLogger(__name__)
 
@@ -79,3 +81,27 @@ class AntiFloodMiddleware(BaseMiddleware):
                 f"Ошибка в AntiFloodMiddleware для пользователя {user_id}: {e}"
             )
             raise
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Открывает одну сессию БД на апдейт и передает ее в обработчик
+    через аргумент session.
+
+    Изменения фиксируются один раз после обработки апдейта
+    (или раньше, если обработчик сам вызвал session.commit()).
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        try:
+            async with rq.unit_of_work() as session:
+                data["session"] = session
+                return await handler(event, data)
+        except Exception as e:
+            logger.exception(f"Ошибка в DbSessionMiddleware: {e}")
+            raise
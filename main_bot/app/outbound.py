@@ -0,0 +1,242 @@
+import os
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты исходящих сообщений: меньше — раньше
+PRIORITY_HIGH = 0  # Живой трафик: заказы, поездки, ответы пользователям
+PRIORITY_LOW = 10  # Массовые рассылки
+
+# Методы Bot API, на которые распространяются лимиты Telegram
+THROTTLED_METHOD_PREFIXES = ("Send", "Copy", "Forward", "Edit")
+
+_current_priority: ContextVar[int] = ContextVar(
+    "outbound_priority", default=PRIORITY_HIGH
+)
+
+
+class TokenBucket:
+    """
+    Ведро токенов с резервированием: reserve() сразу списывает токен
+    и возвращает, сколько секунд нужно подождать до его появления.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # Токенов в секунду
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: float) -> float:
+        self._refill(now)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def release(self) -> None:
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def block(self, seconds: float, now: float) -> None:
+        # Следующий токен появится не раньше, чем через seconds
+        self._refill(now)
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+    def is_idle(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class OutboundDispatcher:
+    """
+    Диспетчер исходящих запросов к Telegram API.
+
+    Ограничивает общий поток сообщений бота (глобальное ведро токенов),
+    частоту сообщений в один чат и в группы, пропускает живой трафик
+    раньше рассылок и повторяет запросы после RetryAfter.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        group_rate: float = 20 / 60,
+        group_burst: float = 20.0,
+        max_retries: int = 3,
+        max_chat_buckets: int = 10_000,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self.max_chat_buckets = max_chat_buckets
+        self.logger = logger
+        self._chat_buckets: dict[int | str, TokenBucket] = {}
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._wakeup: asyncio.Event | None = None
+        self._pump_task: asyncio.Task | None = None
+
+    @contextmanager
+    def priority(self, priority: int):
+        """
+        Задает приоритет исходящих сообщений внутри блока with
+        (включая задачи, созданные внутри блока).
+        """
+        token = _current_priority.set(priority)
+        try:
+            yield
+        finally:
+            _current_priority.reset(token)
+
+    @staticmethod
+    def normalize_chat_id(chat_id: int | str | None) -> int | str | None:
+        if isinstance(chat_id, str):
+            try:
+                return int(chat_id)
+            except ValueError:
+                return chat_id  # @username канала или группы
+        return chat_id
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= self.max_chat_buckets:
+                self._prune_chat_buckets()
+
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            if is_group:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _prune_chat_buckets(self) -> None:
+        now = time.monotonic()
+        self._chat_buckets = {
+            chat_id: bucket
+            for chat_id, bucket in self._chat_buckets.items()
+            if not bucket.is_idle(now)
+        }
+
+    async def acquire(self, chat_id: int | str | None = None) -> None:
+        """
+        Дожидается разрешения на отправку в чат chat_id
+        с учетом лимита чата и общего лимита бота.
+        """
+        chat_id = self.normalize_chat_id(chat_id)
+        if chat_id is not None:
+            delay = self._chat_bucket(chat_id).reserve(time.monotonic())
+            if delay:
+                await asyncio.sleep(delay)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(
+            self._waiters, (_current_priority.get(), next(self._sequence), future)
+        )
+        self._ensure_pump()
+        self._wakeup.set()
+        await future
+
+    def block(self, chat_id: int | str | None, seconds: float) -> None:
+        """
+        Приостанавливает отправку в чат (или всем, если чат неизвестен)
+        на seconds секунд после ответа RetryAfter.
+        """
+        chat_id = self.normalize_chat_id(chat_id)
+        now = time.monotonic()
+        if chat_id is None:
+            self.global_bucket.block(seconds, now)
+        else:
+            self._chat_bucket(chat_id).block(seconds, now)
+
+    def _ensure_pump(self) -> None:
+        if self._pump_task is None or self._pump_task.done():
+            self._wakeup = asyncio.Event()
+            self._pump_task = asyncio.create_task(self._pump())
+
+    async def _pump(self) -> None:
+        # Выдает токены общего ведра ожидающим в порядке приоритета
+        while True:
+            if not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            delay = self.global_bucket.reserve(time.monotonic())
+            if delay:
+                await asyncio.sleep(delay)
+
+            while self._waiters:
+                _, _, future = heapq.heappop(self._waiters)
+                if not future.done():
+                    future.set_result(None)
+                    break
+            else:
+                self.global_bucket.release()  # Все ожидающие отменены
+
+    async def stop(self) -> None:
+        """
+        Останавливает фоновую задачу выдачи токенов.
+        """
+        if self._pump_task is not None and not self._pump_task.done():
+            self._pump_task.cancel()
+            try:
+                await self._pump_task
+            except asyncio.CancelledError:
+                pass
+        self._pump_task = None
+
+
+class OutboundRequestMiddleware(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: пропускает отправку сообщений через
+    OutboundDispatcher и повторяет запрос после TelegramRetryAfter.
+    """
+
+    def __init__(self, dispatcher: "OutboundDispatcher"):
+        self.dispatcher = dispatcher
+
+    async def __call__(self, make_request, bot, method):
+        if not type(method).__name__.startswith(THROTTLED_METHOD_PREFIXES):
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        attempt = 0
+        while True:
+            await self.dispatcher.acquire(chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.dispatcher.max_retries:
+                    raise
+                attempt += 1
+                logger.warning(
+                    f"RetryAfter {e.retry_after} с для чата {chat_id}, попытка {attempt} <OutboundRequestMiddleware>"
+                )
+                self.dispatcher.block(chat_id, e.retry_after)
+
+
+outbound_dispatcher = OutboundDispatcher(
+    global_rate=float(os.getenv("OUTBOUND_GLOBAL_RATE", "30")),
+    max_retries=int(os.getenv("OUTBOUND_MAX_RETRIES", "3")),
+)
@@ -0,0 +1,309 @@
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+from dataclasses import dataclass
+
+import numpy as np
+import pytz
+import vroom
+
+from app import support as sup
+from app.database import requests as rq
+from app.dispatch import order_dispatcher
+from app.driver_index import driver_index
+from app.route_estimator import (
+    EARTH_RADIUS_KM,
+    RouteEstimator,
+    parse_coords,
+    parse_trip_minutes,
+    route_estimator,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class PreorderTask:
+    order_id: int
+    pickup: tuple[float, float]  # Точка подачи (широта, долгота)
+    dropoff: tuple[float, float]  # Точка завершения поездки
+    pickup_at: int  # Время подачи, секунды от начала планирования
+    duration: int  # Длительность поездки, секунды
+    driver_tg_id: int | None = None  # Водитель, за которым предзаказ закреплен
+
+
+@dataclass(slots=True)
+class DriverShift:
+    tg_id: int
+    position: tuple[float, float]  # Последняя известная позиция
+
+
+def road_matrix(
+    origins: np.ndarray,
+    destinations: np.ndarray,
+    speed_kmh: float,
+    estimator: RouteEstimator = route_estimator,
+) -> np.ndarray:
+    """
+    Матрица времени в пути (секунды) между точками по оценке без внешнего API.
+
+    Args:
+        origins, destinations: Массивы формы (n, 2) из пар (широта, долгота).
+    """
+    lat1 = np.radians(origins[:, 0])[:, None]
+    lon1 = np.radians(origins[:, 1])[:, None]
+    lat2 = np.radians(destinations[:, 0])[None, :]
+    lon2 = np.radians(destinations[:, 1])[None, :]
+
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    straight_km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+    bounds = np.array([bound for bound, _ in estimator.road_factors])
+    factors = np.array([factor for _, factor in estimator.road_factors])
+    band = np.minimum(np.searchsorted(bounds, straight_km), len(factors) - 1)
+    road_km = straight_km * factors[band]
+
+    return np.rint(road_km / speed_kmh * 3600).astype(np.uint32)
+
+
+class PreorderOptimizer:
+    """
+    Пакетное распределение предзаказов между водителями (задача маршрутизации, VROOM).
+
+    Каждый предзаказ — работа в точке подачи с окном времени вокруг времени
+    подачи и длительностью, равной поездке. Переезд от работы i к работе j
+    считается от точки завершения i до точки подачи j, поэтому решатель
+    минимизирует только порожний пробег (при постоянной скорости время
+    пропорционально километрам). Предзаказы, уже закрепленные за водителем,
+    привязываются к нему через skills и учитываются как занятость.
+    """
+
+    def __init__(
+        self,
+        horizon_hours: float = 6.0,
+        pickup_slack_minutes: int = 10,
+        exploration_level: int = 3,
+        threads: int = 2,
+    ):
+        self.horizon_hours = horizon_hours  # Какие предзаказы планировать
+        self.pickup_slack = pickup_slack_minutes * 60
+        self.exploration_level = exploration_level
+        self.threads = threads
+        self.logger = logger
+        self._proposed: dict[int, set[int]] = {}  # order_id -> кому предлагали
+
+    def solve(
+        self,
+        tasks: list[PreorderTask],
+        drivers: list[DriverShift],
+        speed_kmh: float,
+    ) -> dict[int, int]:
+        """
+        Решает задачу распределения.
+
+        Returns:
+            Словарь {order_id: tg_id водителя} для незакрепленных предзаказов,
+            которым нашелся водитель.
+        """
+        if not tasks or not drivers:
+            return {}
+
+        vehicle_count = len(drivers)
+        # Строки матрицы — откуда едем (старт водителя или конец поездки),
+        # столбцы — куда (старт водителя или точка подачи)
+        origins = np.array(
+            [driver.position for driver in drivers] + [task.dropoff for task in tasks]
+        )
+        destinations = np.array(
+            [driver.position for driver in drivers] + [task.pickup for task in tasks]
+        )
+        durations = road_matrix(origins, destinations, speed_kmh)
+        durations[:, :vehicle_count] = 0  # Водители не возвращаются в начало
+
+        problem = vroom.Input()
+        problem.set_durations_matrix(profile="car", matrix_input=durations)
+
+        horizon = max(
+            task.pickup_at + self.pickup_slack + task.duration for task in tasks
+        )
+        driver_index_by_tg_id = {
+            driver.tg_id: index for index, driver in enumerate(drivers)
+        }
+        problem.add_vehicle(
+            [
+                vroom.Vehicle(
+                    index,
+                    start=index,
+                    skills={index},
+                    time_window=vroom.TimeWindow(0, horizon),
+                )
+                for index in range(vehicle_count)
+            ]
+        )
+
+        jobs = []
+        for offset, task in enumerate(tasks):
+            skills = set()
+            if task.driver_tg_id is not None:
+                pinned = driver_index_by_tg_id.get(task.driver_tg_id)
+                if pinned is None:
+                    continue  # Занятость водителя без позиции не учитываем
+                skills = {pinned}
+
+            earliest = max(0, task.pickup_at - self.pickup_slack)
+            latest = max(earliest, task.pickup_at + self.pickup_slack)
+            jobs.append(
+                vroom.Job(
+                    offset,
+                    location=vehicle_count + offset,
+                    service=task.duration,
+                    skills=skills,
+                    # Закрепленные предзаказы важнее новых
+                    priority=100 if skills else 0,
+                    time_windows=[vroom.TimeWindow(earliest, latest)],
+                )
+            )
+        if not jobs:
+            return {}
+        problem.add_job(jobs)
+
+        solution = problem.solve(
+            exploration_level=self.exploration_level, nb_threads=self.threads
+        )
+        routes = solution.routes
+        assigned = routes[routes["type"] == "job"]
+
+        assignments = {}
+        for job_id, vehicle_id in zip(assigned["id"], assigned["vehicle_id"]):
+            task = tasks[int(job_id)]
+            if task.driver_tg_id is None:
+                assignments[task.order_id] = drivers[int(vehicle_id)].tg_id
+        return assignments
+
+    async def load(self) -> tuple[list[PreorderTask], list[DriverShift]]:
+        """
+        Загружает предзаказы в пределах горизонта планирования и водителей.
+        """
+        encryption_key = os.getenv("DATA_ENCRYPTION_KEY")
+        if not encryption_key:
+            self.logger.error("Отсутствует ключ шифрования данных. <load>")
+            return [], []
+
+        timezone = pytz.timezone("Etc/GMT-7")
+        now = datetime.now(timezone)
+        horizon = self.horizon_hours * 3600
+
+        tasks = []
+        for order, driver_tg_id in await rq.get_open_preorders():
+            try:
+                pickup_time = sup.parse_submission_time(order.submission_time, now)
+                if pickup_time is None:
+                    continue
+                pickup_at = int((pickup_time - now).total_seconds())
+                if not -self.pickup_slack <= pickup_at <= horizon:
+                    continue
+
+                pickup = parse_coords(
+                    sup.decrypt_data(order.start_coords, encryption_key)
+                )
+                try:
+                    dropoff = parse_coords(
+                        sup.decrypt_data(order.finish_coords, encryption_key)
+                    )
+                except Exception:
+                    dropoff = pickup  # Почасовой тариф: без конечной точки
+
+                minutes = parse_trip_minutes(order.trip_time or "") or 60
+                tasks.append(
+                    PreorderTask(
+                        order_id=order.id,
+                        pickup=pickup,
+                        dropoff=dropoff,
+                        pickup_at=max(pickup_at, 0),
+                        duration=minutes * 60,
+                        driver_tg_id=driver_tg_id,
+                    )
+                )
+            except Exception as e:
+                self.logger.warning(
+                    f"Предзаказ №{order.id} пропущен: {e} <PreorderOptimizer.load>"
+                )
+
+        online = await rq.get_online_driver_tg_ids()
+        candidates = await rq.get_dispatch_candidates(online, status_ids=(1, 9))
+        positions = await driver_index.get_positions(
+            [tg_id for tg_id, _, _ in candidates]
+        )
+        drivers = [
+            DriverShift(tg_id=tg_id, position=position)
+            for tg_id, position in positions.items()
+        ]
+        return tasks, drivers
+
+    async def run(self) -> dict[int, int]:
+        """
+        Распределяет ожидающие предзаказы и предлагает их выбранным водителям.
+
+        Предложение отправляется водителю один раз; заказ закрепляется
+        за водителем, только когда он его примет.
+        """
+        tasks, drivers = await self.load()
+        pending = [task for task in tasks if task.driver_tg_id is None]
+        if not pending or not drivers:
+            return {}
+
+        hour = datetime.now(pytz.timezone("Etc/GMT-7")).hour
+        speed_kmh = route_estimator.hourly_speed[hour]
+
+        started = time.perf_counter()
+        assignments = await asyncio.to_thread(self.solve, tasks, drivers, speed_kmh)
+        self.logger.info(
+            f"Предзаказы распределены за {time.perf_counter() - started:.2f} с: "
+            f"{len(assignments)} из {len(pending)}, водителей {len(drivers)} <run>"
+        )
+
+        tasks_by_id = {task.order_id: task for task in pending}
+        open_ids = {task.order_id for task in pending}
+        self._proposed = {
+            order_id: proposed
+            for order_id, proposed in self._proposed.items()
+            if order_id in open_ids
+        }
+
+        for order_id, tg_id in assignments.items():
+            proposed = self._proposed.setdefault(order_id, set())
+            if tg_id in proposed:
+                continue
+            proposed.add(tg_id)
+
+            task = tasks_by_id[order_id]
+            order = await rq.get_order_by_id(order_id)
+            if order is None or order.status_id != 3:
+                continue
+            await order_dispatcher.send_offer(
+                tg_id,
+                order_id,
+                order.rate_id,
+                f"{task.pickup[0]},{task.pickup[1]}",
+            )
+        return assignments
+
+
+preorder_optimizer = PreorderOptimizer(
+    horizon_hours=float(os.getenv("PREORDER_HORIZON_HOURS", "6")),
+    pickup_slack_minutes=int(os.getenv("PREORDER_PICKUP_SLACK_MINUTES", "10")),
+    exploration_level=int(os.getenv("PREORDER_EXPLORATION_LEVEL", "3")),
+    threads=int(os.getenv("PREORDER_SOLVER_THREADS", "2")),
+)
+
+
+async def scheduled_optimize_preorders() -> None:
+    try:
+        await preorder_optimizer.run()
+    except Exception as e:
+        logger.error(f"Ошибка: {e} <scheduled_optimize_preorders>", exc_info=True)
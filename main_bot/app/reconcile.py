@@ -0,0 +1,241 @@
+import os
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+import pytz
+from redis.asyncio import Redis
+
+from app import support as sup
+from app import user_messages as um
+from app.bot_registry import bot_registry
+from app.database import requests as rq
+from app.database.models import AsyncSessionLocal
+from app.scheduler_manager import scheduler_manager
+
+logger = logging.getLogger(__name__)
+
+# Роли пользователей бота администраторов, которым приходит отчет
+ADMIN_ROLES = [3, 4, 5]
+
+# Множество Redis с заказами, о которых уже сообщено как о невосстановимых
+REPORTED_KEY = "reconcile:unrecoverable"
+
+_redis: Redis | None = None
+
+# Насколько задача начала поездки может опоздать, чтобы ее еще восстановить;
+# более старые предзаказы попадают в отчет как невосстановимые
+RESTORE_SLACK = timedelta(
+    minutes=int(os.getenv("ORDER_JOBS_RESTORE_SLACK_MINUTES", "15"))
+)
+
+
+@dataclass
+class ReconcileReport:
+    removed: list[str] = field(default_factory=list)  # ID удаленных задач
+    created: list[str] = field(default_factory=list)  # ID восстановленных задач
+    unrecoverable: list[int] = field(default_factory=list)  # Заказы без данных
+
+    def __bool__(self) -> bool:
+        return bool(self.removed or self.created or self.unrecoverable)
+
+
+def _get_redis() -> Redis:
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    return _redis
+
+
+async def only_new_unrecoverable(
+    order_ids: list[int], open_order_ids: set[int]
+) -> list[int]:
+    """
+    Оставляет заказы, о которых Админам еще не сообщали.
+
+    Сообщенные заказы хранятся в множестве Redis; заказы, которые больше
+    не числятся принятыми предзаказами, из него удаляются.
+
+    Returns:
+        Новые невосстановимые заказы (все, если Redis недоступен).
+    """
+    try:
+        redis = _get_redis()
+        reported = {int(member) for member in await redis.smembers(REPORTED_KEY)}
+        new = [order_id for order_id in order_ids if order_id not in reported]
+        stale = reported - open_order_ids
+        async with redis.pipeline(transaction=True) as pipe:
+            if stale:
+                pipe.srem(REPORTED_KEY, *stale)
+            if new:
+                pipe.sadd(REPORTED_KEY, *new)
+            await pipe.execute()
+        return new
+    except Exception as e:
+        logger.warning(f"Redis недоступен: {e} <only_new_unrecoverable>")
+        return order_ids
+
+
+def job_order_id(job) -> int | None:
+    """ID заказа задачи run_order_job (остальные задачи не сверяются)."""
+    if job.func is not sup.run_order_job or not job.args:
+        return None
+    return int(job.args[0])
+
+
+def driver_remind_date(arrival: datetime, accepted_at: str | None) -> datetime | None:
+    """
+    Время напоминания водителю, назначенное при принятии предзаказа
+    (client_accept): отступ зависит от того, сколько оставалось до подачи.
+
+    Returns:
+        Время напоминания или None, если время принятия неизвестно.
+    """
+    try:
+        accepted = pytz.timezone("Etc/GMT-7").localize(
+            datetime.strptime(accepted_at, "%d-%m-%Y %H:%M")
+        )
+    except (TypeError, ValueError):
+        return None
+    _, offset = sup.driver_remind_offset(arrival - accepted)
+    return arrival - timedelta(minutes=10) - offset
+
+
+async def reconcile_order_jobs() -> ReconcileReport | None:
+    """
+    Сверяет задачи планировщика с состоянием заказов после сбоя.
+
+    Состояние читается двумя пакетными выборками: все задачи из хранилища
+    (в памяти) и один запрос по заказам этих задач и принятым предзаказам.
+    Задачи удаленных, завершенных и отмененных заказов удаляются. Принятому
+    предзаказу (статус 14) без задачи начала поездки она создается заново,
+    если время ее запуска прошло не более чем на RESTORE_SLACK, иначе заказ
+    попадает в отчет как невосстановимый; независимо от нее восстанавливается
+    напоминание водителю, если назначенное при принятии время еще впереди.
+    О каждом невосстановимом заказе в отчете сообщается один раз.
+
+    Returns:
+        Отчет о расхождениях или None, если состояние прочитать не удалось.
+    """
+    await scheduler_manager.jobstore.reload()  # Задачи других экземпляров
+    jobs_by_order: dict[int, list] = {}
+    for job in scheduler_manager.scheduler.get_jobs():
+        order_id = job_order_id(job)
+        if order_id is not None:
+            jobs_by_order.setdefault(order_id, []).append(job)
+
+    rows = await rq.get_orders_for_job_reconciliation(list(jobs_by_order))
+    if rows is None:
+        return None
+    orders = {row[0]: row for row in rows}
+
+    report = ReconcileReport()
+    for order_id, jobs in jobs_by_order.items():
+        order = orders.get(order_id)
+        if order is None or order[2] or order[1] in sup.ORDER_JOB_FINAL_STATUSES:
+            for job in jobs:
+                if scheduler_manager.remove_job(job.id):
+                    report.removed.append(job.id)
+
+    timezone = pytz.timezone("Etc/GMT-7")
+    now = datetime.now(timezone)
+    for (
+        order_id,
+        status_id,
+        is_deleted,
+        driver_tg_id,
+        arrival_time,
+        accepted_at,
+    ) in orders.values():
+        if status_id != 14 or is_deleted:
+            continue
+        job_id = f"{order_id}_switch_order_status"
+        start_missing = scheduler_manager.scheduler.get_job(job_id) is None
+
+        try:
+            arrival = timezone.localize(
+                datetime.strptime(arrival_time, "%d-%m-%Y %H:%M")
+            )
+        except (TypeError, ValueError):
+            arrival = None
+        if arrival is None or driver_tg_id is None:
+            if start_missing:
+                report.unrecoverable.append(order_id)
+            continue
+
+        if start_missing:
+            run_date = arrival - timedelta(minutes=10)
+            if run_date < now - RESTORE_SLACK:
+                # Поездка давно должна была начаться: решает Админ
+                report.unrecoverable.append(order_id)
+                continue
+            # Немного просроченная задача начала поездки выполняется сразу
+            run_date = max(run_date, now + timedelta(seconds=5))
+            sup.schedule_order_job(sup.ORDER_JOB_START_TRIP, order_id, run_date, job_id)
+            report.created.append(job_id)
+
+        # Напоминание сверяется отдельно: его задача могла пропасть одна.
+        # Выполненная задача тоже удаляется из хранилища, поэтому она
+        # восстанавливается, только если исходное время еще впереди.
+        remind_date = driver_remind_date(arrival, accepted_at)
+        remind_id = f"{order_id}_remind_{driver_tg_id}"
+        if (
+            remind_date is not None
+            and remind_date > now
+            and scheduler_manager.scheduler.get_job(remind_id) is None
+        ):
+            sup.schedule_order_job(
+                sup.ORDER_JOB_REMIND_DRIVER,
+                order_id,
+                remind_date,
+                remind_id,
+                tg_id=int(driver_tg_id),
+            )
+            report.created.append(remind_id)
+
+    open_order_ids = {row[0] for row in orders.values() if row[1] == 14 and not row[2]}
+    report.unrecoverable = await only_new_unrecoverable(
+        report.unrecoverable, open_order_ids
+    )
+    return report
+
+
+async def send_reconcile_report(report: ReconcileReport) -> None:
+    """Отправляет отчет о расхождениях администраторам через бота администраторов."""
+    async with AsyncSessionLocal() as session:
+        chat_ids = await rq.get_all_chats(session, ADMIN_ROLES)
+
+    bot = bot_registry.get("TOKEN_ADM")
+    text = um.reconcile_report_text(
+        report.removed, report.created, report.unrecoverable
+    )
+    for chat_id in chat_ids:
+        try:
+            await bot.send_message(chat_id, text)
+        except Exception as e:
+            logger.error(
+                f"Не удалось отправить отчет сверки в чат {chat_id}: {e} <send_reconcile_report>"
+            )
+
+
+async def scheduled_reconcile_order_jobs() -> None:
+    """
+    Задача планировщика: сверка выполняется лидером при старте и далее
+    с интервалом ORDER_JOBS_RECONCILE_INTERVAL_MINUTES (по умолчанию 60).
+    """
+    try:
+        report = await reconcile_order_jobs()
+        if report is None:
+            logger.error(
+                "Сверка задач пропущена: не удалось прочитать заказы <scheduled_reconcile_order_jobs>"
+            )
+            return
+
+        logger.info(
+            f"Сверка задач: удалено {len(report.removed)}, создано {len(report.created)}, "
+            f"не восстановлено {len(report.unrecoverable)} <scheduled_reconcile_order_jobs>"
+        )
+        if report and os.getenv("TOKEN_ADM"):
+            await send_reconcile_report(report)
+    except Exception as e:
+        logger.error(f"Ошибка: {e} <scheduled_reconcile_order_jobs>", exc_info=True)
@@ -0,0 +1,304 @@
+import os
+import re
+import json
+import math
+import random
+import asyncio
+import logging
+import argparse
+import statistics
+from datetime import datetime
+
+import pytz
+
+from app.geo import Coord
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+
+# Коэффициент извилистости дорог по диапазонам расстояния по прямой, км:
+# (верхняя граница диапазона, коэффициент). Значения по умолчанию — до калибровки.
+DEFAULT_ROAD_FACTORS = [
+    (2.0, 1.45),
+    (5.0, 1.35),
+    (10.0, 1.3),
+    (20.0, 1.25),
+    (math.inf, 1.2),
+]
+
+# Средняя скорость по дорогам города по часам суток, км/ч
+DEFAULT_HOURLY_SPEED = [
+    40, 42, 42, 42, 40, 36, 30, 24, 20, 24, 27, 27,
+    26, 26, 26, 25, 22, 19, 20, 24, 28, 32, 35, 38,
+]  # fmt: skip
+
+MIN_SAMPLES = 5  # Минимум заказов для калибровки корзины
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = (
+        math.sin(d_phi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def parse_coords(coords: Coord | str) -> Coord:
+    return Coord.parse(coords)
+
+
+def parse_distance_meters(distance: str) -> float | None:
+    """Разбирает строку расстояния из send_route ("5 км, 300 м" или "300 м")."""
+    kilometers = re.search(r"(\d+)\s*км", distance)
+    meters = re.search(r"(\d+)\s*м(?!\w)", distance)
+    if kilometers is None and meters is None:
+        return None
+    return (int(kilometers.group(1)) if kilometers else 0) * 1000 + (
+        int(meters.group(1)) if meters else 0
+    )
+
+
+def parse_trip_minutes(trip_time: str) -> int | None:
+    """Разбирает строку времени из send_route ("1 час, 5 мин" или "12 мин")."""
+    hours = re.search(r"(\d+)\s*час", trip_time)
+    minutes = re.search(r"(\d+)\s*мин", trip_time)
+    if hours is None and minutes is None:
+        return None
+    return (int(hours.group(1)) if hours else 0) * 60 + (
+        int(minutes.group(1)) if minutes else 0
+    )
+
+
+def parse_hour(submission_time: str) -> int | None:
+    match = re.search(r"(\d{1,2}):\d{2}", submission_time)
+    return int(match.group(1)) % 24 if match else None
+
+
+class RouteEstimator:
+    """
+    Мгновенная оценка маршрута без внешнего API.
+
+    Расстояние — расстояние по прямой (гаверсинус), умноженное на коэффициент
+    извилистости дорог для его диапазона, время — по средней скорости
+    для часа суток. Коэффициенты калибруются по завершенным заказам
+    (python -m app.route_estimator calibrate) и хранятся в JSON-профиле.
+    """
+
+    def __init__(self, profile_path: str | None = None):
+        self.profile_path = profile_path
+        self.road_factors = list(DEFAULT_ROAD_FACTORS)
+        self.hourly_speed = list(DEFAULT_HOURLY_SPEED)
+        self.logger = logger
+        if profile_path and os.path.exists(profile_path):
+            self.load(profile_path)
+
+    def load(self, path: str) -> None:
+        try:
+            with open(path, encoding="utf8") as file:
+                profile = json.load(file)
+            self.road_factors = [
+                (math.inf if bound is None else bound, factor)
+                for bound, factor in profile["road_factors"]
+            ]
+            self.hourly_speed = profile["hourly_speed"]
+            self.logger.info(f"Загружен профиль оценки маршрутов {path}")
+        except Exception as e:
+            self.logger.error(f"Ошибка при загрузке профиля {path}: {e} <load>")
+
+    def save(self, path: str) -> None:
+        profile = {
+            "road_factors": [
+                (None if math.isinf(bound) else bound, round(factor, 3))
+                for bound, factor in self.road_factors
+            ],
+            "hourly_speed": [round(speed, 1) for speed in self.hourly_speed],
+        }
+        with open(path, "w", encoding="utf8") as file:
+            json.dump(profile, file, indent=2)
+
+    def road_factor(self, straight_km: float) -> float:
+        for bound, factor in self.road_factors:
+            if straight_km <= bound:
+                return factor
+        return self.road_factors[-1][1]
+
+    def estimate(
+        self,
+        start_coords: Coord | str,
+        end_coords: Coord | str,
+        hour: int | None = None,
+    ) -> tuple[float, float]:
+        """
+        Оценивает маршрут.
+
+        Returns:
+            Кортеж (расстояние в метрах, время в минутах).
+        """
+        straight_km = haversine_km(
+            *parse_coords(start_coords), *parse_coords(end_coords)
+        )
+        road_km = straight_km * self.road_factor(straight_km)
+
+        if hour is None:
+            hour = datetime.now(pytz.timezone("Etc/GMT-7")).hour
+        minutes = road_km / self.hourly_speed[hour] * 60
+        return road_km * 1000, minutes
+
+    def calibrate(self, samples: list[tuple[float, float, float, int]]) -> None:
+        """
+        Калибрует коэффициенты по выборке заказов.
+
+        Args:
+            samples: Список (расстояние по прямой, км; по дорогам, км;
+                время в пути, мин; час заказа).
+        """
+        factors = []
+        lower = 0.0
+        for bound, default_factor in self.road_factors:
+            ratios = [
+                road_km / straight_km
+                for straight_km, road_km, _, _ in samples
+                if lower < straight_km <= bound and straight_km > 0.1
+            ]
+            factor = (
+                statistics.median(ratios)
+                if len(ratios) >= MIN_SAMPLES
+                else default_factor
+            )
+            factors.append((bound, factor))
+            lower = bound
+        self.road_factors = factors
+
+        speeds = []
+        for hour, default_speed in enumerate(self.hourly_speed):
+            hour_speeds = [
+                road_km / (minutes / 60)
+                for _, road_km, minutes, sample_hour in samples
+                if sample_hour == hour and minutes > 0
+            ]
+            speeds.append(
+                statistics.median(hour_speeds)
+                if len(hour_speeds) >= MIN_SAMPLES
+                else default_speed
+            )
+        self.hourly_speed = speeds
+
+    def accuracy_report(self, samples: list[tuple[float, float, float, int]]) -> str:
+        """
+        Сравнивает оценки с историческими маршрутами.
+
+        Returns:
+            Текст отчета: средняя и медианная относительная ошибка, p90.
+        """
+        distance_errors = []
+        time_errors = []
+        for straight_km, road_km, minutes, hour in samples:
+            if road_km <= 0 or minutes <= 0:
+                continue
+            estimated_km = straight_km * self.road_factor(straight_km)
+            estimated_minutes = estimated_km / self.hourly_speed[hour] * 60
+            distance_errors.append(abs(estimated_km - road_km) / road_km)
+            time_errors.append(abs(estimated_minutes - minutes) / minutes)
+
+        if not distance_errors:
+            return "Нет данных для отчета"
+
+        def describe(errors: list[float]) -> str:
+            ordered = sorted(errors)
+            p90 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+            return (
+                f"MAPE {statistics.mean(errors) * 100:.1f}%, "
+                f"медиана {statistics.median(errors) * 100:.1f}%, "
+                f"p90 {p90 * 100:.1f}%"
+            )
+
+        return (
+            f"Заказов: {len(distance_errors)}\n"
+            f"Расстояние: {describe(distance_errors)}\n"
+            f"Время: {describe(time_errors)}"
+        )
+
+
+route_estimator = RouteEstimator(
+    profile_path=os.getenv("ROUTE_ESTIMATOR_PROFILE", "route_estimator.json")
+)
+
+
+async def load_samples() -> list[tuple[float, float, float, int]]:
+    """
+    Загружает выборку завершенных заказов для калибровки.
+    """
+    from cryptography.fernet import Fernet
+    from sqlalchemy import select
+
+    from app.database.models import AsyncSessionLocal, Order
+
+    cipher = Fernet(os.getenv("DATA_ENCRYPTION_KEY").encode())
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(
+                Order.start_coords,
+                Order.finish_coords,
+                Order.distance,
+                Order.trip_time,
+                Order.submission_time,
+            ).where(Order.status_id == 7)
+        )
+        rows = result.all()
+
+    samples = []
+    for start_coords, finish_coords, distance, trip_time, submission_time in rows:
+        try:
+            start = parse_coords(cipher.decrypt(start_coords).decode())
+            finish = parse_coords(cipher.decrypt(finish_coords).decode())
+        except Exception:
+            continue  # Заказы без конечной точки (почасовой тариф) и старые форматы
+
+        meters = parse_distance_meters(distance or "")
+        minutes = parse_trip_minutes(trip_time or "")
+        hour = parse_hour(submission_time or "")
+        if not meters or not minutes or hour is None:
+            continue
+        samples.append((haversine_km(*start, *finish), meters / 1000, minutes, hour))
+    return samples
+
+
+async def _cli(command: str, profile_path: str) -> None:
+    samples = await load_samples()
+    print(f"Загружено заказов: {len(samples)}")
+
+    estimator = RouteEstimator(profile_path)
+    if command == "report":
+        print(estimator.accuracy_report(samples))
+        return
+
+    print(f"Текущий профиль:\n{estimator.accuracy_report(samples)}")
+
+    # Оценка на отложенной выборке: калибруем на 80% заказов, проверяем на 20%
+    random.Random(42).shuffle(samples)
+    split = int(len(samples) * 0.8)
+    holdout = RouteEstimator()
+    holdout.calibrate(samples[:split])
+    print(f"Отложенная выборка:\n{holdout.accuracy_report(samples[split:])}")
+
+    estimator.calibrate(samples)
+    estimator.save(profile_path)
+    print(f"Профиль сохранен в {profile_path}")
+
+
+if __name__ == "__main__":
+    # Запуск из каталога main_bot: python -m app.route_estimator calibrate
+    parser = argparse.ArgumentParser(description="Калибровка оценки маршрутов")
+    parser.add_argument("command", choices=["calibrate", "report"])
+    parser.add_argument(
+        "--profile",
+        default=os.getenv("ROUTE_ESTIMATOR_PROFILE", "route_estimator.json"),
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_cli(args.command, args.profile))
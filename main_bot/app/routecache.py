@@ -0,0 +1,127 @@
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+import pytz
+
+from app.geo import Coord
+
+logger = logging.getLogger(__name__)
+
+
+class RouteCache:
+    """
+    Кэш маршрутов и цен (результатов send_route).
+
+    Ключ — координаты начала и конца, округленные до coord_precision знаков,
+    и интервал времени суток длиной bucket_minutes (маршрут строится с учетом
+    пробок). Одновременные одинаковые запросы объединяются в один
+    (single-flight): остальные ждут результат первого.
+    """
+
+    def __init__(
+        self,
+        ttl: int = 900,
+        maxsize: int = 5_000,
+        coord_precision: int = 4,
+        bucket_minutes: int = 30,
+    ):
+        self.ttl = ttl  # Время жизни записи в секундах
+        self.maxsize = maxsize
+        self.coord_precision = coord_precision
+        self.bucket_minutes = bucket_minutes
+        self.logger = logger
+        self._entries: OrderedDict[tuple, tuple[float, tuple]] = OrderedDict()
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _quantize(self, coords: Coord | str) -> str:
+        latitude, longitude = Coord.parse(coords)
+        precision = self.coord_precision
+        return f"{round(latitude, precision):.{precision}f},{round(longitude, precision):.{precision}f}"
+
+    def make_key(self, start_coords: str, end_coords: str) -> tuple:
+        now = datetime.now(pytz.timezone("Etc/GMT-7"))
+        time_bucket = (now.hour * 60 + now.minute) // self.bucket_minutes
+        return (
+            self._quantize(start_coords),
+            self._quantize(end_coords),
+            time_bucket,
+        )
+
+    async def get_or_fetch(
+        self,
+        start_coords: str,
+        end_coords: str,
+        fetch: Callable[[str, str], Awaitable[tuple]],
+    ) -> tuple:
+        """
+        Возвращает маршрут из кэша или запрашивает его через fetch.
+
+        В кэш попадают только успешные ответы (с рассчитанным расстоянием).
+        """
+        try:
+            key = self.make_key(start_coords, end_coords)
+        except (AttributeError, ValueError):
+            # Координаты в неожиданном формате — запрашиваем без кэша
+            return await fetch(start_coords, end_coords)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, result = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            del self._entries[key]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.hits += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fetch(start_coords, end_coords)
+            future.set_result(result)
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Исключение получит вызывающий, а не loop
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        if result and result[0] is not None:
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return result
+
+    def peek(self, start_coords: str, end_coords: str) -> tuple | None:
+        """
+        Возвращает маршрут из кэша без запроса и без учета в статистике.
+        """
+        try:
+            entry = self._entries.get(self.make_key(start_coords, end_coords))
+        except (AttributeError, ValueError):
+            return None
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+route_cache = RouteCache(
+    ttl=int(os.getenv("ROUTE_CACHE_TTL", "900")),
+    coord_precision=int(os.getenv("ROUTE_CACHE_COORD_PRECISION", "4")),
+    bucket_minutes=int(os.getenv("ROUTE_CACHE_BUCKET_MINUTES", "30")),
+)
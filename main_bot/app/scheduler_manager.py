@@ -1,39 +1,167 @@
 import os
+import uuid
+import socket
 import logging
 import asyncio
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from redis.asyncio import Redis
 from sqlalchemy import create_engine
 
+from app.jobstore import WriteBehindJobStore
+
 logger = logging.getLogger(__name__)
 
+# Продлевает или снимает аренду, только если ее держит этот экземпляр
+RENEW_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
 
 class SchedulerManager:
+    """
+    Планировщик задач, общий для нескольких экземпляров бота.
+
+    Задачи выполняет только лидер — экземпляр, который держит аренду
+    (ключ Redis с ограниченным сроком жизни и периодическим продлением).
+    Остальные экземпляры запускают планировщик на паузе: они добавляют
+    и удаляют задачи, но не выполняют их. Если лидер перестал продлевать
+    аренду, ее в течение lease секунд забирает другой экземпляр.
+    После записи в таблицу задач экземпляр увеличивает счетчик версии
+    в Redis, а остальные, заметив новую версию, перечитывают таблицу.
+    """
+
     def __init__(self):
+        self.logger = logger
+        self.election_enabled = os.getenv("SCHEDULER_LEADER_ELECTION", "1") == "1"
+        self.lease = float(os.getenv("SCHEDULER_LEASE_SECONDS", "10"))
+        self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        self.leader_key = "scheduler:leader"
+        self.version_key = "scheduler:jobs:version"
+        self.instance_id = (
+            f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+        self.is_leader = False
+        self._redis: Redis | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._election_task: asyncio.Task | None = None
+        self._known_version = 0
+
         sql_url = os.getenv("APSCHEDULER_SQL_URL")
         if sql_url is None:
             logger.error("Переменная окружения APSCHEDULER_SQL_URL не установлена.")
             return
         else:
-            # Создание синхронного движка для APScheduler
-            sync_engine = create_engine(url=sql_url)
+            # Синхронный движок APScheduler используется только потоком записи
+            # хранилища задач, поэтому ему хватает одного соединения
+            sync_engine = create_engine(
+                url=sql_url, pool_size=1, max_overflow=1, pool_pre_ping=True
+            )
 
-        self.jobstores = {"default": SQLAlchemyJobStore(engine=sync_engine)}
+        self.jobstore = WriteBehindJobStore(
+            engine=sync_engine, on_persisted=self._on_persisted
+        )
+        self.jobstores = {"default": self.jobstore}
         self.job_defaults = {"coalesce": False, "max_instances": 3}
         self.scheduler = AsyncIOScheduler(
             jobstores=self.jobstores,
             job_defaults=self.job_defaults,
         )
-        self.logger = logger
+
+    def _get_redis(self) -> Redis:
+        if self._redis is None:
+            self._redis = Redis.from_url(self.redis_url)
+        return self._redis
 
     async def start(self):
         if not self.scheduler.running:
-            self.scheduler.start()  # Запускаем планировщик
-            self.logger.info("Планировщик запущен")
+            self._loop = asyncio.get_running_loop()
+            # Без выборов лидера экземпляр сразу выполняет задачи
+            self.scheduler.start(paused=self.election_enabled)
+            if self.election_enabled:
+                self._election_task = asyncio.create_task(
+                    self._election(), name="scheduler-election"
+                )
+            self.logger.info(f"Планировщик запущен ({self.instance_id})")
         else:
             self.logger.info("Планировщик уже запущен")
 
+    async def _election(self):
+        interval = self.lease / 3
+        while True:
+            try:
+                await self._elect()
+                await self._sync_jobs()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(
+                    f"Ошибка выборов лидера планировщика: {e} <_election>"
+                )
+                if self.is_leader:
+                    self._step_down()  # Без Redis не можем подтвердить аренду
+            await asyncio.sleep(interval)
+
+    async def _elect(self):
+        redis = self._get_redis()
+        lease_ms = int(self.lease * 1000)
+        if self.is_leader:
+            renewed = await redis.eval(
+                RENEW_LEASE_SCRIPT, 1, self.leader_key, self.instance_id, lease_ms
+            )
+            if not renewed:
+                self._step_down()
+            return
+
+        acquired = await redis.set(
+            self.leader_key, self.instance_id, nx=True, px=lease_ms
+        )
+        if acquired:
+            # Перед запуском задач подтягиваем изменения других экземпляров
+            await self.jobstore.reload()
+            self.is_leader = True
+            self.scheduler.resume()
+            self.logger.info(f"Экземпляр {self.instance_id} стал лидером планировщика")
+
+    def _step_down(self):
+        self.is_leader = False
+        self.scheduler.pause()
+        self.logger.warning(
+            f"Экземпляр {self.instance_id} больше не лидер планировщика <_step_down>"
+        )
+
+    async def _sync_jobs(self):
+        version = int(await self._get_redis().get(self.version_key) or 0)
+        if version == self._known_version:
+            return
+        self._known_version = version
+        if await self.jobstore.reload():
+            self.scheduler.wakeup()
+
+    def _on_persisted(self):
+        # Вызывается из потока записи хранилища задач
+        if self._loop is not None and self.election_enabled:
+            self._loop.call_soon_threadsafe(
+                lambda: asyncio.ensure_future(self._bump_version())
+            )
+
+    async def _bump_version(self):
+        try:
+            version = await self._get_redis().incr(self.version_key)
+            if version == self._known_version + 1:
+                self._known_version = version  # Изменения только наши
+        except Exception as e:
+            self.logger.error(f"Не удалось обновить версию задач: {e} <_bump_version>")
+
     def add_job(self, func, trigger, **kwargs):
         try:
             self.scheduler.add_job(func, trigger, **kwargs)
@@ -64,6 +192,24 @@ class SchedulerManager:
             return None
 
     async def shutdown(self):
+        if self._election_task is not None:
+            self._election_task.cancel()
+            try:
+                await self._election_task
+            except asyncio.CancelledError:
+                pass
+            self._election_task = None
+
+        if self.is_leader:
+            # Освобождаем аренду, чтобы другой экземпляр перехватил ее сразу
+            try:
+                await self._get_redis().eval(
+                    RELEASE_LEASE_SCRIPT, 1, self.leader_key, self.instance_id
+                )
+            except Exception as e:
+                self.logger.error(f"Не удалось освободить аренду: {e} <shutdown>")
+            self.is_leader = False
+
         if self.scheduler.running:
             self.scheduler.shutdown(wait=False)
             self.logger.info("Планировщик остановлен")
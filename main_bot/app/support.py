@@ -2,7 +2,6 @@ import os
 import re
 import math
 import uuid
-import aiohttp
 import aiofiles
 import asyncio
 import logging
@@ -16,7 +15,6 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from cryptography.fernet import Fernet
 
-from aiogram import Bot
 from aiogram.types import (
     Message,
     CallbackQuery,
@@ -25,8 +23,17 @@ from aiogram.types import (
     InlineKeyboardMarkup,
 )
 from aiogram.fsm.context import FSMContext
+from aiogram.exceptions import TelegramBadRequest
 
 import app.database.requests as rq
+from app.geocache import geo_cache
+from app.routecache import route_cache
+from app.http_client import http_client
+from app.route_estimator import route_estimator
+from app.geo import Coord
+from app.bot_registry import bot_registry
+from app.scheduler_manager import scheduler_manager
+from app.timers import ORDER_TIMEOUT, ORDER_TIMEOUT_SECONDS, order_timers
 import app.keyboards as kb
 import app.user_messages as um
 import app.states as st
@@ -36,127 +43,354 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Максимум сообщений в одном запросе deleteMessages (ограничение Bot API)
+DELETE_MESSAGES_CHUNK_SIZE = 100
 
-async def scheduled_switch_order_status_and_block_driver(
-    order,
-    client_id: int,
-    driver_id: int,
-    order_status_id: int,
-    driver_tg_id: int,
-    client_tg_id: int,
-    rate_id: int,
-    order_info_for_driver: str,
-    order_info_for_client: str,
-    username_client: str,
-    arrival_time: str,
+# Ответ request_route, когда GraphHopper недоступен (вместо маршрута — оценка)
+ROUTE_SERVICE_UNAVAILABLE = (
+    None,
+    None,
+    "Ошибка при получении маршрута: сервис недоступен.",
+)
+
+# Ограничение числа чатов, очищаемых одновременно
+chat_cleanup_semaphore = asyncio.Semaphore(
+    int(os.getenv("CHAT_CLEANUP_CONCURRENCY", "8"))
+)
+
+
+# Виды отложенных задач по заказу. В задаче хранятся только ID заказа,
+# вид задачи и, при необходимости, несколько чисел; данные заказа
+# загружаются заново в момент запуска.
+ORDER_JOB_START_TRIP = "start_trip"
+ORDER_JOB_REMIND_CLIENT = "remind_client"
+ORDER_JOB_REMIND_DRIVER = "remind_driver"
+ORDER_JOB_FINISH_TRIP_REMINDER = "finish_trip_reminder"
+
+# Статусы, после которых задачи по заказу не выполняются
+ORDER_JOB_FINAL_STATUSES = (7, 8)
+
+
+def driver_remind_offset(lead_time: timedelta) -> tuple[str, timedelta]:
+    """
+    Когда напомнить водителю о принятом предзаказе.
+
+    Args:
+        lead_time: Сколько оставалось до подачи в момент принятия предзаказа.
+
+    Returns:
+        Текст для водителя ("за ... до начала поездки") и насколько раньше
+        задачи начала поездки (за 10 минут до подачи) отправить напоминание.
+    """
+    if int(lead_time.total_seconds() / 3600) > 24:
+        return "8 часов", timedelta(minutes=470)
+    minutes = lead_time.total_seconds() / 60
+    if minutes >= 60:
+        return "30 минут", timedelta(minutes=30)
+    if minutes >= 25:
+        return "20 минут", timedelta(minutes=10)
+    return "", timedelta(0)
+
+
+def schedule_order_job(
+    kind: str, order_id: int, run_date: datetime, job_id: str, **params: int
 ) -> None:
+    """
+    Планирует задачу по заказу.
+
+    Args:
+        kind: Вид задачи (ORDER_JOB_*).
+        params: Дополнительные числовые параметры (например, tg_id получателя).
+    """
+    scheduler_manager.add_job(
+        run_order_job,
+        "date",
+        run_date=run_date,
+        misfire_grace_time=60,
+        args=[order_id, kind],
+        kwargs=params,
+        id=job_id,
+    )
+
+
+async def run_order_job(order_id: int, kind: str, **params: int) -> None:
+    """
+    Точка входа всех отложенных задач по заказу: загружает актуальные данные
+    заказа и вызывает обработчик вида задачи.
+    """
     try:
-        bot = Bot(token=os.getenv("TOKEN_MAIN"))  # Создаем экземпляр бота
+        handler = ORDER_JOB_HANDLERS.get(kind)
+        if handler is None:
+            logger.error(
+                f"Неизвестный вид задачи {kind} для заказа №{order_id} <run_order_job>"
+            )
+            return
 
-        await rq.set_order_history(order.id, driver_id, "водитель в пути", "-")
-        await rq.set_status_order(client_id, order.id, order_status_id)
-        await rq.set_status_driver(driver_tg_id, 9)
+        order = await rq.get_order_by_id(order_id)
+        if order is None:
+            logger.error(
+                f"Заказ №{order_id} не найден для задачи {kind} <run_order_job>"
+            )
+            return
+        if order.status_id in ORDER_JOB_FINAL_STATUSES:
+            logger.info(
+                f"Задача {kind} пропущена: заказ №{order_id} в статусе {order.status_id} <run_order_job>"
+            )
+            return
+
+        current_order = await rq.get_current_order(order_id, identifier_type="order_id")
+        if current_order is None or current_order.driver_tg_id is None:
+            logger.error(
+                f"Текущий заказ №{order_id} не найден для задачи {kind} <run_order_job>"
+            )
+            return
 
-        driving_process_button = await kb.create_driving_process_keyboard(
-            order, rate_id
+        await handler(order, current_order, **params)
+    except Exception as e:
+        logger.error(
+            f"Ошибка задачи {kind} для заказа №{order_id}: {e} <run_order_job>",
+            exc_info=True,
         )
 
-        msg = await bot.send_message(
-            chat_id=driver_tg_id,
-            text=um.client_accept_text_for_driver(
-                order.id, username_client, order_info_for_driver
-            ),
-            reply_markup=driving_process_button,
+
+async def order_info_for_client_with_driver(order) -> str:
+    return await get_order_info_for_client_with_driver(
+        order.rate_id,
+        order.submission_time,
+        order.id,
+        order.start,
+        order.finish,
+        order.comment,
+        "предзаказ принят",
+        order.price,
+        order.distance,
+        order.trip_time,
+    )
+
+
+async def order_info_for_driver(order) -> str:
+    return await get_order_info_for_driver(
+        order.rate_id,
+        order.submission_time,
+        order.id,
+        order.start,
+        order.finish,
+        order.comment,
+        "предзаказ принят",
+        order.price,
+        order.distance,
+        order.trip_time,
+    )
+
+
+async def job_start_trip(order, current_order) -> None:
+    """
+    Переводит предзаказ в статус "водитель в пути" и блокирует водителя
+    за 10 минут до подачи.
+    """
+    bot = bot_registry.get()  # Общий экземпляр бота процесса
+    driver_tg_id = current_order.driver_tg_id
+    client_tg_id = current_order.client_tg_id
+
+    order_info = await check_rate_for_order_info(order.rate_id, order.id)
+    order_info_for_client = await order_info_for_client_with_driver(order)
+    if order_info is None or order_info_for_client is None:
+        logger.error(
+            f"Не удалось получить информацию о заказе №{order.id} <job_start_trip>"
         )
-        await rq.set_message(driver_tg_id, msg.message_id, msg.text)
+        return
+
+    await rq.set_order_history(
+        order.id, current_order.driver_id, "водитель в пути", "-"
+    )
+    await rq.set_status_order(current_order.client_id, order.id, 5)
+    await rq.set_status_driver(driver_tg_id, 9)
+
+    driving_process_button = await kb.create_driving_process_keyboard(
+        order, order.rate_id
+    )
+
+    msg = await bot.send_message(
+        chat_id=driver_tg_id,
+        text=um.client_accept_text_for_driver(
+            order.id, current_order.client_username, order_info
+        ),
+        reply_markup=driving_process_button,
+    )
+    await rq.set_message(driver_tg_id, msg.message_id, msg.text)
+
+    msg = await bot.send_message(
+        chat_id=client_tg_id,
+        text=um.client_accept_text_for_client(
+            order.submission_time.split()[1], order_info_for_client
+        ),
+    )
+    await rq.set_message(client_tg_id, msg.message_id, msg.text)
+
+
+async def send_preorder_reminder(tg_id: int, order_info: str) -> None:
+    bot = bot_registry.get()  # Общий экземпляр бота процесса
+    msg = await bot.send_message(
+        chat_id=tg_id,
+        text=f"Напоминаем о запланированной поездке!\nДетали заказа:\n\n#############\n{order_info}\n#############\n\nЕсли есть вопросы по заказу, обратитесь в службу поддержки",
+    )
+    await rq.set_message(tg_id, msg.message_id, msg.text)
+
+
+async def job_remind_client(order, current_order, tg_id: int) -> None:
+    if current_order.client_tg_id != tg_id:
+        return
+    await send_preorder_reminder(tg_id, await order_info_for_client_with_driver(order))
+
 
+async def job_remind_driver(order, current_order, tg_id: int) -> None:
+    if current_order.driver_tg_id != tg_id:
+        return  # Предзаказ передан другому водителю
+    await send_preorder_reminder(tg_id, await order_info_for_driver(order))
+
+
+async def send_finish_trip_reminder(
+    client_tg_id: int, driver_tg_id: int, minutes: int
+) -> None:
+    bot = bot_registry.get()  # Общий экземпляр бота процесса
+    for tg_id in (client_tg_id, driver_tg_id):
         msg = await bot.send_message(
-            chat_id=client_tg_id,
-            text=um.client_accept_text_for_client(arrival_time, order_info_for_client),
-        )
-        await rq.set_message(client_tg_id, msg.message_id, msg.text)
-    except Exception as e:
-        logger.error(
-            f"Ошибка: {e} <scheduled_switch_order_status_and_block_driver>",
-            exc_info=True,
+            chat_id=tg_id,
+            text=f"Напоминаем, что поездка завершится через {minutes} минут!",
         )
-    finally:
-        # Закрытие сессии бота
-        if bot and bot.session:
-            await bot.session.close()
+        await rq.set_message(tg_id, msg.message_id, msg.text)
+
+
+async def job_finish_trip_reminder(order, current_order, minutes: int) -> None:
+    await send_finish_trip_reminder(
+        current_order.client_tg_id, current_order.driver_tg_id, minutes
+    )
+
+
+ORDER_JOB_HANDLERS = {
+    ORDER_JOB_START_TRIP: job_start_trip,
+    ORDER_JOB_REMIND_CLIENT: job_remind_client,
+    ORDER_JOB_REMIND_DRIVER: job_remind_driver,
+    ORDER_JOB_FINISH_TRIP_REMINDER: job_finish_trip_reminder,
+}
+
+
+# Задачи старого формата (с ORM-объектом и готовым текстом в аргументах).
+# Функции нужны, чтобы такие задачи восстановились из БД: при старте
+# migrate_legacy_order_jobs переводит их на run_order_job.
+async def scheduled_switch_order_status_and_block_driver(order, *args) -> None:
+    await run_order_job(order.id, ORDER_JOB_START_TRIP)
 
 
 async def scheduled_client_reminder_preorder(
-    client_tg_id: int,
-    order_info_for_client: str,
+    client_tg_id: int, order_info_for_client: str
 ) -> None:
     try:
-        bot = Bot(token=os.getenv("TOKEN_MAIN"))  # Создаем экземпляр бота
-        msg = await bot.send_message(
-            chat_id=client_tg_id,
-            text=f"Напоминаем о запланированной поездке!\nДетали заказа:\n\n#############\n{order_info_for_client}\n#############\n\nЕсли есть вопросы по заказу, обратитесь в службу поддержки",
-        )
-        await rq.set_message(client_tg_id, msg.message_id, msg.text)
+        await send_preorder_reminder(client_tg_id, order_info_for_client)
     except Exception as e:
-        logger.error(
-            f"Ошибка: {e} <scheduled_reminder_preorder>",
-            exc_info=True,
-        )
-    finally:
-        # Закрытие сессии бота
-        if bot and bot.session:
-            await bot.session.close()
+        logger.error(f"Ошибка: {e} <scheduled_client_reminder_preorder>")
 
 
 async def scheduled_driver_reminder_preorder(
-    driver_tg_id: int,
-    order_info_for_driver: str,
+    driver_tg_id: int, order_info_for_driver: str
 ) -> None:
     try:
-        bot = Bot(token=os.getenv("TOKEN_MAIN"))  # Создаем экземпляр бота
-        msg = await bot.send_message(
-            chat_id=driver_tg_id,
-            text=f"Напоминаем о запланированной поездке!\nДетали заказа:\n\n#############\n{order_info_for_driver}\n#############\n\nЕсли есть вопросы по заказу, обратитесь в службу поддержки",
-        )
-        await rq.set_message(driver_tg_id, msg.message_id, msg.text)
+        await send_preorder_reminder(driver_tg_id, order_info_for_driver)
     except Exception as e:
-        logger.error(
-            f"Ошибка: {e} <scheduled_reminder_preorder>",
-            exc_info=True,
-        )
-    finally:
-        # Закрытие сессии бота
-        if bot and bot.session:
-            await bot.session.close()
+        logger.error(f"Ошибка: {e} <scheduled_driver_reminder_preorder>")
 
 
 async def scheduled_reminder_finish_trip(
-    client_tg_id: int,
-    driver_tg_id: int,
-    minutes: int,
+    client_tg_id: int, driver_tg_id: int, minutes: int
 ) -> None:
     try:
-        bot = Bot(token=os.getenv("TOKEN_MAIN"))  # Создаем экземпляр бота
-        msg = await bot.send_message(
-            chat_id=client_tg_id,
-            text=f"Напоминаем, что поездка завершится через {minutes} минут!",
-        )
-        await rq.set_message(client_tg_id, msg.message_id, msg.text)
+        await send_finish_trip_reminder(client_tg_id, driver_tg_id, minutes)
+    except Exception as e:
+        logger.error(f"Ошибка: {e} <scheduled_reminder_finish_trip>")
 
-        msg = await bot.send_message(
-            chat_id=driver_tg_id,
-            text=f"Напоминаем, что поездка завершится через {minutes} минут!",
+
+def legacy_order_job_payload(job) -> tuple[int, str, dict] | None:
+    """
+    Переводит аргументы задачи старого формата в (ID заказа, вид, параметры).
+    ID заказа берется из ID задачи ("<order_id>_remind_<tg_id>", "<order_id>_30min"),
+    если его нет в аргументах.
+    """
+    if job.func is scheduled_switch_order_status_and_block_driver:
+        return job.args[0].id, ORDER_JOB_START_TRIP, {}
+
+    kinds = {
+        scheduled_client_reminder_preorder: ORDER_JOB_REMIND_CLIENT,
+        scheduled_driver_reminder_preorder: ORDER_JOB_REMIND_DRIVER,
+        scheduled_reminder_finish_trip: ORDER_JOB_FINISH_TRIP_REMINDER,
+    }
+    kind = kinds.get(job.func)
+    if kind is None:
+        return None
+
+    order_id = int(job.id.split("_")[0])
+    if kind == ORDER_JOB_FINISH_TRIP_REMINDER:
+        return order_id, kind, {"minutes": int(job.args[2])}
+    return order_id, kind, {"tg_id": int(job.args[0])}
+
+
+def migrate_legacy_order_jobs() -> int:
+    """
+    Однократно переводит сохраненные задачи старого формата на run_order_job
+    с аргументами (ID заказа, вид задачи). Повторный вызов ничего не меняет.
+
+    Вызывается сразу после запуска планировщика, до первой обработки задач.
+
+    Returns:
+        Число переведенных задач.
+    """
+    migrated = 0
+    for job in scheduler_manager.scheduler.get_jobs():
+        try:
+            payload = legacy_order_job_payload(job)
+        except Exception as e:
+            logger.error(
+                f"Не удалось разобрать задачу {job.id}: {e} <migrate_legacy_order_jobs>"
+            )
+            continue
+        if payload is None:
+            continue
+
+        order_id, kind, params = payload
+        scheduler_manager.scheduler.modify_job(
+            job.id, func=run_order_job, args=[order_id, kind], kwargs=params
         )
-        await rq.set_message(driver_tg_id, msg.message_id, msg.text)
-    except Exception as e:
-        logger.error(
-            f"Ошибка: {e} <scheduled_reminder_finish_trip>",
-            exc_info=True,
+        migrated += 1
+
+    if migrated:
+        logger.info(
+            f"Задачи переведены на формат (ID заказа, вид): {migrated} <migrate_legacy_order_jobs>"
         )
-    finally:
-        # Закрытие сессии бота
-        if bot and bot.session:
-            await bot.session.close()
+    return migrated
+
+
+async def schedule_order_timeout(
+    order_id: int, group_chat_id: str, user_id: int, client_id: int
+) -> None:
+    """Планирует автоотмену заказа через 30 минут, если водитель не найдется."""
+    await order_timers.schedule(
+        ORDER_TIMEOUT,
+        order_id,
+        ORDER_TIMEOUT_SECONDS,
+        {
+            "order_id": order_id,
+            "group_chat_id": group_chat_id,
+            "user_id": user_id,
+            "client_id": client_id,
+        },
+    )
+
+
+async def cancel_order_timeout(order_id: int) -> None:
+    await order_timers.cancel(ORDER_TIMEOUT, order_id)
+
+
+async def order_timeout_fired(payload: dict) -> None:
+    await scheduled_delete_message_in_group(**payload)
 
 
 async def scheduled_delete_message_in_group(
@@ -165,27 +399,47 @@ async def scheduled_delete_message_in_group(
     user_id: int,
     client_id: int,
 ) -> None:
-    bot = None  # Инициализация переменной для бота
-    try:
-        # Создаем экземпляр бота
-        bot = Bot(token=os.getenv("TOKEN_MAIN"))
+    """
+    Автоматически отменяет заказ, для которого не нашелся водитель.
+
+    Ошибки БД и Telegram не перехватываются: таймер остается
+    неподтвержденным и срабатывает повторно после аренды. Отмена
+    и уведомление клиента выполняются в одной единице работы, поэтому
+    повтор либо застает заказ уже отмененным, либо выполняет отмену целиком.
+    """
+    async with rq.unit_of_work() as session:
+        # Таймер может сработать повторно или после того, как заказ
+        # продолжил оформление (водитель принят клиентом, поездка и т.д.)
+        order = await rq.get_order_by_id(order_id, session=session)
+        if order is None or order.status_id not in (3, 4, 10, 13):
+            return
 
-        # Получение ID сообщения по тексту
-        msg_id = await rq.get_message_id_by_text(f"Заказ №{order_id}")
+        # Общий экземпляр бота процесса
+        bot = bot_registry.get()
+
+        # Получение ID сообщения о заказе в группе
+        msg_id = await rq.get_order_message_id(group_chat_id, order_id)
         if msg_id is not None:
-            await bot.delete_message(chat_id=group_chat_id, message_id=msg_id)
-            await rq.delete_certain_message_from_db(msg_id)
+            try:
+                await bot.delete_message(chat_id=group_chat_id, message_id=msg_id)
+            except TelegramBadRequest as e:
+                # Сообщение уже удалено (например, при прошлой попытке)
+                logger.warning(
+                    f"Сообщение о заказе {order_id} не удалено: {e} <scheduled_delete_message_in_group>"
+                )
+            await rq.delete_order_messages_from_db(group_chat_id, order_id)
 
         # Получение ID водителя по заказу
-        driver_id = await rq.get_latest_driver_id_by_order_id(order_id)
+        driver_id = await rq.get_latest_driver_id_by_order_id(order_id, session=session)
 
         # Установка статуса заказа и истории
-        await rq.set_status_order(client_id, order_id, 8)
+        await rq.set_status_order(client_id, order_id, 8, session=session)
         await rq.set_order_history(
             order_id,
             driver_id,
             "отменен",
             "причина отказа: Автоматическая отмена заказа (водитель не был найден)",
+            session=session,
         )
 
         # Отправка уведомления пользователю
@@ -194,15 +448,9 @@ async def scheduled_delete_message_in_group(
             text=f"🚫К сожалению, водителя для заказа №{order_id} не нашли!\nПопробуйте оформить новый заказ позже или обратитесь в службу поддержки",
         )
         await rq.set_message(user_id, msg.message_id, msg.text)
-    except Exception as e:
-        logger.error(
-            f"Ошибка для user_id {user_id}: {e} <scheduled_delete_message_in_group>",
-            exc_info=True,
-        )
-    finally:
-        # Закрытие сессии бота
-        if bot and bot.session:
-            await bot.session.close()
+
+
+order_timers.register(ORDER_TIMEOUT, order_timeout_fired)
 
 
 async def send_message(message: Message, user_id: int, text: str):
@@ -443,40 +691,43 @@ async def delete_messages(
     message: Message, messages_to_delete: list, for_admin: bool = False
 ) -> bool:
     """
-    Удаляет список сообщений из чата.
+    Удаляет список сообщений из чатов пакетами через метод deleteMessages
+    (до 100 сообщений за запрос).
 
     Returns:
         bool: При успешном удалении сообщения возвращает True, иначе False
     """
     try:
-        # Extract message_id and user_id safely
-        message_ids = []
-        message_user_ids = []
+        # Группируем ID сообщений по чатам
+        chat_messages: dict[int, list[int]] = {}
 
         for msg in messages_to_delete:
             try:
-                message_ids.append(msg.message_id)
-                message_user_ids.append(msg.user_id)
+                chat_messages.setdefault(msg.user_id, []).append(msg.message_id)
             except AttributeError as e:
                 logger.warning(
                     f"Сообщение не содержит необходимых атрибутов (message_id или user_id): {e} <delete_messages>"
                 )
                 continue  # Пропускаем это сообщение
 
-        # Проходим по обоим спискам одновременно
-        for msg_id, user_id in zip(message_ids, message_user_ids):
-            try:
-                await message.bot.delete_message(
-                    chat_id=user_id, message_id=msg_id
-                )  # Удаляем сообщение
-            except Exception as e:
-                logger.error(
-                    f"Ошибка при удалении сообщения {msg_id} из чата {user_id} для пользователя {user_id}: {e} <delete_messages>"
-                )
+        is_success = True
+        for chat_id, message_ids in chat_messages.items():
+            message_ids = sorted(set(message_ids))
+            for i in range(0, len(message_ids), DELETE_MESSAGES_CHUNK_SIZE):
+                chunk = message_ids[i : i + DELETE_MESSAGES_CHUNK_SIZE]
+                try:
+                    await message.bot.delete_messages(
+                        chat_id=chat_id, message_ids=chunk
+                    )
+                except Exception as e:
+                    is_success = False
+                    logger.error(
+                        f"Ошибка при удалении {len(chunk)} сообщений из чата {chat_id}: {e} <delete_messages>"
+                    )
 
-        return True
+        return is_success
     except Exception as e:
-        logger.error(f"Общая ошибка для пользователя {user_id}: {e} <delete_messages>")
+        logger.error(f"Общая ошибка при удалении сообщений: {e} <delete_messages>")
         return False
 
 
@@ -511,6 +762,24 @@ async def delete_messages_from_chat(
         )
 
 
+async def delete_messages_from_chats(
+    user_ids: list[int], message: Message, for_admin: bool = False
+) -> None:
+    """
+    Очищает чаты нескольких пользователей параллельно,
+    ограничивая число одновременно очищаемых чатов.
+
+    Returns:
+        None
+    """
+
+    async def cleanup(user_id: int):
+        async with chat_cleanup_semaphore:
+            await delete_messages_from_chat(user_id, message, for_admin)
+
+    await asyncio.gather(*(cleanup(user_id) for user_id in dict.fromkeys(user_ids)))
+
+
 async def ban_user(user_id: int, message: Message) -> None:
     """
     Блокирует пользователя в групповом чате.
@@ -1871,6 +2140,10 @@ async def get_address(location_info):
 
 
 async def search_location(latitude: float, longitude: float) -> str:
+    cached_address = await geo_cache.get_reverse(latitude, longitude)
+    if cached_address is not None:
+        return cached_address
+
     api_token = os.getenv("DADATA_API_TOKEN")
     if api_token is None:
         logger.error("Отсутствует ключ API (DADATA_API_TOKEN) <geocode_address>")
@@ -1888,88 +2161,208 @@ async def search_location(latitude: float, longitude: float) -> str:
         "count": 1,  # Получаем только один результат
     }
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, json=data) as response:
-            if response.status == 200:
-                result = await response.json()
-                if result and result["suggestions"]:
-                    address = result["suggestions"][0]["data"]
-                    street = address.get("street", "")
-                    house_number = address.get("house", "")
-
-                    if street and house_number:
-                        full_address = f"{street} {house_number}".strip()
-                    elif street:
-                        full_address = street.strip()
-                    else:
-                        full_address = "Адрес не найден"
-
-                    return full_address
-                else:
-                    return "Адрес не найден"
+    try:
+        response = await http_client.request(
+            "dadata_geolocate", "POST", url, headers=headers, json=data
+        )
+    except Exception as e:
+        logger.error(f"Сервис недоступен: {e} <search_location>")
+        return "Ошибка при получении адреса: сервис недоступен"
+
+    if response.status == 200:
+        result = response.data
+        if result and result["suggestions"]:
+            address = result["suggestions"][0]["data"]
+            street = address.get("street", "")
+            house_number = address.get("house", "")
+
+            if street and house_number:
+                full_address = f"{street} {house_number}".strip()
+            elif street:
+                full_address = street.strip()
             else:
-                return f"Ошибка при получении адреса: статус {response.status}"
+                full_address = "Адрес не найден"
+                return full_address
+
+            await geo_cache.set_reverse(latitude, longitude, full_address)
+            return full_address
+        else:
+            return "Адрес не найден"
+    else:
+        return f"Ошибка при получении адреса: статус {response.status}"
 
 
 async def geocode_address(address: str) -> tuple[str, str]:
-    async with aiohttp.ClientSession() as session:
-        api_token = os.getenv("DADATA_API_TOKEN")
-        if api_token is None:
-            logger.error("Отсутствует ключ API (DADATA_API_TOKEN) <geocode_address>")
-            return
+    cached_info = await geo_cache.get_forward(address)
+    if cached_info is not None:
+        return cached_info
 
-        secret_token = os.getenv("DADATA_SECRET_TOKEN")
-        if secret_token is None:
-            logger.error("Отсутствует ключ API (DADATA_SECRET_TOKEN) <geocode_address>")
-            return
+    api_token = os.getenv("DADATA_API_TOKEN")
+    if api_token is None:
+        logger.error("Отсутствует ключ API (DADATA_API_TOKEN) <geocode_address>")
+        return
 
-        url = "https://cleaner.dadata.ru/api/v1/clean/address"
-        headers = {
-            "Content-Type": "application/json",
-            "Accept": "application/json",
-            "Authorization": f"Token {api_token}",
-            "X-Secret": secret_token,
-        }
-        data = [address]
-
-        async with session.post(url, headers=headers, json=data) as response:
-            if response.status == 200:
-                result = await response.json()
-                if result:
-                    latitude = result[0].get("geo_lat", "N/A")
-                    longitude = result[0].get("geo_lon", "N/A")
-                    street = result[0].get("street_with_type", "N/A")
-                    if street is None:
-                        street = result[0].get("settlement_with_type", "N/A")
-
-                    house_number = result[0].get("house", "N/A")
-                    house_number = house_number if house_number != None else "-"
-
-                    city = result[0].get("city", "N/A")
-                    city = city if city != None else "-"
-
-                    if street == None:
-                        return_info = ("Адрес не найден.", "Адрес не найден.")
-                    else:
-                        return_info = (
-                            f"{latitude},{longitude}",
-                            f"{street}, {house_number}, {city}",
-                        )
-                else:
-                    return_info = ("Адрес не найден.", "Адрес не найден.")
+    secret_token = os.getenv("DADATA_SECRET_TOKEN")
+    if secret_token is None:
+        logger.error("Отсутствует ключ API (DADATA_SECRET_TOKEN) <geocode_address>")
+        return
+
+    url = "https://cleaner.dadata.ru/api/v1/clean/address"
+    headers = {
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+        "Authorization": f"Token {api_token}",
+        "X-Secret": secret_token,
+    }
+    data = [address]
+
+    try:
+        response = await http_client.request(
+            "dadata_clean", "POST", url, headers=headers, json=data
+        )
+    except Exception as e:
+        logger.error(f"Сервис недоступен: {e} <geocode_address>")
+        return (
+            "Ошибка при запросе геокодирования.",
+            "Ошибка при запросе геокодирования.",
+        )
 
-                return return_info
+    if response.status == 200:
+        result = response.data
+        if result:
+            latitude = result[0].get("geo_lat", "N/A")
+            longitude = result[0].get("geo_lon", "N/A")
+            street = result[0].get("street_with_type", "N/A")
+            if street is None:
+                street = result[0].get("settlement_with_type", "N/A")
+
+            house_number = result[0].get("house", "N/A")
+            house_number = house_number if house_number != None else "-"
+
+            city = result[0].get("city", "N/A")
+            city = city if city != None else "-"
+
+            if street == None:
+                return_info = ("Адрес не найден.", "Адрес не найден.")
             else:
-                return (
-                    "Ошибка при запросе геокодирования.",
-                    "Ошибка при запросе геокодирования.",
+                return_info = (
+                    f"{latitude},{longitude}",
+                    f"{street}, {house_number}, {city}",
                 )
+                await geo_cache.set_forward(address, return_info)
+        else:
+            return_info = ("Адрес не найден.", "Адрес не найден.")
 
+        return return_info
+    else:
+        return (
+            "Ошибка при запросе геокодирования.",
+            "Ошибка при запросе геокодирования.",
+        )
+
+
+class EstimatedRoute(tuple):
+    """
+    Результат send_route, рассчитанный локальной оценкой (без GraphHopper).
+    Распаковывается так же, как обычный результат: (расстояние, время, цена).
+    """
+
+    is_estimate = True
+
+
+def format_route(distance_meters: float, total_time_minutes: int):
+    """
+    Форматирует расстояние и время маршрута и рассчитывает цену поездки.
+
+    Returns:
+        Кортеж (расстояние, время в пути, цена).
+    """
+    kilometers = math.ceil(distance_meters // 1000)  # Полные километры
+
+    # Определяем расстояние
+    if distance_meters < 0:
+        total_distance = f"{math.ceil(distance_meters)} м"
+    else:
+        meters = math.ceil(distance_meters % 1000)  # Остаток в метрах
+        if kilometers > 0:
+            total_distance = f"{kilometers} км, {meters} м"
+        else:
+            total_distance = f"{meters} м"
+
+    hours = total_time_minutes // 60
+    minutes = total_time_minutes % 60
 
-async def send_route(start_coords: str, end_coords: str):
+    # Форматируем время с учетом склонений
+    if hours > 0:
+        if hours == 1:
+            total_time = f"{hours} час, {minutes} мин"
+        elif hours in [2, 3, 4]:
+            total_time = f"{hours} часа, {minutes} мин"
+        else:
+            total_time = f"{hours} часов, {minutes} мин"
+    else:
+        total_time = f"{minutes} мин"
+
+    # Определение цены
+    price = 0
+    if kilometers < 7:
+        price = 700
+    elif kilometers > 7:
+        price = kilometers * 100
+
+    return total_distance, total_time, price
+
+
+def estimate_route(
+    start_coords: Coord | str, end_coords: Coord | str
+) -> EstimatedRoute | None:
+    """
+    Мгновенная оценка расстояния, времени и цены поездки без внешнего API.
+
+    Returns:
+        EstimatedRoute или None, если координаты не удалось разобрать.
+    """
+    try:
+        distance_meters, total_time_minutes = route_estimator.estimate(
+            start_coords, end_coords
+        )
+        return EstimatedRoute(
+            format_route(distance_meters, math.ceil(total_time_minutes))
+        )
+    except Exception as e:
+        logger.error(
+            f"Ошибка оценки маршрута {start_coords} -> {end_coords}: {e} <estimate_route>"
+        )
+        return None
+
+
+async def send_route(start_coords: Coord | str, end_coords: Coord | str):
+    """
+    Возвращает расстояние, время и цену поездки (через кэш маршрутов).
+
+    Если GraphHopper недоступен или превышена квота, возвращает
+    локальную оценку маршрута (EstimatedRoute).
+    """
+    try:
+        # Единый формат "широта,долгота" для ключа кэша и запроса к API
+        start_coords = str(Coord.parse(start_coords))
+        end_coords = str(Coord.parse(end_coords))
+    except (AttributeError, ValueError):
+        pass  # Некорректные координаты обработает request_route
+
+    result = await route_cache.get_or_fetch(start_coords, end_coords, request_route)
+    if result is ROUTE_SERVICE_UNAVAILABLE:
+        logger.warning(
+            "GraphHopper недоступен, используется оценка маршрута <send_route>"
+        )
+        return estimate_route(start_coords, end_coords)
+    return result
+
+
+async def request_route(start_coords: str, end_coords: str):
     graphhopper_key = os.getenv("GRAPHHOPPER_API_KEY")
     if graphhopper_key is None:
-        logger.error("Отсутствует ключ API (GRAPHHOPPER_API_KEY) <send_route>")
+        logger.error("Отсутствует ключ API (GRAPHHOPPER_API_KEY) <request_route>")
         return
 
     params = {
@@ -1985,59 +2378,38 @@ async def send_route(start_coords: str, end_coords: str):
 
     url = "https://graphhopper.com/api/1/route"
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, params=params) as response:
-            if response.status == 200:
-                data = await response.json()
-
-                if data.get("paths"):
-                    distance_meters = data["paths"][0].get("distance", 0)
-
-                    kilometers = math.ceil(distance_meters // 1000)  # Полные километры
-
-                    # Определяем расстояние
-                    if distance_meters < 0:
-                        total_distance = f"{math.ceil(distance_meters)} м"
-                    else:
-                        meters = math.ceil(distance_meters % 1000)  # Остаток в метрах
-                        if kilometers > 0:
-                            total_distance = f"{kilometers} км, {meters} м"
-                        else:
-                            total_distance = f"{meters} м"
-
-                    total_time_milliseconds = data["paths"][0].get("time", 0)
-                    total_time_minutes = math.ceil(total_time_milliseconds / 60000)
-
-                    hours = total_time_minutes // 60
-                    minutes = total_time_minutes % 60
-
-                    # Форматируем время с учетом склонений
-                    if hours > 0:
-                        if hours == 1:
-                            total_time = f"{hours} час, {minutes} мин"
-                        elif hours in [2, 3, 4]:
-                            total_time = f"{hours} часа, {minutes} мин"
-                        else:
-                            total_time = f"{hours} часов, {minutes} мин"
-                    else:
-                        total_time = f"{minutes} мин"
-
-                    # Определение цены
-                    price = 0
-                    if kilometers < 7:
-                        price = 700
-                    elif kilometers > 7:
-                        price = kilometers * 100
-
-                    return total_distance, total_time, price
-                else:
-                    return None, None, "Маршрут не найден. Проверьте координаты."
-            else:
-                return (
-                    None,
-                    None,
-                    f"Ошибка при получении маршрута: статус {response.status}.",
-                )
+    try:
+        response = await http_client.request(
+            "graphhopper_route", "GET", url, params=params
+        )
+    except Exception as e:
+        logger.error(f"Сервис недоступен: {e} <request_route>")
+        return ROUTE_SERVICE_UNAVAILABLE
+
+    if response.status == 200:
+        data = response.data
+
+        if data.get("paths"):
+            distance_meters = data["paths"][0].get("distance", 0)
+            total_time_milliseconds = data["paths"][0].get("time", 0)
+            total_time_minutes = math.ceil(total_time_milliseconds / 60000)
+
+            total_distance, total_time, price = format_route(
+                distance_meters, total_time_minutes
+            )
+            return total_distance, total_time, price
+        else:
+            return None, None, "Маршрут не найден. Проверьте координаты."
+    elif response.status == 429 or response.status >= 500:
+        # Превышена квота или сбой сервиса
+        logger.error(f"GraphHopper ответил статусом {response.status} <request_route>")
+        return ROUTE_SERVICE_UNAVAILABLE
+    else:
+        return (
+            None,
+            None,
+            f"Ошибка при получении маршрута: статус {response.status}.",
+        )
 
 
 async def calculate_time_diff(order_submission_time, timezone="Etc/GMT-7"):
@@ -2078,6 +2450,38 @@ async def calculate_time_diff(order_submission_time, timezone="Etc/GMT-7"):
         return None
 
 
+def parse_submission_time(
+    submission_time: str,
+    now: datetime | None = None,
+    timezone: str = "Etc/GMT-7",
+) -> datetime | None:
+    """
+    Разбирает время подачи заказа в формате "%d-%m %H:%M" (без года).
+
+    Из прошлого, текущего и следующего года выбирается дата, ближайшая
+    к now и не позже now + 5 дней (предзаказы принимаются не дальше чем
+    на 5 дней вперед): "02-01 10:00", созданное 30 декабря, — это январь
+    следующего года.
+
+    Returns:
+        Время с часовым поясом или None, если строка не содержит времени.
+    """
+    tz = pytz.timezone(timezone)
+    if now is None:
+        now = datetime.now(tz)
+    candidates = []
+    for year in (now.year - 1, now.year, now.year + 1):
+        try:
+            moment = tz.localize(
+                datetime.strptime(f"{submission_time} {year}", "%d-%m %H:%M %Y")
+            )
+        except (TypeError, ValueError):
+            continue  # Не время (например, "В ближайшее время") или 29 февраля
+        if moment <= now + timedelta(days=5):
+            candidates.append(moment)
+    return min(candidates, key=lambda moment: abs(moment - now), default=None)
+
+
 async def calculate_new_time_by_current_time(
     total_time: str, with_add_time: bool = True
 ):
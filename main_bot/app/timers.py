@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+TimerHandler = Callable[[dict[str, Any]], Awaitable[None]]
+
+# Автоотмена заказа, для которого не нашелся водитель
+ORDER_TIMEOUT = "order_timeout"
+ORDER_TIMEOUT_SECONDS = 30 * 60
+
+# Публикация заказа в группе, если волновое распределение не завершилось
+# (например, процесс остановился посреди волны)
+DISPATCH_ESCALATE = "dispatch_escalate"
+
+# Забирает до ARGV[2] просроченных таймеров и продлевает их срок на время
+# обработки (аренда): если процесс упадет, таймер сработает повторно
+CLAIM_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(due) do
+    redis.call('ZADD', KEYS[1], ARGV[3], member)
+end
+return due
+"""
+
+# Подтверждает обработку, только если таймер не был перепланирован
+ACK_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if score and tonumber(score) == tonumber(ARGV[2]) then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    redis.call('HDEL', KEYS[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+
+class TimerWheel:
+    """
+    Короткие таймеры (тайм-ауты заказов) в отсортированном множестве Redis.
+
+    Планирование и отмена — одна операция ZADD/ZREM (O(log n)) вместо
+    записи задачи в БД планировщика. Один опрашивающий цикл забирает
+    просроченные таймеры пачками. Гарантия — «хотя бы один раз»: таймер
+    удаляется только после успешного обработчика, поэтому обработчики
+    должны быть идемпотентными. Долгие задачи (напоминания о предзаказах)
+    остаются в APScheduler.
+    """
+
+    def __init__(
+        self,
+        redis_url: str = "redis://localhost:6379/0",
+        prefix: str = "timers",
+        poll_interval: float = 1.0,
+        batch_size: int = 100,
+        lease: float = 60.0,
+    ):
+        self.redis_url = redis_url
+        self.due_key = f"{prefix}:due"
+        self.payload_key = f"{prefix}:payload"
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.lease = lease  # Через сколько секунд повторить необработанный таймер
+        self.logger = logger
+        self._handlers: dict[str, TimerHandler] = {}
+        self._redis: Redis | None = None
+        self._claim = None
+        self._ack = None
+        self._poll_task: asyncio.Task | None = None
+
+    def _get_redis(self) -> Redis:
+        if self._redis is None:
+            self._redis = Redis.from_url(self.redis_url)
+            self._claim = self._redis.register_script(CLAIM_SCRIPT)
+            self._ack = self._redis.register_script(ACK_SCRIPT)
+        return self._redis
+
+    @staticmethod
+    def _member(kind: str, key: int | str) -> str:
+        return f"{kind}:{key}"
+
+    def register(self, kind: str, handler: TimerHandler) -> None:
+        self._handlers[kind] = handler
+
+    async def schedule(
+        self, kind: str, key: int | str, delay: float, payload: dict[str, Any]
+    ) -> bool:
+        """
+        Планирует (или перепланирует) таймер kind:key через delay секунд.
+
+        Args:
+            payload: Данные для обработчика (сериализуются в JSON).
+        """
+        member = self._member(kind, key)
+        try:
+            async with self._get_redis().pipeline(transaction=True) as pipe:
+                pipe.hset(self.payload_key, member, json.dumps(payload))
+                pipe.zadd(self.due_key, {member: time.time() + delay})
+                await pipe.execute()
+            return True
+        except Exception as e:
+            self.logger.error(
+                f"Не удалось запланировать таймер {member}: {e} <schedule>"
+            )
+            return False
+
+    async def cancel(self, kind: str, key: int | str) -> bool:
+        """
+        Returns:
+            True, если таймер был запланирован и удален.
+        """
+        member = self._member(kind, key)
+        try:
+            async with self._get_redis().pipeline(transaction=True) as pipe:
+                pipe.zrem(self.due_key, member)
+                pipe.hdel(self.payload_key, member)
+                removed, _ = await pipe.execute()
+            return bool(removed)
+        except Exception as e:
+            self.logger.error(f"Не удалось отменить таймер {member}: {e} <cancel>")
+            return False
+
+    async def start(self) -> None:
+        if self._poll_task is None or self._poll_task.done():
+            self._poll_task = asyncio.create_task(self._poll(), name="timer-wheel")
+
+    async def stop(self) -> None:
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            try:
+                await self._poll_task
+            except asyncio.CancelledError:
+                pass
+            self._poll_task = None
+
+    async def _poll(self) -> None:
+        while True:
+            try:
+                fired = await self.fire_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Ошибка опроса таймеров: {e} <_poll>")
+                fired = 0
+            if fired < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def fire_due(self) -> int:
+        """
+        Забирает пачку просроченных таймеров и вызывает их обработчики.
+
+        Returns:
+            Число забранных таймеров.
+        """
+        redis = self._get_redis()
+        now = time.time()
+        lease_until = now + self.lease
+        members = await self._claim(
+            keys=[self.due_key], args=[now, self.batch_size, lease_until]
+        )
+        if not members:
+            return 0
+
+        members = [member.decode() for member in members]
+        payloads = await redis.hmget(self.payload_key, members)
+        await asyncio.gather(
+            *(
+                self._fire(member, payload, lease_until)
+                for member, payload in zip(members, payloads)
+            )
+        )
+        return len(members)
+
+    async def _fire(self, member: str, payload: bytes | None, lease_until: float):
+        kind = member.split(":", 1)[0]
+        handler = self._handlers.get(kind)
+        if handler is None or payload is None:
+            self.logger.error(f"Таймер {member} без обработчика или данных <_fire>")
+            await self._ack(
+                keys=[self.due_key, self.payload_key], args=[member, lease_until]
+            )
+            return
+
+        try:
+            await handler(json.loads(payload))
+        except Exception as e:
+            # Таймер остается в множестве и сработает снова после аренды
+            self.logger.error(f"Ошибка обработчика таймера {member}: {e} <_fire>")
+            return
+
+        await self._ack(
+            keys=[self.due_key, self.payload_key], args=[member, lease_until]
+        )
+
+
+order_timers = TimerWheel(
+    redis_url=os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+    poll_interval=float(os.getenv("TIMER_POLL_INTERVAL", "1")),
+    batch_size=int(os.getenv("TIMER_BATCH_SIZE", "100")),
+)
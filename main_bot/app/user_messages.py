@@ -81,6 +81,9 @@ def help_text(role_id: int):
             "    __или__\n"
             "    Использовать команду /current\\_orders\n"
             '2\\) Нажать на _\\"Перейти к заказу №\\<номер заказа, который вы хотите отменить\\>\\"_"\n\n'
+            "*Где сейчас больше заказов\\?*\n"
+            "Используй команду /hot\\_zones — бот покажет зоны рядом с тобой, где в это время чаще всего заказывают такси\\. "
+            "Для этого нужно быть на линии и делиться трансляцией геопозиции\n\n"
             "*Как работает система кошелька\\?*\n"
             "Для возможности принимать заказы необходимы монеты\n"
             "Если в вашем кошельке 0 и меньше монет, то доступ к заказам будет закрыт\n"
@@ -250,6 +253,22 @@ def local_point_text():
     )
 
 
+def out_of_service_area_text():
+    return "Эта точка вне зоны обслуживания (Новосибирск). Укажите другой адрес:"
+
+
+def reconcile_report_text(removed: list, created: list, unrecoverable: list):
+    lines = ["Сверка задач планировщика с заказами:"]
+    if removed:
+        lines.append(f"Удалены задачи завершенных заказов: {', '.join(removed)}")
+    if created:
+        lines.append(f"Восстановлены задачи: {', '.join(created)}")
+    if unrecoverable:
+        orders = ", ".join(f"№{order_id}" for order_id in unrecoverable)
+        lines.append(f"Нет данных для восстановления задач заказов: {orders}")
+    return "\n".join(lines)
+
+
 def reject_client_comment_text(order_id: int):
     return f"Почему отказались от заказа №{order_id}?\nЕсли нет подходящего пункта, напишите причину сами"
 
@@ -0,0 +1,86 @@
+"""
+Бенчмарк задержки «задачи планировщика»: новый Bot на каждый запуск
+против общего экземпляра из реестра ботов.
+
+Каждая итерация имитирует задачу-напоминание одним запросом getMe.
+Запуск из каталога main_bot:
+
+    BENCH_BOT_TOKEN=123:abc python -m benchmarks.bench_bot_session --runs 50
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+BENCH_TOKEN = os.getenv("BENCH_BOT_TOKEN")
+if not BENCH_TOKEN:
+    sys.exit("Не задана переменная BENCH_BOT_TOKEN")
+
+from aiogram import Bot
+
+from app.bot_registry import BotRegistry
+
+
+async def job_with_new_bot() -> None:
+    bot = Bot(token=BENCH_TOKEN)
+    try:
+        await bot.get_me()
+    finally:
+        await bot.session.close()
+
+
+async def job_with_registry(registry: BotRegistry) -> None:
+    bot = registry.get("BENCH_BOT_TOKEN")
+    await bot.get_me()
+
+
+async def measure(job, runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await job()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def percentile(timings: list[float], q: float) -> float:
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def main(runs: int) -> None:
+    registry = BotRegistry()
+
+    # Прогрев: первое соединение общего бота не учитываем
+    await job_with_registry(registry)
+
+    results = {
+        "новый Bot на задачу": await measure(job_with_new_bot, runs),
+        "общий Bot из реестра": await measure(
+            lambda: job_with_registry(registry), runs
+        ),
+    }
+    await registry.close()
+
+    print(f"\n{'вариант':<26}{'медиана, мс':>14}{'p95, мс':>12}")
+    for name, timings in results.items():
+        print(
+            f"{name:<26}{statistics.median(timings):>14.1f}"
+            f"{percentile(timings, 0.95):>12.1f}"
+        )
+
+    saved = statistics.median(results["новый Bot на задачу"]) - statistics.median(
+        results["общий Bot из реестра"]
+    )
+    print(f"\nЭкономия на задачу (медиана): {saved:.1f} мс")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.runs))
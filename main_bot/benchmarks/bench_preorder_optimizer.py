@@ -0,0 +1,157 @@
+"""
+Бенчмарк пакетного распределения предзаказов (VROOM) на синтетических данных
+против распределения «кто первый нажал» и жадного выбора ближайшего водителя.
+
+Предзаказы и водители случайно разбросаны по Новосибирску, время подачи —
+равномерно в пределах горизонта. Для каждого размера выводятся время решения,
+число распределенных заказов и порожний пробег.
+Запуск из каталога main_bot:
+
+    python -m benchmarks.bench_preorder_optimizer --sizes 100 500 1000 5000
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from app.preorder_optimizer import (
+    DriverShift,
+    PreorderOptimizer,
+    PreorderTask,
+    road_matrix,
+)
+
+# Границы города: (широта, долгота) юго-западного и северо-восточного углов
+CITY_BOUNDS = ((54.93, 82.80), (55.12, 83.12))
+SPEED_KMH = 27.0
+
+
+def random_point(rng: random.Random) -> tuple[float, float]:
+    (south, west), (north, east) = CITY_BOUNDS
+    return rng.uniform(south, north), rng.uniform(west, east)
+
+
+def make_instance(
+    orders: int, drivers: int, horizon_hours: float, seed: int
+) -> tuple[list[PreorderTask], list[DriverShift]]:
+    rng = random.Random(seed)
+    tasks = []
+    for order_id in range(orders):
+        pickup = random_point(rng)
+        dropoff = random_point(rng)
+        trip = road_matrix(np.array([pickup]), np.array([dropoff]), SPEED_KMH)[0, 0]
+        tasks.append(
+            PreorderTask(
+                order_id=order_id,
+                pickup=pickup,
+                dropoff=dropoff,
+                pickup_at=rng.randint(0, int(horizon_hours * 3600)),
+                duration=int(trip) + 120,  # Посадка и высадка
+            )
+        )
+    shifts = [
+        DriverShift(tg_id=index, position=random_point(rng)) for index in range(drivers)
+    ]
+    return tasks, shifts
+
+
+def travel(origin: tuple[float, float], destination: tuple[float, float]) -> int:
+    return int(
+        road_matrix(np.array([origin]), np.array([destination]), SPEED_KMH)[0, 0]
+    )
+
+
+def greedy(
+    tasks: list[PreorderTask],
+    drivers: list[DriverShift],
+    slack: int,
+    nearest: bool,
+    rng: random.Random,
+) -> dict[int, int]:
+    """
+    Распределение по одному заказу в порядке времени подачи: случайному
+    свободному водителю («кто первый нажал») или ближайшему свободному.
+    """
+    positions = np.array([driver.position for driver in drivers])
+    free_at = np.zeros(len(drivers), dtype=np.int64)
+    assignments = {}
+    for task in sorted(tasks, key=lambda task: task.pickup_at):
+        to_pickup = road_matrix(positions, np.array([task.pickup]), SPEED_KMH)[:, 0]
+        feasible = np.flatnonzero(free_at + to_pickup <= task.pickup_at + slack)
+        if not feasible.size:
+            continue
+
+        if nearest:
+            index = int(feasible[np.argmin(to_pickup[feasible])])
+        else:
+            index = int(rng.choice(feasible))
+        assignments[task.order_id] = drivers[index].tg_id
+        free_at[index] = (
+            max(task.pickup_at, free_at[index] + to_pickup[index]) + task.duration
+        )
+        positions[index] = task.dropoff
+    return assignments
+
+
+def deadhead_km(
+    tasks: list[PreorderTask], drivers: list[DriverShift], assignments: dict[int, int]
+) -> float:
+    tasks_by_id = {task.order_id: task for task in tasks}
+    routes: dict[int, list[PreorderTask]] = {}
+    for order_id, tg_id in assignments.items():
+        routes.setdefault(tg_id, []).append(tasks_by_id[order_id])
+
+    seconds = 0
+    for driver in drivers:
+        position = driver.position
+        for task in sorted(routes.get(driver.tg_id, []), key=lambda t: t.pickup_at):
+            seconds += travel(position, task.pickup)
+            position = task.dropoff
+    return seconds * SPEED_KMH / 3600
+
+
+def main(sizes: list[int], drivers_ratio: float, horizon_hours: float) -> None:
+    optimizer = PreorderOptimizer(horizon_hours=horizon_hours, exploration_level=1)
+
+    print(
+        f"{'заказов':>8}{'водителей':>11}{'метод':>14}{'время, с':>11}"
+        f"{'распред.':>10}{'порожний, км':>14}{'км/заказ':>10}"
+    )
+    for size in sizes:
+        drivers_count = max(5, int(size * drivers_ratio))
+        tasks, drivers = make_instance(size, drivers_count, horizon_hours, seed=size)
+
+        runs = {}
+        started = time.perf_counter()
+        runs["vroom"] = (
+            optimizer.solve(tasks, drivers, SPEED_KMH),
+            time.perf_counter() - started,
+        )
+        for name, nearest in (("первый", False), ("ближайший", True)):
+            started = time.perf_counter()
+            result = greedy(
+                tasks, drivers, optimizer.pickup_slack, nearest, random.Random(size)
+            )
+            runs[name] = (result, time.perf_counter() - started)
+
+        for name, (assignments, elapsed) in runs.items():
+            km = deadhead_km(tasks, drivers, assignments)
+            per_order = km / len(assignments) if assignments else 0.0
+            print(
+                f"{size:>8}{drivers_count:>11}{name:>14}{elapsed:>11.2f}"
+                f"{len(assignments):>10}{km:>14.1f}{per_order:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100, 500, 1000, 2500, 5000]
+    )
+    parser.add_argument("--drivers-ratio", type=float, default=0.15)
+    parser.add_argument("--horizon", type=float, default=6.0)
+    args = parser.parse_args()
+
+    main(args.sizes, args.drivers_ratio, args.horizon)
@@ -2,6 +2,7 @@ import asyncio
 import logging
 import os
 import sys
+from datetime import datetime
 from logging.handlers import RotatingFileHandler
 
 from dotenv import load_dotenv
@@ -14,11 +15,22 @@ from aiogram.fsm.storage.redis import RedisStorage
 from app.handlers import handlers_router
 from app.commands import command_router
 from app.register import register_router
-from app.middleware import AntiFloodMiddleware
+from app.middleware import AntiFloodMiddleware, DbSessionMiddleware
 from app.database.models import async_main
 from app.database import requests as rq
+import app.support as sup
 from app.scheduler_manager import scheduler_manager
-
+from app.database.message_writer import message_writer
+from app.bot_registry import bot_registry
+from app.outbound import outbound_dispatcher
+from app.http_client import http_client
+from app.driver_index import driver_index
+from app.dispatch import order_dispatcher
+from app.preorder_optimizer import scheduled_optimize_preorders
+from app.heatmap import demand_heatmap, scheduled_refresh_heatmap
+from app.reconcile import scheduled_reconcile_order_jobs
+from app.timers import order_timers
+from app.broadcast import broadcast_engine
 
 async def main():
     """
@@ -36,29 +48,77 @@ async def main():
             )
             return
 
-        bot_token = Bot(token=token)
-
-        roles_list = [1, 2, 3]
-        await rq.send_restart_message(bot_token, roles_list)
+        # Бот поллинга переиспользуется задачами планировщика
+        bot_token = bot_registry.register(Bot(token=token))
 
         dp = Dispatcher()
 
         await scheduler_manager.start()  # Запускаем планировщик
+        sup.migrate_legacy_order_jobs()  # Задачи старого формата -> (ID, вид)
+        await http_client.start()  # Пул соединений к DaData и GraphHopper
+        await order_timers.start()  # Тайм-ауты заказов (автоотмена)
+        await broadcast_engine.start()  # Рассылки, созданные ботом администраторов
+        await driver_index.sync_online(await rq.get_online_driver_tg_ids())
+
+        # Периодическое пакетное распределение предзаказов
+        scheduler_manager.add_job(
+            scheduled_optimize_preorders,
+            "interval",
+            minutes=int(os.getenv("PREORDER_OPTIMIZER_INTERVAL_MINUTES", "10")),
+            id="preorder_optimizer",
+            replace_existing=True,
+        )
+
+        # Сверка задач с заказами: выполняет лидер сразу после старта и далее
+        # периодически (задачи завершенных заказов, потерянные предзаказы)
+        scheduler_manager.add_job(
+            scheduled_reconcile_order_jobs,
+            "interval",
+            minutes=int(os.getenv("ORDER_JOBS_RECONCILE_INTERVAL_MINUTES", "60")),
+            id="order_jobs_reconcile",
+            replace_existing=True,
+            next_run_time=datetime.now(),
+        )
+
+        # Тепловая карта спроса: снимок из Redis, затем досчет новых заказов
+        # лидером; остальные экземпляры подхватывают новые снимки сами
+        await demand_heatmap.start()
+        scheduler_manager.add_job(
+            scheduled_refresh_heatmap,
+            "interval",
+            minutes=int(os.getenv("HEATMAP_REFRESH_INTERVAL_MINUTES", "15")),
+            id="demand_heatmap",
+            replace_existing=True,
+            next_run_time=datetime.now(),
+        )
 
         storage = RedisStorage.from_url("redis://localhost:6379/0")
         dp.message.middleware.register(AntiFloodMiddleware(storage=storage))
+        dp.update.outer_middleware.register(DbSessionMiddleware())
 
         dp.include_router(handlers_router)
         dp.include_router(command_router)
         dp.include_router(register_router)
 
+        # Рассылка о перезагрузке идет в фоне с низким приоритетом и уступает
+        # ответам на обновления, которые начнут приходить после запуска поллинга
+        roles_list = [1, 2, 3]
+        restart_task = asyncio.create_task(
+            rq.send_restart_message(bot_token, roles_list), name="restart-message"
+        )
+
         try:
             await dp.start_polling(bot_token)
         except asyncio.CancelledError:  # Перехватываем CancelledError здесь
             logging.info("MAIN_Bot polling task cancelled.")
         finally:
-            await bot_token.session.close()
+            restart_task.cancel()  # Не отправленные до остановки уже не нужны
             await dp.storage.close()
+            await order_dispatcher.stop()  # Нераспределенные заказы — в группу
+            await order_timers.stop()
+            await broadcast_engine.stop()  # Прогресс сохранен в контрольных точках
+            await demand_heatmap.stop()
+            await outbound_dispatcher.stop()  # Останавливаем выдачу токенов отправки
 
             all_tasks = asyncio.all_tasks()
             current_task = asyncio.current_task()  # Получаем текущую задачу (main())
@@ -84,7 +144,10 @@ async def main():
     except Exception as e:
         logger.exception(f"MAIN_Bot: An unexpected error occurred: {e}")
     finally:
+        await message_writer.stop()  # Сбрасываем буфер журнала сообщений
         await scheduler_manager.shutdown()  # Останавливаем планировщик
+        await bot_registry.close()  # Закрываем сессии ботов
+        await http_client.close()  # Закрываем пул соединений внешних API
 
 
 if __name__ == "__main__":
@@ -0,0 +1,14 @@
+"""
+Модульные тесты бота. Модули импортируются как app.*, поэтому тесты
+запускаются из каталога main_bot:
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Модели создают engine при импорте; тесты к БД не подключаются
+os.environ.setdefault("SQLALCHEMY_URL", "sqlite+aiosqlite://")
@@ -0,0 +1,93 @@
+import asyncio
+
+from app import dispatch
+from app.dispatch import OrderDispatcher
+
+
+class FakeRedis:
+    async def hmget(self, key, fields):
+        return [None] * len(fields)  # Статистики предложений еще нет
+
+
+def make_dispatcher(monkeypatch, nearest, candidates, positions, seconds):
+    calls = {}
+
+    async def nearest_online_drivers(latitude, longitude, k=10, radius=3.0):
+        return nearest
+
+    async def get_dispatch_candidates(tg_ids):
+        calls["candidates"] = tg_ids
+        return [row for row in candidates if row[0] in tg_ids]
+
+    async def get_positions(tg_ids, max_age=None):
+        return {tg_id: positions[tg_id] for tg_id in tg_ids if tg_id in positions}
+
+    async def one_to_many(origins, destination):
+        calls["origins"] = origins
+        return [(0.0, seconds[origin], False) for origin in origins]
+
+    monkeypatch.setattr(
+        dispatch.driver_index, "nearest_online_drivers", nearest_online_drivers
+    )
+    monkeypatch.setattr(dispatch.driver_index, "get_positions", get_positions)
+    monkeypatch.setattr(dispatch.rq, "get_dispatch_candidates", get_dispatch_candidates)
+    monkeypatch.setattr(dispatch.eta_service, "one_to_many", one_to_many)
+
+    dispatcher = OrderDispatcher(wave_size=3)
+    dispatcher._redis = FakeRedis()
+    return dispatcher, calls
+
+
+def test_rank_skips_offered_drivers_and_prefers_faster_eta(monkeypatch):
+    dispatcher, calls = make_dispatcher(
+        monkeypatch,
+        nearest=[(1, 0.5), (2, 1.0), (3, 1.5)],
+        candidates=[(1, 10, 5.0), (2, 20, 5.0), (3, 30, 5.0)],
+        positions={2: (55.0, 83.0), 3: (55.1, 83.1)},
+        seconds={"55.0,83.0": 600.0, "55.1,83.1": 100.0},
+    )
+
+    ranked = asyncio.run(dispatcher._rank(55.0, 83.0, 2.0, exclude={1}))
+
+    assert calls["candidates"] == [2, 3]
+    assert ranked == [3, 2]
+
+
+def test_rank_breaks_eta_ties_by_rating(monkeypatch):
+    dispatcher, _ = make_dispatcher(
+        monkeypatch,
+        nearest=[(2, 1.0), (3, 1.5)],
+        candidates=[(2, 20, 3.0), (3, 30, 5.0)],
+        positions={2: (55.0, 83.0), 3: (55.1, 83.1)},
+        seconds={"55.0,83.0": 300.0, "55.1,83.1": 300.0},
+    )
+
+    assert asyncio.run(dispatcher._rank(55.0, 83.0, 2.0, exclude=set())) == [3, 2]
+
+
+def test_etas_give_drivers_without_position_the_slowest_eta(monkeypatch):
+    dispatcher, calls = make_dispatcher(
+        monkeypatch,
+        nearest=[(2, 1.0), (3, 1.5)],
+        candidates=[(2, 20, 5.0), (3, 30, 5.0)],
+        positions={3: (55.1, 83.1)},
+        seconds={"55.1,83.1": 900.0},
+    )
+
+    etas = asyncio.run(dispatcher._etas([2, 3], 55.0, 83.0))
+
+    assert calls["origins"] == ["55.1,83.1"]
+    assert etas == {2: 900.0, 3: 900.0}
+
+
+def test_rank_without_candidates_is_empty(monkeypatch):
+    dispatcher, calls = make_dispatcher(
+        monkeypatch,
+        nearest=[(1, 0.5)],
+        candidates=[],
+        positions={},
+        seconds={},
+    )
+
+    assert asyncio.run(dispatcher._rank(55.0, 83.0, 2.0, exclude=set())) == []
+    assert "origins" not in calls
@@ -0,0 +1,122 @@
+from datetime import datetime
+
+import pytest
+import pytz
+
+from app import heatmap
+from app.geo import Coord, geohash_bounds, geohash_encode
+from app.heatmap import DemandHeatmap, hour_of_week
+
+TIMEZONE = pytz.timezone("Etc/GMT-7")
+CENTER = Coord(55.03, 82.92)
+
+
+def local(year, month, day, hour=0, minute=0):
+    return TIMEZONE.localize(datetime(year, month, day, hour, minute))
+
+
+def cell_center(geohash):
+    south, west, north, east = geohash_bounds(geohash)
+    return (south + north) / 2, (west + east) / 2
+
+
+@pytest.fixture
+def cells():
+    # Ячейка точки CENTER и соседняя с ней с севера
+    home = geohash_encode(CENTER.lat, CENTER.lon, 6)
+    south, west, north, east = geohash_bounds(home)
+    latitude, longitude = cell_center(home)
+    neighbour = geohash_encode(latitude + (north - south), longitude, 6)
+    return home, neighbour
+
+
+def count(demand, geohash, moment):
+    return int(demand.counts[demand._rows[geohash[:6]], hour_of_week(moment)])
+
+
+def test_add_counts_preorder_by_submission_time(cells):
+    demand = DemandHeatmap()
+
+    # Предзаказ на 2 января, принятый 30 декабря, — январь следующего года
+    added = demand.add([(1, cells[0], "02-01 10:00", "30-12-2025 18:00")])
+
+    assert added == 1
+    assert count(demand, cells[0], local(2026, 1, 2, 10)) == 1
+    assert demand.last_order_id == 1
+
+
+def test_add_counts_immediate_order_by_creation_time(cells):
+    demand = DemandHeatmap()
+
+    added = demand.add([(1, cells[0], "10-06 В ближайшее время", "10-06-2025 12:30")])
+
+    assert added == 1
+    assert count(demand, cells[0], local(2025, 6, 10, 12)) == 1
+
+
+def test_add_waits_for_order_history(cells):
+    demand = DemandHeatmap(history_grace=600)
+    orders = [
+        (1, cells[0], "10-06 В ближайшее время", None),
+        (2, cells[0], "12-06 09:00", "10-06-2025 08:00"),
+    ]
+
+    assert demand.add(orders) == 0
+    assert demand.last_order_id == 0  # Оба заказа досчитаются позже
+
+
+def test_add_skips_order_without_history_after_grace(cells, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(heatmap.time, "monotonic", lambda: clock[0])
+    demand = DemandHeatmap(history_grace=600)
+    orders = [
+        (1, cells[0], "10-06 В ближайшее время", None),
+        (2, cells[0], "12-06 09:00", "10-06-2025 08:00"),
+    ]
+    assert demand.add(orders) == 0
+
+    clock[0] += 601
+    assert demand.add(orders) == 1
+    assert demand.last_order_id == 2
+    assert count(demand, cells[0], local(2025, 6, 12, 9)) == 1
+
+
+def test_add_skips_order_with_unparseable_creation_time(cells):
+    demand = DemandHeatmap()
+
+    added = demand.add([(1, cells[0], "10-06 В ближайшее время", "не дата")])
+
+    assert added == 0
+    assert demand.last_order_id == 1  # Заказ не задерживает следующие
+
+
+def test_hot_zones_orders_cells_by_demand(cells):
+    demand = DemandHeatmap()
+    home, neighbour = cells
+    demand.add(
+        [
+            (1, home, "10-06 12:00", "09-06-2025 10:00"),
+            (2, home, "10-06 12:10", "09-06-2025 10:00"),
+            (3, home, "10-06 12:20", "09-06-2025 10:00"),
+            (4, neighbour, "10-06 12:30", "09-06-2025 10:00"),
+        ]
+    )
+
+    # Соседний час недели тоже учитывается
+    zones = demand.hot_zones(CENTER, local(2025, 6, 17, 13))
+
+    centers = [center for center, _ in zones]
+    assert centers == [
+        Coord(*(round(value, 5) for value in cell_center(home))),
+        Coord(*(round(value, 5) for value in cell_center(neighbour))),
+    ]
+    # Среднее за час: заказы за три часа и одну неделю
+    assert [rate for _, rate in zones] == pytest.approx([1.0, 1 / 3])
+
+
+def test_hot_zones_without_demand(cells):
+    demand = DemandHeatmap()
+    demand.add([(1, cells[0], "10-06 12:00", "09-06-2025 10:00")])
+
+    assert demand.hot_zones(CENTER, local(2025, 6, 10, 18)) == []
+    assert demand.hot_zones(Coord(43.1, 131.9), local(2025, 6, 10, 12)) == []
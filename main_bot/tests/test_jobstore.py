@@ -0,0 +1,120 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from apscheduler.job import Job
+from apscheduler.jobstores.base import ConflictingIdError, JobLookupError
+from apscheduler.triggers.date import DateTrigger
+from sqlalchemy import create_engine
+
+from app.jobstore import WriteBehindJobStore
+
+RUN_AT = datetime(2025, 6, 10, 12, tzinfo=timezone.utc)
+
+
+def make_job(job_id, run_at=RUN_AT, args=()):
+    job = Job.__new__(Job)
+    job.__setstate__(
+        {
+            "version": 1,
+            "id": job_id,
+            "func": "builtins:print",
+            "trigger": DateTrigger(run_date=run_at, timezone=timezone.utc),
+            "executor": "default",
+            "args": tuple(args),
+            "kwargs": {},
+            "name": job_id,
+            "misfire_grace_time": 60,
+            "coalesce": True,
+            "max_instances": 1,
+            "next_run_time": run_at,
+        }
+    )
+    return job
+
+
+class FakeSQLStore:
+    """Таблица задач: как и SQLAlchemyJobStore, отдает новые объекты задач."""
+
+    def __init__(self, *jobs):
+        self.states = {job.id: job.__getstate__() for job in jobs}
+
+    def get_all_jobs(self):
+        jobs = []
+        for state in self.states.values():
+            job = Job.__new__(Job)
+            job.__setstate__(state)
+            jobs.append(job)
+        return jobs
+
+    def add_job(self, job):
+        if job.id in self.states:
+            raise ConflictingIdError(job.id)
+        self.states[job.id] = job.__getstate__()
+
+    def update_job(self, job):
+        if job.id not in self.states:
+            raise JobLookupError(job.id)
+        self.states[job.id] = job.__getstate__()
+
+    def remove_job(self, job_id):
+        if self.states.pop(job_id, None) is None:
+            raise JobLookupError(job_id)
+
+    def remove_all_jobs(self):
+        self.states.clear()
+
+
+@pytest.fixture
+def store():
+    store = WriteBehindJobStore(engine=create_engine("sqlite://"))
+    store._sql_store = FakeSQLStore()
+    yield store
+    store._writer.shutdown(wait=True)
+
+
+def job_ids(store):
+    return sorted(job.id for job in store.get_all_jobs())
+
+
+def test_reload_adds_jobs_of_other_instances(store):
+    store._sql_store = FakeSQLStore(make_job("1_remind_10"))
+
+    assert asyncio.run(store.reload()) == 1
+    assert job_ids(store) == ["1_remind_10"]
+
+
+def test_reload_removes_jobs_deleted_by_other_instances(store):
+    store._memory_store.add_job(make_job("1_remind_10"))
+
+    assert asyncio.run(store.reload()) == 1
+    assert job_ids(store) == []
+
+
+def test_reload_updates_job_with_changed_arguments(store):
+    # Время запуска то же, изменились только аргументы
+    store._memory_store.add_job(make_job("1_switch_order_status", args=(1,)))
+    store._sql_store = FakeSQLStore(make_job("1_switch_order_status", args=(2,)))
+
+    assert asyncio.run(store.reload()) == 1
+    assert store.lookup_job("1_switch_order_status").args == (2,)
+
+
+def test_reload_updates_job_with_changed_run_time(store):
+    store._memory_store.add_job(make_job("1_remind_10"))
+    later = RUN_AT + timedelta(hours=1)
+    store._sql_store = FakeSQLStore(make_job("1_remind_10", run_at=later))
+
+    assert asyncio.run(store.reload()) == 1
+    assert store.lookup_job("1_remind_10").next_run_time == later
+
+
+def test_reload_keeps_own_queued_writes(store):
+    store.add_job(make_job("1_remind_10"))
+    store.add_job(make_job("2_remind_20"))
+    store.remove_job("2_remind_20")
+
+    # Чтение идет после поставленных записей, поэтому расхождений нет
+    assert asyncio.run(store.reload()) == 0
+    assert job_ids(store) == ["1_remind_10"]
+    assert list(store._sql_store.states) == ["1_remind_10"]
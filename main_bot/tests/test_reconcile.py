@@ -0,0 +1,232 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+import pytz
+
+from app import reconcile
+from app import support as sup
+
+TIMEZONE = pytz.timezone("Etc/GMT-7")
+
+
+def stamp(moment):
+    return moment.strftime("%d-%m-%Y %H:%M")
+
+
+def minutes(moment):
+    return moment.replace(second=0, microsecond=0)
+
+
+class FakeScheduler:
+    def __init__(self, jobs):
+        self.jobs = {job.id: job for job in jobs}
+
+    def get_jobs(self):
+        return list(self.jobs.values())
+
+    def get_job(self, job_id):
+        return self.jobs.get(job_id)
+
+
+class FakeJobStore:
+    async def reload(self):
+        return 0
+
+
+class FakeSchedulerManager:
+    def __init__(self, jobs):
+        self.scheduler = FakeScheduler(jobs)
+        self.jobstore = FakeJobStore()
+
+    def remove_job(self, job_id):
+        return self.scheduler.jobs.pop(job_id, None) is not None
+
+
+class FakePipeline:
+    def __init__(self, members):
+        self.members = members
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def srem(self, key, *values):
+        self.members.difference_update(str(value).encode() for value in values)
+
+    def sadd(self, key, *values):
+        self.members.update(str(value).encode() for value in values)
+
+    async def execute(self):
+        return []
+
+
+class FakeRedis:
+    def __init__(self, *reported):
+        self.members = {str(order_id).encode() for order_id in reported}
+
+    async def smembers(self, key):
+        return set(self.members)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self.members)
+
+
+def order_job(order_id, job_id):
+    return SimpleNamespace(
+        id=job_id, func=sup.run_order_job, args=(order_id, sup.ORDER_JOB_START_TRIP)
+    )
+
+
+@pytest.fixture
+def setup(monkeypatch):
+    """Подменяет планировщик, выборку заказов и Redis отчета."""
+    state = SimpleNamespace(scheduled=[], rows=[], redis=FakeRedis())
+
+    def apply(jobs=(), rows=()):
+        manager = FakeSchedulerManager(list(jobs))
+        state.manager, state.rows = manager, list(rows)
+
+        def schedule_order_job(kind, order_id, run_date, job_id, **params):
+            state.scheduled.append((kind, order_id, run_date, job_id, params))
+            manager.scheduler.jobs[job_id] = order_job(order_id, job_id)
+
+        async def get_orders_for_job_reconciliation(order_ids):
+            return state.rows
+
+        monkeypatch.setattr(reconcile, "scheduler_manager", manager)
+        monkeypatch.setattr(reconcile.sup, "schedule_order_job", schedule_order_job)
+        monkeypatch.setattr(
+            reconcile.rq,
+            "get_orders_for_job_reconciliation",
+            get_orders_for_job_reconciliation,
+        )
+        monkeypatch.setattr(reconcile, "_redis", state.redis)
+        return state
+
+    return apply
+
+
+@pytest.mark.parametrize(
+    "lead_time, expected",
+    [
+        (timedelta(hours=48), ("8 часов", timedelta(minutes=470))),
+        (timedelta(hours=24, minutes=30), ("30 минут", timedelta(minutes=30))),
+        (timedelta(minutes=60), ("30 минут", timedelta(minutes=30))),
+        (timedelta(minutes=59), ("20 минут", timedelta(minutes=10))),
+        (timedelta(minutes=25), ("20 минут", timedelta(minutes=10))),
+        (timedelta(minutes=20), ("", timedelta(0))),
+    ],
+)
+def test_driver_remind_offset(lead_time, expected):
+    assert sup.driver_remind_offset(lead_time) == expected
+
+
+def test_driver_remind_date_uses_lead_time_at_acceptance():
+    arrival = TIMEZONE.localize(datetime(2025, 6, 12, 10))
+
+    assert reconcile.driver_remind_date(arrival, "10-06-2025 10:00") == (
+        arrival - timedelta(minutes=480)
+    )
+    assert reconcile.driver_remind_date(arrival, "12-06-2025 09:00") == (
+        arrival - timedelta(minutes=40)
+    )
+    assert reconcile.driver_remind_date(arrival, None) is None
+    assert reconcile.driver_remind_date(arrival, "не дата") is None
+
+
+def test_removes_jobs_of_finished_and_deleted_orders(setup):
+    state = setup(
+        jobs=[
+            order_job(1, "1_switch_order_status"),
+            order_job(2, "2_switch_order_status"),
+            order_job(3, "3_switch_order_status"),
+        ],
+        rows=[(1, 7, False, None, None, None), (2, 3, True, None, None, None)],
+    )
+
+    report = asyncio.run(reconcile.reconcile_order_jobs())
+
+    assert sorted(report.removed) == [
+        "1_switch_order_status",
+        "2_switch_order_status",
+        "3_switch_order_status",
+    ]
+    assert state.manager.scheduler.jobs == {}
+
+
+def test_restores_start_trip_and_reminder_of_preorder(setup):
+    now = datetime.now(TIMEZONE)
+    arrival = minutes(now + timedelta(hours=10))
+    accepted = now - timedelta(hours=38)
+    state = setup(rows=[(5, 14, False, 777, stamp(arrival), stamp(accepted))])
+
+    report = asyncio.run(reconcile.reconcile_order_jobs())
+
+    assert report.created == ["5_switch_order_status", "5_remind_777"]
+    assert state.scheduled == [
+        (
+            sup.ORDER_JOB_START_TRIP,
+            5,
+            arrival - timedelta(minutes=10),
+            "5_switch_order_status",
+            {},
+        ),
+        (
+            sup.ORDER_JOB_REMIND_DRIVER,
+            5,
+            arrival - timedelta(minutes=480),
+            "5_remind_777",
+            {"tg_id": 777},
+        ),
+    ]
+
+
+def test_does_not_repeat_a_reminder_whose_time_has_passed(setup):
+    now = datetime.now(TIMEZONE)
+    arrival = minutes(now + timedelta(hours=1))
+    accepted = now - timedelta(hours=30)  # Напоминание было за 8 часов до подачи
+    state = setup(rows=[(5, 14, False, 777, stamp(arrival), stamp(accepted))])
+
+    report = asyncio.run(reconcile.reconcile_order_jobs())
+
+    assert report.created == ["5_switch_order_status"]
+    assert [job_id for *_, job_id, _ in state.scheduled] == ["5_switch_order_status"]
+
+
+def test_reports_overdue_preorder_once(setup):
+    now = datetime.now(TIMEZONE)
+    arrival = minutes(now - timedelta(hours=1))
+    row = (5, 14, False, 777, stamp(arrival), stamp(now - timedelta(hours=30)))
+    state = setup(rows=[row, (6, 14, False, None, None, None)])
+
+    first = asyncio.run(reconcile.reconcile_order_jobs())
+    second = asyncio.run(reconcile.reconcile_order_jobs())
+
+    assert sorted(first.unrecoverable) == [5, 6]
+    assert state.scheduled == []
+    assert second.unrecoverable == []
+    assert not second
+
+
+def test_only_new_unrecoverable_forgets_closed_orders(monkeypatch):
+    redis = FakeRedis(1, 2)
+    monkeypatch.setattr(reconcile, "_redis", redis)
+
+    new = asyncio.run(reconcile.only_new_unrecoverable([1, 3], {1, 3}))
+
+    assert new == [3]
+    assert redis.members == {b"1", b"3"}  # Заказ 2 больше не предзаказ
+
+
+def test_only_new_unrecoverable_reports_all_without_redis(monkeypatch):
+    class BrokenRedis:
+        async def smembers(self, key):
+            raise ConnectionError("Redis недоступен")
+
+    monkeypatch.setattr(reconcile, "_redis", BrokenRedis())
+
+    assert asyncio.run(reconcile.only_new_unrecoverable([1, 3], set())) == [1, 3]
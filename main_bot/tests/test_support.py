@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import pytest
+import pytz
+
+from app import support as sup
+
+TIMEZONE = pytz.timezone("Etc/GMT-7")
+
+
+def local(year, month, day, hour=0, minute=0):
+    return TIMEZONE.localize(datetime(year, month, day, hour, minute))
+
+
+@pytest.mark.parametrize(
+    "submission_time, now, expected",
+    [
+        # Тот же год
+        ("12-06 09:00", local(2025, 6, 10, 12), local(2025, 6, 12, 9)),
+        # Предзаказ на январь, созданный в конце декабря
+        ("02-01 10:00", local(2025, 12, 30, 18), local(2026, 1, 2, 10)),
+        # Декабрьский заказ, разбираемый в начале января
+        ("30-12 10:00", local(2026, 1, 2, 8), local(2025, 12, 30, 10)),
+        # Старый заказ: дата позже now + 5 дней не выбирается
+        ("01-03 10:00", local(2025, 6, 10, 12), local(2025, 3, 1, 10)),
+        # 29 февраля есть только в високосном году
+        ("29-02 10:00", local(2025, 3, 1, 12), local(2024, 2, 29, 10)),
+    ],
+)
+def test_parse_submission_time_resolves_year(submission_time, now, expected):
+    assert sup.parse_submission_time(submission_time, now) == expected
+
+
+@pytest.mark.parametrize(
+    "submission_time", ["10-06 В ближайшее время", "В ближайшее время", "", None]
+)
+def test_parse_submission_time_without_time(submission_time):
+    assert sup.parse_submission_time(submission_time, local(2025, 6, 10)) is None
+
+
+def test_parse_submission_time_is_timezone_aware():
+    moment = sup.parse_submission_time("12-06 09:00", local(2025, 6, 10))
+
+    assert moment.utcoffset().total_seconds() == 7 * 3600
@@ -0,0 +1,158 @@
+import asyncio
+import json
+
+from app.timers import TimerWheel
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, args))
+
+    async def execute(self):
+        return [getattr(self.redis, name)(*args) for name, args in self.calls]
+
+
+class FakeRedis:
+    """Отсортированное множество и хэш таймеров в памяти."""
+
+    def __init__(self):
+        self.due: dict[str, float] = {}
+        self.payloads: dict[str, bytes] = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def hset(self, key, member, value):
+        self.payloads[member] = value.encode()
+        return 1
+
+    def hdel(self, key, member):
+        return int(self.payloads.pop(member, None) is not None)
+
+    def zadd(self, key, mapping):
+        self.due.update(mapping)
+        return len(mapping)
+
+    def zrem(self, key, member):
+        return int(self.due.pop(member, None) is not None)
+
+    async def hmget(self, key, members):
+        return [self.payloads.get(member) for member in members]
+
+    # Скрипты CLAIM_SCRIPT и ACK_SCRIPT
+
+    async def claim(self, keys, args):
+        now, limit, lease_until = args
+        due = sorted(
+            (score, member) for member, score in self.due.items() if score <= now
+        )[:limit]
+        for _, member in due:
+            self.due[member] = lease_until
+        return [member.encode() for _, member in due]
+
+    async def ack(self, keys, args):
+        member, score = args
+        if self.due.get(member) == score:
+            self.zrem(keys[0], member)
+            self.hdel(keys[1], member)
+            return 1
+        return 0
+
+
+def make_wheel():
+    wheel = TimerWheel(lease=60.0)
+    redis = FakeRedis()
+    wheel._redis, wheel._claim, wheel._ack = redis, redis.claim, redis.ack
+    return wheel, redis
+
+
+def test_fire_due_acks_after_handler():
+    wheel, redis = make_wheel()
+    fired = []
+
+    async def handler(payload):
+        fired.append(payload)
+
+    wheel.register("order_timeout", handler)
+
+    async def scenario():
+        await wheel.schedule("order_timeout", 7, -1, {"order_id": 7})
+        await wheel.schedule("order_timeout", 8, 600, {"order_id": 8})
+        return await wheel.fire_due()
+
+    assert asyncio.run(scenario()) == 1
+    assert fired == [{"order_id": 7}]
+    assert list(redis.due) == ["order_timeout:8"]
+    assert list(redis.payloads) == ["order_timeout:8"]
+
+
+def test_failed_handler_keeps_timer_until_lease_expires():
+    wheel, redis = make_wheel()
+
+    async def handler(payload):
+        raise RuntimeError("БД недоступна")
+
+    wheel.register("order_timeout", handler)
+
+    async def scenario():
+        await wheel.schedule("order_timeout", 7, -1, {"order_id": 7})
+        first = await wheel.fire_due()
+        return first, await wheel.fire_due()
+
+    # Таймер не подтвержден и сработает снова только после аренды
+    assert asyncio.run(scenario()) == (1, 0)
+    assert "order_timeout:7" in redis.due
+    assert "order_timeout:7" in redis.payloads
+
+
+def test_timer_rescheduled_by_handler_is_not_acked():
+    wheel, redis = make_wheel()
+
+    async def handler(payload):
+        await wheel.schedule("order_timeout", 7, 600, {"order_id": 7, "retry": 1})
+
+    wheel.register("order_timeout", handler)
+
+    async def scenario():
+        await wheel.schedule("order_timeout", 7, -1, {"order_id": 7})
+        await wheel.fire_due()
+
+    asyncio.run(scenario())
+
+    assert "order_timeout:7" in redis.due
+    assert json.loads(redis.payloads["order_timeout:7"]) == {"order_id": 7, "retry": 1}
+
+
+def test_timer_without_handler_is_dropped():
+    wheel, redis = make_wheel()
+
+    async def scenario():
+        await wheel.schedule("unknown", 7, -1, {})
+        return await wheel.fire_due()
+
+    assert asyncio.run(scenario()) == 1
+    assert redis.due == {}
+    assert redis.payloads == {}
+
+
+def test_cancel_reports_whether_timer_existed():
+    wheel, redis = make_wheel()
+
+    async def scenario():
+        await wheel.schedule("order_timeout", 7, 600, {"order_id": 7})
+        return await wheel.cancel("order_timeout", 7), await wheel.cancel(
+            "order_timeout", 7
+        )
+
+    assert asyncio.run(scenario()) == (True, False)
+    assert redis.due == {}